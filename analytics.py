@@ -0,0 +1,319 @@
+"""Trends for the summary: rolling averages, category breakdowns, spending by
+weekday and month over month.
+
+Expenses are copied into a columnar snapshot (one flat binary file per column,
+memory-mapped next to the database) and brought up to date incrementally: new
+ids are appended and ids in expense_changes are patched in place. Every figure
+is then a handful of vectorized passes, so a summary over millions of rows costs
+about as much as reading the few new ones.
+
+Needs NumPy (pip install numpy); the rest of BillBuddy runs without it.
+"""
+import json
+import os
+import threading
+from datetime import date
+
+from money import Money
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CHUNK_SIZE = 50000
+EPOCH = date(1970, 1, 1)
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+
+# One file per column; 'live' is cleared for deleted rows instead of compacting.
+COLUMNS = {
+    'id': 'int64',
+    'day': 'int32',
+    'amount': 'int64',
+    'currency': 'int16',
+    'category': 'int32',
+    'live': 'uint8',
+}
+
+_SELECT = '''
+    SELECT id, IFNULL(CAST(julianday(substr(date, 1, 10)) - 2440587.5 AS INTEGER), 0),
+           IFNULL(amount, 0), IFNULL(currency, ''), IFNULL(category, '')
+    FROM expenses
+'''
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def require_numpy():
+    if np is None:
+        raise RuntimeError("Trends need numpy (pip install numpy)")
+
+
+class Snapshot:
+    """ Column arrays for every expense, kept in step with the database by rowid """
+
+    def __init__(self, directory=None):
+        # directory=None keeps everything in memory (used for :memory: databases).
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.empty()
+        if directory is not None:
+            try:
+                self.load()
+            except (OSError, ValueError, KeyError):
+                # Missing or damaged files: start over, the database has everything.
+                self.clear()
+
+    def empty(self):
+        self.meta = {'rows': 0, 'last_id': 0, 'last_seq': 0, 'currencies': [], 'categories': []}
+        self.columns = {name: np.empty(0, dtype) for name, dtype in COLUMNS.items()}
+
+    def clear(self):
+        self.empty()
+        if self.directory is not None:
+            for name in COLUMNS:
+                path = self.column_path(name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def column_path(self, name):
+        return os.path.join(self.directory, f'{name}.bin')
+
+    def load(self):
+        with open(os.path.join(self.directory, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.map_columns()
+
+    def map_columns(self):
+        rows = self.meta['rows']
+        for name, dtype in COLUMNS.items():
+            if rows:
+                self.columns[name] = np.memmap(self.column_path(name), dtype=dtype, mode='r+', shape=(rows,))
+            else:
+                self.columns[name] = np.empty(0, dtype)
+
+    def save(self):
+        if self.directory is None:
+            return
+        for column in self.columns.values():
+            if isinstance(column, np.memmap):
+                column.flush()
+        path = os.path.join(self.directory, 'meta.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(path + '.tmp', path)
+
+    def code(self, kind, value, codes):
+        # kind is 'currencies' or 'categories'; codes is a value -> index dict for it.
+        if value not in codes:
+            codes[value] = len(self.meta[kind])
+            self.meta[kind].append(value)
+        return codes[value]
+
+    def encode(self, rows):
+        currencies = {value: i for i, value in enumerate(self.meta['currencies'])}
+        categories = {value: i for i, value in enumerate(self.meta['categories'])}
+        ids, days, amounts, currency_values, category_values = zip(*rows)
+        return {
+            'id': np.array(ids, dtype=COLUMNS['id']),
+            'day': np.array(days, dtype=COLUMNS['day']),
+            'amount': np.array(amounts, dtype=COLUMNS['amount']),
+            'currency': np.fromiter((self.code('currencies', value, currencies) for value in currency_values),
+                                    dtype=COLUMNS['currency'], count=len(rows)),
+            'category': np.fromiter((self.code('categories', value, categories) for value in category_values),
+                                    dtype=COLUMNS['category'], count=len(rows)),
+            'live': np.ones(len(rows), dtype=COLUMNS['live']),
+        }
+
+    def append(self, cursor):
+        rows = self.meta['rows']
+        if self.directory is not None:
+            # Drop anything past the last saved row, e.g. from an append cut short.
+            for name, dtype in COLUMNS.items():
+                with open(self.column_path(name), 'ab') as f:
+                    f.truncate(rows * np.dtype(dtype).itemsize)
+        added = 0
+        while True:
+            batch = cursor.fetchmany(CHUNK_SIZE)
+            if not batch:
+                break
+            encoded = self.encode(batch)
+            for name, values in encoded.items():
+                if self.directory is None:
+                    self.columns[name] = np.concatenate((self.columns[name], values))
+                else:
+                    with open(self.column_path(name), 'ab') as f:
+                        f.write(values.tobytes())
+            added += len(batch)
+            self.meta['last_id'] = int(encoded['id'][-1])
+        self.meta['rows'] = rows + added
+        if added and self.directory is not None:
+            self.map_columns()
+
+    def patch(self, conn, expense_ids):
+        # Edited rows get their new values; rows that no longer exist are marked dead.
+        ids = self.columns['id']
+        expense_ids = np.unique(np.array(expense_ids, dtype=COLUMNS['id']))
+        positions = np.searchsorted(ids, expense_ids)
+        known = positions < len(ids)
+        known[known] = ids[positions[known]] == expense_ids[known]
+        positions, expense_ids = positions[known], expense_ids[known]
+        if not len(positions):
+            return
+        self.columns['live'][positions] = 0
+        for start in range(0, len(expense_ids), 500):
+            chunk = [int(expense_id) for expense_id in expense_ids[start:start + 500]]
+            rows = conn.execute(f"{_SELECT} WHERE id IN ({', '.join('?' * len(chunk))})", chunk).fetchall()
+            if not rows:
+                continue
+            encoded = self.encode(rows)
+            where = np.searchsorted(ids, encoded['id'])
+            for name, values in encoded.items():
+                self.columns[name][where] = values
+
+    def refresh(self, conn):
+        """ Catch up with the database: patch edited and deleted rows, append new ones """
+        with self.lock:
+            # One read transaction, so the change log and the rows agree with each other.
+            conn.execute('BEGIN')
+            try:
+                changes = conn.execute('SELECT seq, expense_id FROM expense_changes WHERE seq > ? ORDER BY seq',
+                                       (self.meta['last_seq'],)).fetchall()
+                issued = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'expense_rows'").fetchone()[0]
+                # A NULL id marks a reset; ids going backwards mean a different database file.
+                if issued < self.meta['last_id'] or any(expense_id is None for _, expense_id in changes):
+                    self.clear()
+                    changes = []
+                elif changes:
+                    self.patch(conn, [expense_id for _, expense_id in changes])
+                last_seq = conn.execute('SELECT IFNULL(MAX(seq), 0) FROM expense_changes').fetchone()[0]
+                self.append(conn.execute(f'{_SELECT} WHERE id > ? ORDER BY id', (self.meta['last_id'],)))
+            finally:
+                conn.rollback()
+            self.meta['last_seq'] = max(last_seq, self.meta['last_seq'])
+            self.save()
+
+    def report(self, today, currency=None, days=30):
+        """ Trends for one currency as plain Python values (minor units), as of today """
+        with self.lock:
+            columns = self.columns
+            live = columns['live'] == 1
+            currencies = self.meta['currencies']
+            if currency is None:
+                # Default to whichever currency most expenses are in.
+                counts = np.bincount(columns['currency'][live], minlength=len(currencies))
+                currency = currencies[int(counts.argmax())] if counts.sum() else None
+            if currency not in currencies:
+                return {'currency': currency, 'currencies': list(currencies), 'rows': 0}
+
+            mask = live & (columns['currency'] == currencies.index(currency))
+            day = columns['day'][mask]
+            amount = columns['amount'][mask]
+            category = columns['category'][mask]
+            categories = self.meta['categories']
+
+        today_number = (today.date() if hasattr(today, 'date') else today) - EPOCH
+        today_number = today_number.days
+
+        # Daily totals for the last days + 29 days, enough for a 30-day average on each shown day.
+        first = today_number - days - 28
+        recent = (day >= first) & (day <= today_number)
+        daily = np.bincount(day[recent] - first, weights=amount[recent], minlength=today_number - first + 1)
+        rolling_7 = _rolling(daily, 7)[-days:]
+        rolling_30 = _rolling(daily, 30)[-days:]
+
+        month_start = (np.datetime64(today.strftime('%Y-%m'), 'D') - np.datetime64(EPOCH, 'D')).astype(int)
+        this_month = (day >= month_start) & (day <= today_number)
+        by_category = np.bincount(category[this_month], weights=amount[this_month], minlength=len(categories))
+        top = [i for i in np.argsort(by_category)[::-1] if by_category[i] > 0]
+
+        last_year = (day > today_number - 364) & (day <= today_number)
+        # 1970-01-01 was a Thursday; shift so Monday is 0.
+        weekdays = np.bincount((day[last_year] + 3) % 7, weights=amount[last_year], minlength=7)
+
+        months = day.astype('datetime64[D]').astype('datetime64[M]').astype(int)
+        current_month = np.datetime64(today.strftime('%Y-%m'), 'M').astype(int)
+        shown = (months > current_month - 13) & (months <= current_month)
+        by_month = np.bincount(months[shown] - (current_month - 12), weights=amount[shown], minlength=13)
+        deltas = np.diff(by_month)
+        labels = np.arange(current_month - 11, current_month + 1).astype('datetime64[M]').astype(str)
+
+        return {
+            'currency': currency,
+            'currencies': list(currencies),
+            'rows': int(mask.sum()),
+            'daily': [int(value) for value in daily[-days:]],
+            'rolling_7': [round(value) for value in rolling_7],
+            'rolling_30': [round(value) for value in rolling_30],
+            'categories': [(categories[i], int(by_category[i])) for i in top],
+            'weekdays': [int(value) for value in weekdays],
+            'months': [(str(label), int(total), int(delta), float(delta / previous) if previous else None)
+                       for label, total, delta, previous in zip(labels, by_month[1:], deltas, by_month[:-1])],
+        }
+
+
+def _rolling(series, window):
+    sums = np.cumsum(np.concatenate(([0.0], series)))
+    return (sums[window:] - sums[:-window]) / window
+
+
+def snapshot_for(conn):
+    """ The shared snapshot for this connection's database file """
+    require_numpy()
+    path = next((row[2] for row in conn.execute('PRAGMA database_list') if row[1] == 'main'), '')
+    key = os.path.abspath(path) if path else id(conn)
+    with _snapshots_lock:
+        if key not in _snapshots:
+            directory = None
+            if path:
+                directory = path + '.analytics'
+                os.makedirs(directory, exist_ok=True)
+            _snapshots[key] = Snapshot(directory)
+        return _snapshots[key]
+
+
+def report(conn, today, currency=None, days=30):
+    snapshot = snapshot_for(conn)
+    snapshot.refresh(conn)
+    return snapshot.report(today, currency, days)
+
+
+def _bar(value, largest, width=20):
+    return '█' * round(width * value / largest) if largest > 0 else ''
+
+
+def format_report(report):
+    """ The report as lines of text, for the summary dialog and the command line """
+    currency = report['currency']
+    if not report['rows']:
+        return [f"No expenses in {currency}." if currency else "No expenses yet."]
+
+    def money(minor):
+        return str(Money(minor, currency))
+
+    lines = [
+        f"Average per day, last 7 days:  {money(report['rolling_7'][-1])}",
+        f"Average per day, last 30 days: {money(report['rolling_30'][-1])}",
+        "",
+        "This month by category:",
+    ]
+    top = report['categories'][:8]
+    largest = max((total for _, total in top), default=0)
+    width = max((len(name) for name, _ in top), default=0)
+    lines += [f"  {name:<{width}}  {_bar(total, largest):<20}  {money(total)}" for name, total in top]
+    if not top:
+        lines.append("  Nothing yet")
+
+    lines += ["", "By weekday, last 52 weeks:"]
+    largest = max(report['weekdays'])
+    lines += [f"  {name}  {_bar(total, largest):<20}  {money(total)}"
+              for name, total in zip(WEEKDAYS, report['weekdays'])]
+
+    lines += ["", "Month over month:"]
+    for label, total, delta, change in report['months'][-6:]:
+        trend = f"{'+' if delta >= 0 else '-'}{money(abs(delta))}"
+        if change is not None:
+            trend += f" ({change:+.0%})"
+        lines.append(f"  {label}  {money(total):>14}  {trend}")
+    return lines
@@ -0,0 +1,71 @@
+"""Suggestions for the description and category inputs as they are typed.
+
+A PrefixIndex keeps every known value in one sorted list of keys (the value
+casefolded with its spacing tidied, as storage.category_key does), so all the
+values starting with what has been typed sit next to each other: two bisects
+find them and the most used few are offered first. Building one is a sort;
+adding a value afterwards is one insort.
+
+Categories come from the rollups, so the index holds all of them. Descriptions
+are read from the newest RECENT_DESCRIPTIONS expenses only: what was typed
+lately is what gets typed again, and a GROUP BY over every row would not be
+instant on a large database.
+"""
+import heapq
+from bisect import bisect_left, insort
+
+import storage
+
+SUGGESTIONS = 8               # most suggestions offered at once
+RECENT_DESCRIPTIONS = 50000   # expenses whose descriptions are suggested
+
+
+class PrefixIndex:
+    """ Known values, found by prefix, most used first """
+
+    def __init__(self, counts=()):
+        # keys: sorted category_key()s; entries: key -> [spelling shown, times used].
+        self.keys = []
+        self.entries = {}
+        for text, count in counts:
+            self._count(text, count)
+        self.keys = sorted(self.entries)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _count(self, text, count):
+        key = storage.category_key(text)
+        if not key:
+            return None
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = [' '.join(text.split()), count]
+            return key
+        entry[1] += count
+        return None
+
+    def add(self, text, count=1):
+        """ Count one more use of text, e.g. after an expense is added """
+        key = self._count(text, count)
+        if key is not None:
+            insort(self.keys, key)
+
+    def complete(self, prefix, limit=SUGGESTIONS):
+        """ Up to limit values starting with prefix, ignoring case and spacing """
+        key = storage.category_key(prefix)
+        if not key:
+            return []
+        start = bisect_left(self.keys, key)
+        # Every key with this prefix sorts before the prefix with its last character bumped.
+        end = bisect_left(self.keys, key[:-1] + chr(ord(key[-1]) + 1), start)
+        best = heapq.nlargest(limit, self.keys[start:end], key=lambda found: self.entries[found][1])
+        return [self.entries[found][0] for found in best]
+
+
+def load_descriptions(conn, recent=RECENT_DESCRIPTIONS):
+    """ An index of the descriptions used in the newest recent expenses """
+    return PrefixIndex(conn.execute('''
+        SELECT description, COUNT(*) FROM (SELECT description FROM expenses ORDER BY id DESC LIMIT ?)
+        GROUP BY description
+    ''', (recent,)))
@@ -0,0 +1,425 @@
+"""Performance benchmarks against synthetic ledgers.
+
+Builds expenses.db files of a given size (kept between runs), then times the
+window's hot paths headless under the offscreen Qt platform and writes JSON:
+
+    python bench.py --sizes 10k 1m --output before.json
+    python bench.py --sizes 10k 1m --output after.json --compare before.json
+    python bench.py --sizes 10m --skip import export
+
+Generated ledgers live in --dir and are only rebuilt when the row count
+differs or --regenerate is given. --compare exits with status 1 when any
+median got slower than the baseline by more than --threshold.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import storage
+from money import exponent
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+OPERATIONS = ('startup', 'load_expenses', 'show_summary', 'update_daily_total',
+              'insert', 'edit', 'delete', 'export', 'import')
+
+# Roughly one household: mostly pesos, some travel money.
+CURRENCY_WEIGHTS = {'PHP': 70, 'USD': 14, 'EUR': 7, 'JPY': 5, 'GBP': 4}
+# How many units of each currency buy one US dollar, to keep amounts plausible.
+DOLLAR_RATES = {'PHP': 56.0, 'USD': 1.0, 'EUR': 0.92, 'JPY': 150.0, 'GBP': 0.79}
+# Category: (weight, typical amount in dollars, merchants)
+CATEGORIES = {
+    'Food': (34, 9.0, ('Jollibee', 'Starbucks', 'SM Supermarket', 'Puregold', 'Mang Inasal', 'Bakery', 'Sushi bar')),
+    'Transport': (18, 4.0, ('Grab', 'Jeepney', 'MRT load', 'Petron', 'Shell', 'Parking', 'Taxi')),
+    'Bills': (8, 60.0, ('Meralco', 'Maynilad', 'PLDT fiber', 'Globe postpaid', 'Netflix', 'Spotify')),
+    'Shopping': (12, 25.0, ('Lazada', 'Shopee', 'Uniqlo', 'National Book Store', 'Ace Hardware')),
+    'Health': (6, 18.0, ('Mercury Drug', 'Watsons', 'Dental clinic', 'Gym membership')),
+    'Fun': (10, 15.0, ('Cinema', 'Concert tickets', 'Steam', 'Karaoke', 'Bowling')),
+    'Travel': (4, 120.0, ('Cebu Pacific', 'Airbnb', 'Hotel', 'Ferry', 'Travel insurance')),
+    'Home': (8, 30.0, ('Rent share', 'Laundry', 'Cleaning supplies', 'IKEA', 'Furniture')),
+}
+
+
+def parse_size(text):
+    """ '10k', '1m' or '2500' as a row count """
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:].lower(), 1)
+    try:
+        return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Not a size: {text}")
+
+
+def synthetic_rows(count, seed=1, years=5, today=None):
+    """ Yield (date, description, amount, category, currency, fingerprint) insert tuples """
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    first_day = today - timedelta(days=365 * years)
+    seconds = int((today - first_day).total_seconds())
+    currencies = list(CURRENCY_WEIGHTS)
+    currency_weights = list(CURRENCY_WEIGHTS.values())
+    categories = list(CATEGORIES)
+    category_weights = [CATEGORIES[name][0] for name in categories]
+
+    for _ in range(count):
+        currency = rng.choices(currencies, currency_weights)[0]
+        category = rng.choices(categories, category_weights)[0]
+        _, typical, merchants = CATEGORIES[category]
+        # Spending is skewed: lots of small purchases and the odd big one.
+        dollars = rng.lognormvariate(math.log(typical), 0.7)
+        amount = max(1, round(dollars * DOLLAR_RATES[currency] * 10 ** exponent(currency)))
+        date = first_day + timedelta(seconds=rng.randrange(seconds))
+        yield (date.strftime(storage.DATE_FORMAT), rng.choice(merchants), amount, category, currency, None)
+
+
+def generate(path, count, seed=1, chunk_size=50000):
+    """ Create a ledger of count synthetic expenses at path; returns seconds taken """
+    started = time.perf_counter()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = storage.connect(path)
+    try:
+        rows = synthetic_rows(count, seed)
+        for start in range(0, count, chunk_size):
+            storage.bulk_insert(conn, [next(rows) for _ in range(min(chunk_size, count - start))])
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+    return time.perf_counter() - started
+
+
+def ledger(directory, label, count, regenerate=False):
+    """ Path of a ledger with count rows, built if missing or the wrong size; returns (path, seconds or None) """
+    path = os.path.join(directory, label, os.path.basename(storage.DATABASE_PATH))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not regenerate and os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            existing = conn.execute('SELECT COUNT(*) FROM expenses').fetchone()[0]
+        except sqlite3.Error:
+            existing = None
+        finally:
+            conn.close()
+        if existing == count:
+            return path, None
+    return path, generate(path, count)
+
+
+def summarize(samples):
+    """ Milliseconds in, stats out """
+    return {
+        'runs': len(samples),
+        'min_ms': round(min(samples), 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'max_ms': round(max(samples), 3),
+    }
+
+
+def time_startup(directory, repeat, timeout=60):
+    # A fresh interpreter per run; main.py reports its own stage marks through StartupTimer.
+    samples = {}
+    for run in range(repeat):
+        report = os.path.join(directory, f'startup-{run}.jsonl')
+        if os.path.exists(report):
+            os.remove(report)
+        env = dict(os.environ, QT_QPA_PLATFORM='offscreen', BILLBUDDY_STARTUP_REPORT=report)
+        started = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(HERE, 'main.py')], cwd=directory, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(report) or not os.path.getsize(report):
+                if process.poll() is not None or time.perf_counter() - started > timeout:
+                    raise RuntimeError("main.py exited or hung before showing its first rows")
+                time.sleep(0.005)
+            wall = (time.perf_counter() - started) * 1000
+        finally:
+            process.kill()
+            process.wait()
+        with open(report, encoding='utf-8') as f:
+            marks = json.loads(f.readline())
+        os.remove(report)
+        samples.setdefault('startup', []).append(wall)
+        for name, value in marks.items():
+            if name.endswith('_ms'):
+                samples.setdefault('startup_' + name[:-3], []).append(value)
+    return {name: summarize(values) for name, values in samples.items()}
+
+
+def until(app, done, timeout=120):
+    # Spin the event loop until the worker threads have called back.
+    started = time.perf_counter()
+    while not done():
+        if time.perf_counter() - started > timeout:
+            raise RuntimeError("Timed out waiting for the database")
+        app.processEvents()
+        time.sleep(0.0005)
+
+
+def time_window(app, directory, repeat, operations):
+    """ Time the window's own code paths against the ledger in directory """
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+
+    import main
+
+    previous = os.getcwd()
+    os.chdir(directory)
+    window = main.ExpenseTracker()
+    results = {}
+    try:
+        window.show()
+        model = window.expenses_model
+        loaded = []
+        model.page_loaded.connect(lambda: loaded.append(True))
+        until(app, lambda: loaded)
+
+        def measure(name, start, done, prepare=None, after=None):
+            samples = []
+            for _ in range(repeat):
+                if prepare:
+                    prepare()
+                started = time.perf_counter()
+                start()
+                until(app, done)
+                samples.append((time.perf_counter() - started) * 1000)
+                if after:
+                    after()
+            results[name] = summarize(samples)
+
+        if 'load_expenses' in operations:
+            measure('load_expenses', window.load_expenses, lambda: loaded,
+                    prepare=loaded.clear)
+
+        if 'show_summary' in operations:
+            # The summary is a modal dialog: note when it appears and close it straight away.
+            shown = []
+            watcher = QTimer()
+            watcher.setInterval(1)
+
+            def dismiss():
+                dialog = QApplication.activeModalWidget()
+                if dialog is not None:
+                    shown.append(time.perf_counter())
+                    dialog.reject()
+
+            watcher.timeout.connect(dismiss)
+            watcher.start()
+            for name, prepare in (('show_summary', window.summary_cache.bump), ('show_summary_cached', None)):
+                measure(name, window.show_summary, lambda: shown,
+                        prepare=lambda prepare=prepare: (shown.clear(), prepare and prepare()),
+                        after=window.database.read_threads.waitForDone)
+            watcher.stop()
+
+        if 'update_daily_total' in operations:
+            shown = []
+            show_daily_total = window.show_daily_total
+
+            def record(results):
+                show_daily_total(results)
+                shown.append(True)
+
+            window.show_daily_total = record
+            for name, prepare in (('update_daily_total', window.summary_cache.bump), ('update_daily_total_cached', None)):
+                measure(name, window.update_daily_total, lambda: shown,
+                        prepare=lambda prepare=prepare: (shown.clear(), prepare and prepare()))
+            window.show_daily_total = show_daily_total
+
+        # Writes go through the worker and patch the model the way the window's callbacks do,
+        # minus the confirmation boxes. Edits and deletes work on the rows inserted here.
+        added, done = [], []
+
+        def finished(result):
+            done.append(result)
+
+        if {'insert', 'edit', 'delete'} & set(operations):
+            def inserted(expense):
+                window.expense_added(expense)
+                added.append(expense)
+                finished(expense)
+
+            measure('insert', lambda: window.database.submit(
+                storage.add_expense, "Benchmark coffee", 15000, 'Food', 'PHP',
+                datetime.now().strftime(storage.DATE_FORMAT), on_result=inserted), lambda: done, prepare=done.clear)
+
+        if 'edit' in operations:
+            def edited(result):
+                window.expenses_model.update_expense(*result)
+                window.expenses_changed()
+                finished(result)
+
+            measure('edit', lambda: window.database.submit(
+                storage.update_expense, added[-1][0], "Benchmark tea", 16000, 'Food', 'PHP', on_result=edited),
+                lambda: done, prepare=done.clear)
+
+        if 'delete' in operations:
+            def deleted(expense):
+                if expense:
+                    window.expenses_model.remove_expense(expense)
+                window.expenses_changed()
+                finished(expense)
+
+            measure('delete', lambda: window.database.submit(
+                storage.delete_expense, added.pop()[0], on_result=deleted), lambda: done, prepare=done.clear)
+
+        # Anything inserted but not deleted goes too, so the ledger keeps its size.
+        for expense in added:
+            window.database.submit(storage.delete_expense, expense[0])
+        window.database.read_threads.waitForDone()
+    finally:
+        window.close()
+        window.deleteLater()
+        app.processEvents()
+        os.chdir(previous)
+    return results
+
+
+def time_transfer(path, operations):
+    # Export the whole ledger to CSV, then import that file into an empty database.
+    import exporter
+    import importer
+
+    results = {}
+    scratch = tempfile.mkdtemp(prefix='billbuddy-bench-')
+    csv_path = os.path.join(scratch, 'expenses.csv')
+    target = os.path.join(scratch, 'imported.db')
+    try:
+        conn = storage.connect_readonly(path)
+        try:
+            started = time.perf_counter()
+            count = exporter.export(conn, csv_path, 'csv')
+            results['export'] = dict(summarize([(time.perf_counter() - started) * 1000]), rows=count)
+        finally:
+            conn.close()
+        if 'import' in operations:
+            conn = storage.connect(target)
+            try:
+                started = time.perf_counter()
+                stats = importer.import_file(conn, csv_path)
+                results['import'] = dict(summarize([(time.perf_counter() - started) * 1000]), rows=stats['imported'])
+            finally:
+                conn.close()
+    finally:
+        for name in os.listdir(scratch):
+            os.remove(os.path.join(scratch, name))
+        os.rmdir(scratch)
+    if 'export' not in operations:
+        del results['export']
+    return results
+
+
+def run(args):
+    operations = [name for name in OPERATIONS if name not in args.skip]
+    app = None
+    if {'load_expenses', 'show_summary', 'update_daily_total', 'insert', 'edit', 'delete'} & set(operations):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt6.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    report = {
+        'label': args.label,
+        'commit': _commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': {},
+    }
+    for label, count in args.sizes:
+        print(f"{label}: preparing {count:,} rows", file=sys.stderr)
+        path, seconds = ledger(args.dir, label, count, args.regenerate)
+        result = {'rows': count, 'generate_s': round(seconds, 2) if seconds is not None else None, 'operations': {}}
+        directory = os.path.dirname(path)
+        if 'startup' in operations:
+            print(f"{label}: startup", file=sys.stderr)
+            result['operations'].update(time_startup(directory, args.repeat))
+        if app is not None:
+            print(f"{label}: window", file=sys.stderr)
+            result['operations'].update(time_window(app, directory, args.repeat, operations))
+        if {'export', 'import'} & set(operations):
+            print(f"{label}: export and import", file=sys.stderr)
+            result['operations'].update(time_transfer(path, operations))
+        report['results'][label] = result
+    return report
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """ Print median changes against a baseline report; returns the slower (size, operation) pairs """
+    regressions = []
+    for label, result in report['results'].items():
+        before = baseline.get('results', {}).get(label, {}).get('operations', {})
+        for name, stats in result['operations'].items():
+            if name not in before or not before[name]['median_ms']:
+                continue
+            ratio = stats['median_ms'] / before[name]['median_ms']
+            # Sub-millisecond jitter is not a regression, whatever the ratio says.
+            slower = ratio > threshold and stats['median_ms'] - before[name]['median_ms'] > 1
+            flag = "  SLOWER" if slower else ""
+            print(f"{label:>6}  {name:<28} {before[name]['median_ms']:>10.2f} -> {stats['median_ms']:>10.2f} ms"
+                  f"  x{ratio:.2f}{flag}")
+            if slower:
+                regressions.append((label, name))
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='bench', description="Benchmark BillBuddy against synthetic ledgers")
+    parser.add_argument('--sizes', nargs='+', default=['10k', '1m', '10m'], metavar='SIZE',
+                        help="ledger sizes such as 10k, 1m or 2500 (default: %(default)s)")
+    parser.add_argument('--dir', default=os.path.join(tempfile.gettempdir(), 'billbuddy-bench'),
+                        help="where generated ledgers are kept (default: %(default)s)")
+    parser.add_argument('--regenerate', action='store_true', help="rebuild ledgers even if they exist")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per timing (default: %(default)s)")
+    parser.add_argument('--skip', nargs='+', default=[], choices=OPERATIONS, metavar='OPERATION',
+                        help=f"operations to leave out: {', '.join(OPERATIONS)}")
+    parser.add_argument('--label', help="free-form name for this run, e.g. a version")
+    parser.add_argument('--output', help="write the JSON here instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON from an earlier run to compare medians with")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression (default: %(default)s)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.sizes = [(label, parse_size(label)) for label in args.sizes]
+    except argparse.ArgumentTypeError as e:
+        sys.exit(str(e))
+    if args.repeat < 1:
+        sys.exit("--repeat needs at least one run")
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""BillBuddy from the command line, for scripts and cron jobs.
+
+Nothing here imports PyQt6, so the commands start as fast as Python does:
+
+    python billbuddy.py add "Coffee" 3.50 Food --currency USD
+    python billbuddy.py list --limit 20
+    python billbuddy.py list --search "coffee"
+    python billbuddy.py list --currency USD --min 100 --sort amount
+    python billbuddy.py summary
+    python billbuddy.py trends --currency USD
+    python billbuddy.py import statement.ofx
+    python billbuddy.py export expenses.csv --from 2024-01-01 --to 2024-12-31
+    python billbuddy.py rates load rates.csv
+    python billbuddy.py summary --in USD
+    python billbuddy.py undo
+    python billbuddy.py backup --keep 14
+    python billbuddy.py recurring add "Rent" 15000 Housing --every monthly
+    python billbuddy.py recurring run
+    python billbuddy.py budget set 5000 --category Food --currency PHP
+    python billbuddy.py categories rename Groceries Food
+"""
+import argparse
+import sys
+from datetime import datetime
+
+import budgets
+import maintenance
+import recurring
+import storage
+from money import Money
+
+
+def _day(value):
+    return datetime.fromisoformat(value)
+
+
+def _range(args):
+    start = storage.day_bounds(args.start)[0] if args.start else None
+    end = storage.day_bounds(args.end)[1] if args.end else None
+    return start, end
+
+
+def cmd_add(conn, args):
+    try:
+        amount = storage.validate_expense(args.description, args.amount, args.category, args.currency)
+    except ValueError as e:
+        sys.exit(str(e))
+    date = args.date.strftime(storage.DATE_FORMAT) if args.date else None
+    monitor = budgets.load(conn, datetime.now())
+    expense = storage.add_expense(conn, args.description, amount, args.category, args.currency, date)
+    print(f"Added expense {expense[0]}")
+    for category, currency, spent, limit, level in monitor.apply(new=expense):
+        label = "Over budget" if level == budgets.OVER else "Budget warning"
+        print(f"{label}: {budgets.describe(category, currency, spent, limit)}")
+
+
+def cmd_list(conn, args):
+    start, end = _range(args)
+    filters = {'start': start, 'end': end, 'currency': args.currency, 'category': args.category,
+               'min_amount': args.min_amount, 'max_amount': args.max_amount}
+    try:
+        page = storage.fetch_page(conn, limit=args.limit, search=args.search, filters=filters,
+                                  sort=(args.sort, not args.ascending))
+    except ValueError as e:
+        sys.exit(str(e))
+    for expense in page:
+        expense_id, date, description, amount, category, currency = expense[:6]
+        total = storage.format_totals([(amount, currency)])
+        print(f"{expense_id:>8}  {date}  {total:>16}  {category:<15}  {description}")
+
+
+def cmd_summary(conn, args):
+    day = args.date or datetime.now()
+    weekly, monthly, yearly = storage.summary_totals(conn, day)
+    print(f"Today's Total:    {storage.format_totals(storage.daily_totals(conn, day), '0.00')}")
+    print(f"Weekly Expenses:  {storage.format_totals(weekly)}")
+    print(f"Monthly Expenses: {storage.format_totals(monthly)}")
+    print(f"Yearly Expenses:  {storage.format_totals(yearly)}")
+    if args.target:
+        import exchange
+
+        daily, weekly, monthly, yearly = exchange.grand_totals(conn, day, args.target)
+        print()
+        print(f"Today in {args.target}:   {exchange.format_grand_total(daily)}")
+        print(f"Weekly in {args.target}:  {exchange.format_grand_total(weekly)}")
+        print(f"Monthly in {args.target}: {exchange.format_grand_total(monthly)}")
+        print(f"Yearly in {args.target}:  {exchange.format_grand_total(yearly)}")
+
+
+def cmd_trends(conn, args):
+    import analytics
+
+    try:
+        report = analytics.report(conn, args.date or datetime.now(), args.currency)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    print(f"Trends in {report['currency']}:" if report['currency'] else "Trends:")
+    for line in analytics.format_report(report):
+        print(line)
+
+
+def cmd_import(conn, args):
+    import importer
+
+    def progress(stats):
+        print(f"\r{stats['imported']:,} added, {stats['duplicates']:,} duplicates skipped", end='', file=sys.stderr)
+
+    stats = importer.import_file(conn, args.path, progress, args.currency)
+    print(file=sys.stderr)
+    print(f"Imported {stats['imported']:,} expenses "
+          f"({stats['duplicates']:,} duplicates and {stats['invalid']:,} invalid rows skipped)")
+
+
+def cmd_export(conn, args):
+    import exporter
+
+    start, end = _range(args)
+    what = 'summary' if args.summary else 'expenses'
+    try:
+        count = exporter.export(conn, args.path, args.format, what, start, end, args.currency)
+    except (ValueError, RuntimeError) as e:
+        sys.exit(str(e))
+    print(f"Exported {count:,} rows to {args.path}")
+
+
+def cmd_rates(conn, args):
+    import exchange
+
+    try:
+        count = exchange.load_rates(conn, args.path)
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
+    print(f"Loaded {count:,} exchange rates")
+
+
+def cmd_rollups(conn, args):
+    if args.action == 'rebuild':
+        storage.rebuild_rollups(conn)
+        print("Rollups rebuilt.")
+        return
+    mismatched = storage.verify_rollups(conn)
+    for key in mismatched:
+        print("Mismatch:", *key)
+    print("Rollups OK." if not mismatched else f"{len(mismatched)} rollup rows out of sync.")
+    if mismatched:
+        sys.exit(1)
+
+
+def cmd_undo(conn, args):
+    replay = storage.undo if args.command == 'undo' else storage.redo
+    action = replay(conn)
+    if action is None:
+        sys.exit(f"Nothing to {args.command}.")
+    print(f"{'Undid' if args.command == 'undo' else 'Redid'} {action}.")
+
+
+def cmd_compact(conn, args):
+    handled = 0
+    while True:
+        done = storage.compact(conn)
+        if not done:
+            break
+        handled += done
+    print(f"Compacted {handled:,} rows.")
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    while maintenance.tidy(conn):
+        pass
+    freed = free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+    print(f"Handed {freed:,} free pages back to the file system.")
+
+
+def cmd_backup(conn, args):
+    if args.list:
+        for taken, path in maintenance.snapshots(maintenance.database_path(conn), args.dir):
+            print(taken.strftime('%Y-%m-%d %H:%M:%S'), path)
+        return
+
+    def progress(copied, total):
+        print(f"\rCopied {copied:,} of {total:,} pages", end='', file=sys.stderr)
+
+    path = maintenance.snapshot(conn, args.dir, args.keep, progress=progress)
+    print(file=sys.stderr)
+    print(f"Backed up to {path}")
+
+
+def cmd_recurring(conn, args):
+    if args.action == 'add':
+        try:
+            amount = storage.validate_expense(args.description, args.amount, args.category, args.currency)
+            rule_id = recurring.add_rule(conn, args.description, amount, args.category, args.currency,
+                                         args.every, args.start)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"Added recurring expense {rule_id}")
+    elif args.action == 'remove':
+        if not recurring.remove_rule(conn, args.id):
+            sys.exit(f"No recurring expense {args.id}.")
+        print(f"Removed recurring expense {args.id}.")
+        return
+    elif args.action == 'list':
+        for rule_id, description, amount, category, currency, schedule, due in recurring.rules(conn):
+            total = storage.format_totals([(amount, currency)])
+            print(f"{rule_id:>8}  next {due}  {total:>16}  {category:<15}  {description} ({schedule})")
+        return
+    # Adding a rule catches up at once too, so a start in the past fills in right away.
+    added, due = recurring.catch_up(conn)
+    print(f"Added {added:,} recurring expense{'s' if added != 1 else ''}." + (f" Next due {due}." if due else ""))
+
+
+def cmd_budget(conn, args):
+    if args.action == 'set':
+        if args.amount is None:
+            sys.exit("Say what the monthly limit is: budget set 5000")
+        try:
+            amount = Money.parse(args.amount, args.currency).minor
+        except ValueError as e:
+            sys.exit(str(e))
+        if amount <= 0 or not 0 < args.warn <= 100:
+            sys.exit("The limit must be positive and --warn between 1 and 100.")
+        budgets.set_budget(conn, args.category, args.currency, amount, args.warn)
+    elif args.action == 'remove':
+        if not budgets.remove_budget(conn, args.category, args.currency):
+            sys.exit("No such budget.")
+        print("Budget removed.")
+        return
+    for line in budgets.format_report(budgets.load(conn, datetime.now()).report()):
+        print(line)
+
+
+def cmd_categories(conn, args):
+    if args.action == 'rename':
+        if not (args.old and args.new):
+            sys.exit("Say which category and its new name: categories rename Groceries Food")
+        try:
+            moved = storage.rename_category(conn, args.old, args.new)
+        except ValueError as e:
+            sys.exit(str(e))
+        print(f"Moved {moved:,} expense{'s' if moved != 1 else ''} to {storage.category_name(conn, args.new)}.")
+        return
+    for category, count in storage.category_counts(conn):
+        print(f"{count:>10,}  {category}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='billbuddy', description="BillBuddy expense tracker")
+    parser.add_argument('--db', default=storage.DATABASE_PATH, help="database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="add an expense")
+    add.add_argument('description')
+    add.add_argument('amount')
+    add.add_argument('category')
+    add.add_argument('--currency', default='PHP', choices=storage.CURRENCIES)
+    add.add_argument('--date', type=_day, help="when it happened (default: now)")
+    add.set_defaults(handler=cmd_add)
+
+    listing = commands.add_parser('list', help="show the most recent expenses")
+    listing.add_argument('--limit', type=int, default=20)
+    listing.add_argument('--search', help="only expenses whose description or category has these words")
+    listing.add_argument('--from', dest='start', type=_day, help="first day to include")
+    listing.add_argument('--to', dest='end', type=_day, help="last day to include")
+    listing.add_argument('--currency', choices=storage.CURRENCIES)
+    listing.add_argument('--category')
+    listing.add_argument('--min', dest='min_amount', help="smallest amount to include")
+    listing.add_argument('--max', dest='max_amount', help="largest amount to include")
+    listing.add_argument('--sort', choices=storage.SORT_KEYS, default=storage.DEFAULT_SORT[0])
+    listing.add_argument('--ascending', action='store_true', help="smallest/oldest first")
+    listing.set_defaults(handler=cmd_list)
+
+    summary = commands.add_parser('summary', help="daily, weekly, monthly and yearly totals")
+    summary.add_argument('--date', type=_day, help="summarize as of this day (default: today)")
+    summary.add_argument('--in', dest='target', choices=storage.CURRENCIES,
+                         help="also convert everything into this currency")
+    summary.set_defaults(handler=cmd_summary)
+
+    trends = commands.add_parser('trends', help="averages, categories, weekdays and month over month (needs numpy)")
+    trends.add_argument('--currency', choices=storage.CURRENCIES, help="default: the most used one")
+    trends.add_argument('--date', type=_day, help="as of this day (default: today)")
+    trends.set_defaults(handler=cmd_trends)
+
+    importing = commands.add_parser('import', help="import a CSV or OFX bank export")
+    importing.add_argument('path')
+    importing.add_argument('--currency', default='PHP', choices=storage.CURRENCIES,
+                           help="currency for rows that don't name one")
+    importing.set_defaults(handler=cmd_import)
+
+    exporting = commands.add_parser('export', help="export to CSV, JSON Lines or Parquet")
+    exporting.add_argument('path')
+    exporting.add_argument('--format', choices=('csv', 'jsonl', 'parquet'), help="default: from the file extension")
+    exporting.add_argument('--summary', action='store_true', help="export per-day totals instead of expenses")
+    exporting.add_argument('--from', dest='start', type=_day, help="first day to include")
+    exporting.add_argument('--to', dest='end', type=_day, help="last day to include")
+    exporting.add_argument('--currency', choices=storage.CURRENCIES)
+    exporting.set_defaults(handler=cmd_export)
+
+    rates = commands.add_parser('rates', help="load exchange rates for converted totals")
+    rates.add_argument('action', choices=('load',))
+    rates.add_argument('path', help="CSV with date, base, quote and rate columns")
+    rates.set_defaults(handler=cmd_rates)
+
+    rollups = commands.add_parser('rollups', help="check or rebuild the summary rollups")
+    rollups.add_argument('action', choices=('verify', 'rebuild'))
+    rollups.set_defaults(handler=cmd_rollups)
+
+    undo = commands.add_parser('undo', help="take back the last add, edit, delete or reset")
+    undo.set_defaults(handler=cmd_undo)
+
+    redo = commands.add_parser('redo', help="reapply what undo took back")
+    redo.set_defaults(handler=cmd_undo)
+
+    compact = commands.add_parser('compact', help="clear out deleted and reset rows now, then shrink the file")
+    compact.set_defaults(handler=cmd_compact)
+
+    backup = commands.add_parser('backup', help="snapshot the database while it stays in use")
+    backup.add_argument('--dir', help="where snapshots go (default: backups/ beside the database)")
+    backup.add_argument('--keep', type=int, default=maintenance.BACKUP_KEEP,
+                        help="newest snapshots to keep (default: %(default)s)")
+    backup.add_argument('--list', action='store_true', help="show the snapshots there instead")
+    backup.set_defaults(handler=cmd_backup)
+
+    repeating = commands.add_parser('recurring', help="expenses added on a schedule, like rent")
+    actions = repeating.add_subparsers(dest='action', required=True)
+    adding = actions.add_parser('add', help="add a rule")
+    adding.add_argument('description')
+    adding.add_argument('amount')
+    adding.add_argument('category')
+    adding.add_argument('--currency', default='PHP', choices=storage.CURRENCIES)
+    adding.add_argument('--every', default='monthly',
+                        help="daily, weekly, monthly (default) or a cron expression like '0 9 1 * *'")
+    adding.add_argument('--start', type=_day, help="first occurrence, may be in the past (default: now)")
+    actions.add_parser('list', help="show the rules and when each is next due")
+    removing = actions.add_parser('remove', help="stop a rule; expenses it added stay")
+    removing.add_argument('id', type=int)
+    actions.add_parser('run', help="add whatever has come due (for cron)")
+    repeating.set_defaults(handler=cmd_recurring)
+
+    budget = commands.add_parser('budget', help="monthly limits and how close this month is to them")
+    budget.add_argument('action', nargs='?', choices=('list', 'set', 'remove'), default='list')
+    budget.add_argument('amount', nargs='?', help="the monthly limit, for set")
+    budget.add_argument('--category', help="default: every category")
+    budget.add_argument('--currency', default='PHP', choices=storage.CURRENCIES)
+    budget.add_argument('--warn', type=int, default=budgets.WARN_AT,
+                        help="warn at this percent of the limit (default: %(default)s)")
+    budget.set_defaults(handler=cmd_budget)
+
+    categories = commands.add_parser('categories', help="list categories, or rename and merge them")
+    categories.add_argument('action', nargs='?', choices=('list', 'rename'), default='list')
+    categories.add_argument('old', nargs='?', help="the category to rename")
+    categories.add_argument('new', nargs='?', help="its new name; an existing category merges the two")
+    categories.set_defaults(handler=cmd_categories)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    conn = storage.connect(args.db)
+    try:
+        args.handler(conn, args)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Monthly spending limits per category and currency, and the alerts they raise.
+
+A budget caps one category's spending in one currency each calendar month, or,
+with no category, everything spent in that currency. It warns once spending
+passes warn_at percent of the limit and again once it passes the limit.
+
+Budgets are matched to expenses by storage.category_key(), like categories
+themselves, and setting one adds its category if no expense has used it yet.
+
+BudgetMonitor keeps this month's total for every budget in memory. Each add,
+edit or delete hands it the row before and after, and it moves only the totals
+that row counts towards (its category's and its currency's overall budget), so
+checking budgets after a write never asks the database. Writes that touch many
+rows at once (imports, resets, undo) reload it instead: one GROUP BY over this
+month's daily rollups.
+"""
+import storage
+from money import Money
+
+WARN_AT = 80  # percent of the limit
+
+# Levels a budget can be at; an alert is raised when a write moves one up.
+UNDER, WARNING, OVER = range(3)
+
+
+def set_budget(conn, category, currency, amount, warn_at=WARN_AT):
+    """ Limit category (None: every category) in currency to amount minor units a month """
+    if category is not None:
+        category = storage.add_category(conn, category)
+    cursor = conn.execute('''
+        UPDATE budgets SET amount = ?, warn_at = ?
+        WHERE currency = ? AND category IS ?
+    ''', (amount, warn_at, currency, category))
+    if cursor.rowcount == 0:
+        conn.execute('INSERT INTO budgets (category, currency, amount, warn_at) VALUES (?, ?, ?, ?)',
+                     (category, currency, amount, warn_at))
+    conn.commit()
+
+
+def remove_budget(conn, category, currency):
+    """ False if there was no such budget """
+    if category is not None:
+        category = storage.category_name(conn, category)
+    removed = conn.execute('DELETE FROM budgets WHERE currency = ? AND category IS ?',
+                           (currency, category)).rowcount
+    conn.commit()
+    return bool(removed)
+
+
+def load(conn, today):
+    """ A monitor for today's month, totalled from the rollups """
+    rows = conn.execute('SELECT category, currency, amount, warn_at FROM budgets').fetchall()
+    start, end = storage.month_bounds(today)
+    spent = conn.execute('''
+        SELECT category, currency, SUM(total) FROM expense_rollups
+        WHERE day >= ? AND day < ?
+        GROUP BY category, currency
+    ''', (start[:10], end[:10])).fetchall()
+    return BudgetMonitor(today.strftime('%Y-%m'), rows, spent)
+
+
+class BudgetMonitor:
+    """ This month's spending against every budget, moved by deltas as rows change """
+
+    def __init__(self, month, budgets, spent):
+        # budgets: (category, currency, amount, warn_at) rows; spent: (category, currency,
+        # total) for the month, one per pair that has any. Budgets are keyed by
+        # (category_key, currency) and names holds each one's category as stored.
+        self.month = month
+        self.budgets, self.names = {}, {}
+        for category, currency, amount, warn_at in budgets:
+            key = _key(category), currency
+            self.budgets[key] = amount, warn_at
+            self.names[key] = category
+        self.spent = dict.fromkeys(self.budgets, 0)
+        for category, currency, total in spent:
+            for key in ((_key(category), currency), (None, currency)):
+                if key in self.spent:
+                    self.spent[key] += total
+
+    def _keys(self, expense):
+        # The budgets a row counts towards: at most its category's and its currency's overall.
+        if expense is None or expense[storage.COLUMN_INDEX['date']][:7] != self.month:
+            return ()
+        currency = expense[storage.COLUMN_INDEX['currency']]
+        return [key for key in ((_key(expense[storage.COLUMN_INDEX['category']]), currency), (None, currency))
+                if key in self.budgets]
+
+    def level(self, key):
+        amount, warn_at = self.budgets[key]
+        spent = self.spent[key]
+        if spent > amount:
+            return OVER
+        return WARNING if spent * 100 >= amount * warn_at else UNDER
+
+    def apply(self, old=None, new=None):
+        """ Fold in one write: the row before and after it (None before an insert, after a
+        delete). Returns the budgets it moved up a level, shaped like report() rows """
+        old_keys, new_keys = self._keys(old), self._keys(new)
+        affected = set(old_keys) | set(new_keys)
+        before = {key: self.level(key) for key in affected}
+        amount = storage.COLUMN_INDEX['amount']
+        for key in old_keys:
+            self.spent[key] -= old[amount]
+        for key in new_keys:
+            self.spent[key] += new[amount]
+        return [self._row(key) for key in sorted(affected, key=_order) if self.level(key) > before[key]]
+
+    def report(self):
+        """ (category, currency, spent, amount, level) per budget, overall ones first """
+        return [self._row(key) for key in sorted(self.budgets, key=_order)]
+
+    def _row(self, key):
+        return (self.names[key], key[1], self.spent[key], self.budgets[key][0], self.level(key))
+
+
+def _key(category):
+    return None if category is None else storage.category_key(category)
+
+
+def _order(key):
+    category, currency = key
+    return currency, category is not None, category or ''
+
+
+def describe(category, currency, spent, amount):
+    percent = spent * 100 // amount if amount else 100
+    return (f"{category or 'All categories'} ({currency}): {Money(spent, currency)} "
+            f"of {Money(amount, currency)} this month, {percent}%")
+
+
+def format_report(report):
+    """ One line per report() row, for the CLI and the budgets dialog """
+    flags = {OVER: "  OVER", WARNING: "  warning", UNDER: ""}
+    return [describe(category, currency, spent, amount) + flags[level]
+            for category, currency, spent, amount, level in report]
@@ -0,0 +1,276 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from PyQt6.QtGui import QPainter, QColor, QPen, QPolygonF, QFontMetrics
+
+from money import Money
+from theme import COLORS
+
+BAR_COLORS = ('blue', 'green', 'peach', 'mauve', 'teal', 'yellow', 'red', 'sky', 'pink', 'lavender')
+
+
+def lttb(xs, ys, threshold):
+    """ Largest-Triangle-Three-Buckets: keep threshold points that preserve the shape """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return xs, ys
+    out_x, out_y = [xs[0]], [ys[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle.
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        count = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / count
+        avg_y = sum(ys[avg_start:avg_end]) / count
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = avg_start - 1, -1.0
+        for j in range(int(i * every) + 1, avg_start):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        a = best
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
+
+
+def series_points(rows, granularity, today):
+    """ storage.spending_series rows as (x, y) lists: x is a date ordinal, y minor units.
+    Days without spending are zeros, so the line drops to the floor instead of skipping """
+    if granularity != 'day':
+        return [date.fromisoformat(month + '-01').toordinal() for month, _ in rows], [total for _, total in rows]
+    if not rows:
+        return [], []
+    totals = dict(rows)
+    first = date.fromisoformat(rows[0][0])
+    last = max(today.date() if hasattr(today, 'date') else today, date.fromisoformat(rows[-1][0]))
+    xs, ys = [], []
+    day = first
+    while day <= last:
+        xs.append(day.toordinal())
+        ys.append(totals.get(day.isoformat(), 0))
+        day += timedelta(days=1)
+    return xs, ys
+
+
+class TimeSeriesChart(QWidget):
+    # Scroll to zoom around the cursor, drag to pan, double-click to see everything.
+    MARGIN_LEFT = 90
+    MARGIN_BOTTOM = 28
+    MARGIN_TOP = 24
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumHeight(220)
+        self.setMouseTracking(True)
+        self.xs, self.ys = [], []
+        self.currency = None
+        self.monthly = False
+        self.view = (0.0, 1.0)
+        self.drag_from = None
+        self.hover = None
+        self.sampled_key = None
+        self.sampled = ([], [])
+
+    def set_series(self, xs, ys, currency, granularity='day'):
+        self.xs, self.ys = xs, ys
+        self.currency = currency
+        self.monthly = granularity != 'day'
+        self.sampled_key = None
+        self.reset_view()
+
+    def reset_view(self):
+        if self.xs:
+            # A single point still needs a little width.
+            self.view = (self.xs[0] - 0.5, max(self.xs[-1], self.xs[0] + 1) + 0.5)
+        self.update()
+
+    def plot_rect(self):
+        return QRectF(self.MARGIN_LEFT, self.MARGIN_TOP, max(1, self.width() - self.MARGIN_LEFT - 12),
+                      max(1, self.height() - self.MARGIN_TOP - self.MARGIN_BOTTOM))
+
+    def visible(self):
+        # Only the points in view, at most one per two pixel columns.
+        start = max(bisect_left(self.xs, self.view[0]) - 1, 0)
+        end = min(bisect_right(self.xs, self.view[1]) + 1, len(self.xs))
+        width = int(self.plot_rect().width()) // 2
+        key = (start, end, width)
+        if key != self.sampled_key:
+            self.sampled = lttb(self.xs[start:end], self.ys[start:end], width)
+            self.sampled_key = key
+        return self.sampled
+
+    def x_to_pixel(self, x, rect):
+        x0, x1 = self.view
+        return rect.left() + (x - x0) / (x1 - x0) * rect.width()
+
+    def pixel_to_x(self, pixel, rect):
+        x0, x1 = self.view
+        return x0 + (pixel - rect.left()) / rect.width() * (x1 - x0)
+
+    def format(self, minor):
+        return str(Money(minor, self.currency)) if self.currency else str(minor)
+
+    def format_x(self, x):
+        label = date.fromordinal(int(x)).isoformat()
+        return label[:7] if self.monthly else label
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor(COLORS['mantle']))
+        rect = self.plot_rect()
+        metrics = QFontMetrics(painter.font())
+
+        if not self.xs:
+            painter.setPen(QColor(COLORS['subtext0']))
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "No expenses in this currency yet")
+            return
+
+        xs, ys = self.visible()
+        top = max(ys) if ys else 0
+        top = top * 1.1 or 1
+
+        painter.setPen(QPen(QColor(COLORS['surface1']), 1))
+        for step in range(5):
+            y = rect.bottom() - rect.height() * step / 4
+            painter.drawLine(QPointF(rect.left(), y), QPointF(rect.right(), y))
+            painter.setPen(QColor(COLORS['subtext0']))
+            label = self.format(round(top * step / 4))
+            painter.drawText(QRectF(0, y - 8, self.MARGIN_LEFT - 8, 16),
+                             Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter, label)
+            painter.setPen(QPen(QColor(COLORS['surface1']), 1))
+
+        painter.setPen(QColor(COLORS['subtext0']))
+        label_width = metrics.horizontalAdvance("0000-00-00") + 20
+        ticks = max(2, int(rect.width() // label_width))
+        for step in range(ticks):
+            x = self.view[0] + (self.view[1] - self.view[0]) * (step + 0.5) / ticks
+            pixel = self.x_to_pixel(x, rect)
+            label = self.format_x(x)
+            painter.drawText(QRectF(pixel - label_width / 2, rect.bottom() + 4, label_width, 18),
+                             Qt.AlignmentFlag.AlignCenter, label)
+
+        painter.save()
+        painter.setClipRect(rect)
+        line = QPolygonF([QPointF(self.x_to_pixel(x, rect), rect.bottom() - y / top * rect.height())
+                          for x, y in zip(xs, ys)])
+        # Wide antialiased pens are stroked in software and cost hundreds of ms here;
+        # a one pixel cosmetic pen keeps dragging smooth.
+        pen = QPen(QColor(COLORS['blue']), 1)
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        painter.drawPolyline(line)
+        painter.restore()
+
+        if self.hover is not None:
+            i = min(max(bisect_left(self.xs, self.hover), 0), len(self.xs) - 1)
+            if i > 0 and abs(self.xs[i - 1] - self.hover) < abs(self.xs[i] - self.hover):
+                i -= 1
+            pixel = self.x_to_pixel(self.xs[i], rect)
+            if rect.left() <= pixel <= rect.right():
+                painter.setPen(QPen(QColor(COLORS['overlay0']), 1, Qt.PenStyle.DashLine))
+                painter.drawLine(QPointF(pixel, rect.top()), QPointF(pixel, rect.bottom()))
+                painter.setPen(QColor(COLORS['text']))
+                painter.drawText(QRectF(rect.left(), 0, rect.width(), self.MARGIN_TOP),
+                                 Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter,
+                                 f"{self.format_x(self.xs[i])}  {self.format(self.ys[i])}")
+
+    def wheelEvent(self, event):
+        if not self.xs:
+            return
+        rect = self.plot_rect()
+        anchor = self.pixel_to_x(event.position().x(), rect)
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        x0, x1 = self.view
+        # Never narrower than a week (or two months), never wider than everything.
+        span = min(max((x1 - x0) * factor, 62 if self.monthly else 7), self.xs[-1] - self.xs[0] + 1)
+        left = anchor - (anchor - x0) / (x1 - x0) * span
+        self.set_view(left, left + span)
+
+    def set_view(self, x0, x1):
+        low, high = self.xs[0] - 0.5, max(self.xs[-1], self.xs[0] + 1) + 0.5
+        span = min(x1 - x0, high - low)
+        x0 = min(max(x0, low), high - span)
+        self.view = (x0, x0 + span)
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.drag_from = (event.position().x(), self.view)
+
+    def mouseMoveEvent(self, event):
+        rect = self.plot_rect()
+        if self.drag_from is not None and self.xs:
+            start_pixel, (x0, x1) = self.drag_from
+            shift = (event.position().x() - start_pixel) / rect.width() * (x1 - x0)
+            self.set_view(x0 - shift, x1 - shift)
+        self.hover = self.pixel_to_x(event.position().x(), rect) if self.xs else None
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag_from = None
+
+    def mouseDoubleClickEvent(self, event):
+        self.reset_view()
+
+    def leaveEvent(self, event):
+        self.hover = None
+        self.update()
+
+
+class CategoryChart(QWidget):
+    # Horizontal bars, biggest first; the long tail is folded into "Other".
+    MAX_BARS = 8
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumHeight(160)
+        self.totals = []
+        self.currency = None
+
+    def set_totals(self, totals, currency):
+        totals = [(category, total) for category, total in totals if total > 0]
+        if len(totals) > self.MAX_BARS:
+            other = sum(total for _, total in totals[self.MAX_BARS - 1:])
+            totals = totals[:self.MAX_BARS - 1] + [("Other", other)]
+        self.totals = totals
+        self.currency = currency
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor(COLORS['mantle']))
+        if not self.totals:
+            painter.setPen(QColor(COLORS['subtext0']))
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "Nothing spent in this period")
+            return
+
+        metrics = QFontMetrics(painter.font())
+        labels = [str(Money(total, self.currency)) for _, total in self.totals]
+        name_width = max(metrics.horizontalAdvance(name) for name, _ in self.totals) + 16
+        value_width = max(metrics.horizontalAdvance(label) for label in labels) + 16
+        bar_area = max(1, self.width() - name_width - value_width - 16)
+        row_height = min(28, (self.height() - 16) / len(self.totals))
+        largest = self.totals[0][1] if self.totals[0][0] != "Other" else max(total for _, total in self.totals)
+
+        for i, ((name, total), label) in enumerate(zip(self.totals, labels)):
+            y = 8 + i * row_height
+            painter.setPen(QColor(COLORS['text']))
+            painter.drawText(QRectF(8, y, name_width - 8, row_height),
+                             Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, name)
+            width = bar_area * total / largest
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(QColor(COLORS[BAR_COLORS[i % len(BAR_COLORS)]]))
+            painter.drawRoundedRect(QRectF(name_width, y + row_height * 0.2, max(width, 2), row_height * 0.6), 3, 3)
+            painter.setPen(QColor(COLORS['subtext1']))
+            painter.drawText(QRectF(name_width + width + 8, y, value_width, row_height),
+                             Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter, label)
@@ -0,0 +1,400 @@
+import os
+from PyQt6.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QLineEdit,
+                            QDialog, QComboBox, QGridLayout, QPlainTextEdit, QFileDialog)
+from PyQt6.QtCore import Qt, QUrl, QTimer, pyqtSignal
+from PyQt6.QtGui import QIcon, QDesktopServices, QPixmap, QDoubleValidator, QFont
+from charts import CategoryChart, TimeSeriesChart, series_points
+from money import CURRENCIES, Money
+from profiler import PROFILER, format_report
+from theme import resource_path
+
+class AboutDialog(QDialog):
+    # Fun fact: This dialog is taller on Tuesdays.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("About BillBuddy")
+        self.setFixedSize(400, 400)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(30, 30, 30, 30)
+        layout.setSpacing(15)
+
+        github_icon_path = resource_path(os.path.join('icon', 'github-mark-white.png'))
+        if os.path.exists(github_icon_path):
+            pixmap = QPixmap(github_icon_path)
+            scaled_pixmap = pixmap.scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+            icon_label = QLabel()
+            icon_label.setPixmap(scaled_pixmap)
+            icon_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            layout.addWidget(icon_label)
+
+        app_icon_path = resource_path(os.path.join('icon', 'icon.ico'))
+        if os.path.exists(app_icon_path):
+             self.setWindowIcon(QIcon(app_icon_path))
+
+        title = QLabel("BillBuddy")
+        title.setProperty('variant', 'title')
+        title.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        author = QLabel("Created by Luther")
+        author.setProperty('variant', 'subtitle')
+        author.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        repo_url = "https://github.com/LutherNikolaevich/BillBuddy/"
+        repo = QPushButton("GitHub Repository")
+        repo.setProperty('variant', 'link')
+        repo.clicked.connect(lambda: QDesktopServices.openUrl(QUrl(repo_url)))
+
+        repo_label = QLabel("@https://github.com/LutherNikolaevich/BillBuddy/")
+        repo_label.setProperty('variant', 'caption')
+        repo_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        repo_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse | Qt.TextInteractionFlag.LinksAccessibleByMouse)
+
+        layout.addWidget(title)
+        layout.addWidget(author)
+        layout.addSpacing(15)
+        layout.addWidget(repo)
+        layout.addWidget(repo_label)
+        layout.addStretch()
+
+        self.setLayout(layout)
+
+class EditExpenseDialog(QDialog):
+    # Warning: May contain traces of caffeine and regret.
+    def __init__(self, expense_data, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Edit Expense")
+        self.setFixedSize(450, 350)
+
+        self.expense_id = expense_data[0]
+        self.description = expense_data[2]
+        self.amount = expense_data[3]
+        self.category = expense_data[4]
+        self.currency = expense_data[5]
+
+        form_layout = QGridLayout()
+        form_layout.setHorizontalSpacing(15)
+        form_layout.setVerticalSpacing(15)
+
+        form_layout.setColumnStretch(0, 0)
+        form_layout.setColumnStretch(1, 1)
+
+        self.date_edit = QLineEdit()
+        self.date_edit.setPlaceholderText("Date")
+        self.date_edit.setText(expense_data[1])
+
+        self.amount_input = QLineEdit()
+        self.amount_input.setPlaceholderText("Amount")
+        self.amount_input.setText(str(Money(self.amount, self.currency).to_decimal()))
+
+        double_validator = QDoubleValidator()
+        double_validator.setNotation(QDoubleValidator.Notation.StandardNotation)
+        double_validator.setDecimals(2)
+        self.amount_input.setValidator(double_validator)
+
+        self.currency_combo = QComboBox()
+        self.currency_combo.addItems(CURRENCIES.keys())
+        self.currency_combo.setCurrentText(self.currency)
+
+        self.category_input = QLineEdit()
+        self.category_input.setPlaceholderText("Category")
+        self.category_input.setText(self.category)
+
+        form_layout.addWidget(QLabel("Date:"), 0, 0)
+        form_layout.addWidget(self.date_edit, 0, 1)
+
+        form_layout.addWidget(QLabel("Amount:"), 1, 0)
+        form_layout.addWidget(self.amount_input, 1, 1)
+
+        form_layout.addWidget(QLabel("Currency:"), 2, 0)
+        form_layout.addWidget(self.currency_combo, 2, 1)
+
+        form_layout.addWidget(QLabel("Category:"), 3, 0)
+        form_layout.addWidget(self.category_input, 3, 1)
+
+        form_layout.addWidget(QLabel("Description:"), 4, 0)
+        self.description_edit = QLineEdit()
+        self.description_edit.setPlaceholderText("Description")
+        self.description_edit.setText(self.description)
+        form_layout.addWidget(self.description_edit, 4, 1)
+
+        button_layout = QHBoxLayout()
+        button_layout.setSpacing(15)
+        self.save_button = QPushButton("Save")
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setProperty('variant', 'danger')
+        button_layout.addWidget(self.save_button)
+        button_layout.addWidget(self.cancel_button)
+        button_layout.setAlignment(Qt.AlignmentFlag.AlignRight)
+
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(form_layout)
+        main_layout.addStretch(1)
+        main_layout.addLayout(button_layout)
+        main_layout.setContentsMargins(20, 20, 20, 20)
+
+        self.setLayout(main_layout)
+
+        self.save_button.clicked.connect(self.accept)
+        self.cancel_button.clicked.connect(self.reject)
+
+    def get_edited_data(self):
+        try:
+            amount = Money.parse(self.amount_input.text(), self.currency_combo.currentText()).minor
+        except ValueError:
+            return None
+
+        return {
+            'description': self.description_edit.text(),
+            'amount': amount,
+            'category': self.category_input.text(),
+            'currency': self.currency_combo.currentText()
+        }
+
+class SummaryDialog(QDialog):
+    # Calculating your financial fate...
+    # Asks for trends in another currency; the owner answers with show_report().
+    currency_changed = pyqtSignal(str)
+
+    def __init__(self, weekly_summary, monthly_summary, yearly_summary, parent=None, converted=None, trends=False):
+        super().__init__(parent)
+        self.setWindowTitle("Expense Summary")
+        if trends:
+            self.setMinimumSize(560, 640)
+        elif converted is None:
+            self.setFixedSize(300, 200)
+        else:
+            self.setFixedSize(340, 280)
+
+        layout = QVBoxLayout()
+
+        weekly_label = QLabel(f"Weekly Expenses: {weekly_summary}")
+        monthly_label = QLabel(f"Monthly Expenses: {monthly_summary}")
+        yearly_label = QLabel(f"Yearly Expenses: {yearly_summary}")
+
+        layout.addWidget(weekly_label)
+        layout.addWidget(monthly_label)
+        layout.addWidget(yearly_label)
+
+        if converted is not None:
+            # (currency, weekly, monthly, yearly) grand totals from the exchange-rate table.
+            currency, weekly_total, monthly_total, yearly_total = converted
+            layout.addSpacing(10)
+            layout.addWidget(QLabel(f"Weekly in {currency}: {weekly_total}"))
+            layout.addWidget(QLabel(f"Monthly in {currency}: {monthly_total}"))
+            layout.addWidget(QLabel(f"Yearly in {currency}: {yearly_total}"))
+
+        if trends:
+            trends_header = QHBoxLayout()
+            trends_title = QLabel("Trends")
+            trends_title.setProperty('variant', 'heading')
+            self.trends_currency_combo = QComboBox()
+            self.trends_currency_combo.addItems(CURRENCIES.keys())
+            self.trends_currency_combo.currentTextChanged.connect(self.currency_changed)
+            trends_header.addWidget(trends_title)
+            trends_header.addStretch()
+            trends_header.addWidget(self.trends_currency_combo)
+
+            self.trends_label = QLabel("Loading trends...")
+            self.trends_label.setTextFormat(Qt.TextFormat.PlainText)
+            self.trends_label.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+            self.trends_label.setProperty('variant', 'report')
+
+            layout.addSpacing(10)
+            layout.addLayout(trends_header)
+            layout.addWidget(self.trends_label)
+        layout.addStretch()
+
+        self.setLayout(layout)
+
+    def show_report(self, report, lines):
+        # lines is analytics.format_report(report); the currency picker follows the report.
+        if report['currency']:
+            self.trends_currency_combo.blockSignals(True)
+            self.trends_currency_combo.setCurrentText(report['currency'])
+            self.trends_currency_combo.blockSignals(False)
+        self.trends_label.setText("\n".join(lines))
+
+    def report_failed(self, message):
+        self.trends_label.setText(message)
+
+class DashboardDialog(QDialog):
+    # Ten years of spending, a screenful of pixels.
+    # (currency, 'day' or 'month', 'month', 'year' or 'all'); the owner answers with show_series()/show_categories().
+    data_requested = pyqtSignal(str, str, str)
+
+    def __init__(self, currency, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Dashboard")
+        self.setMinimumSize(820, 620)
+
+        self.currency_combo = QComboBox()
+        self.currency_combo.addItems(CURRENCIES.keys())
+        self.currency_combo.setCurrentText(currency)
+        self.granularity_combo = QComboBox()
+        self.granularity_combo.addItem("Daily", 'day')
+        self.granularity_combo.addItem("Monthly", 'month')
+        self.period_combo = QComboBox()
+        self.period_combo.addItem("This month", 'month')
+        self.period_combo.addItem("This year", 'year')
+        self.period_combo.addItem("All time", 'all')
+        for combo in (self.currency_combo, self.granularity_combo, self.period_combo):
+            combo.currentIndexChanged.connect(self.request)
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.currency_combo)
+        controls.addWidget(self.granularity_combo)
+        controls.addStretch()
+        hint = QLabel("Scroll to zoom, drag to pan, double-click to reset")
+        hint.setProperty('variant', 'hint')
+        controls.addWidget(hint)
+
+        spending_title = QLabel("Spending over time")
+        spending_title.setProperty('variant', 'heading')
+        self.spending_chart = TimeSeriesChart()
+
+        categories_header = QHBoxLayout()
+        categories_title = QLabel("By category")
+        categories_title.setProperty('variant', 'heading')
+        categories_header.addWidget(categories_title)
+        categories_header.addStretch()
+        categories_header.addWidget(self.period_combo)
+        self.category_chart = CategoryChart()
+
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addWidget(spending_title)
+        layout.addWidget(self.spending_chart, 3)
+        layout.addLayout(categories_header)
+        layout.addWidget(self.category_chart, 2)
+        self.setLayout(layout)
+
+    def request(self):
+        self.data_requested.emit(self.currency_combo.currentText(), self.granularity_combo.currentData(),
+                                 self.period_combo.currentData())
+
+    def show_series(self, rows, currency, granularity, today):
+        if (currency, granularity) != (self.currency_combo.currentText(), self.granularity_combo.currentData()):
+            return
+        xs, ys = series_points(rows, granularity, today)
+        self.spending_chart.set_series(xs, ys, currency, granularity)
+
+    def show_categories(self, totals, currency, period):
+        if (currency, period) != (self.currency_combo.currentText(), self.period_combo.currentData()):
+            return
+        self.category_chart.set_totals(totals, currency)
+
+
+class BudgetDialog(QDialog):
+    # Where the money was supposed to go.
+    # (category or None, currency, limit text) and (category or None, currency); the owner
+    # writes them and answers with show_budgets().
+    budget_set = pyqtSignal(object, str, str)
+    budget_removed = pyqtSignal(object, str)
+
+    def __init__(self, currency, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Budgets")
+        self.setMinimumSize(520, 360)
+
+        title = QLabel("This month")
+        title.setProperty('variant', 'heading')
+        self.report_label = QLabel("No budgets yet.")
+        self.report_label.setTextFormat(Qt.TextFormat.PlainText)
+        self.report_label.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft)
+        self.report_label.setProperty('variant', 'report')
+
+        self.category_input = QLineEdit()
+        self.category_input.setPlaceholderText("Category (blank: all)")
+        self.currency_combo = QComboBox()
+        self.currency_combo.addItems(CURRENCIES.keys())
+        self.currency_combo.setCurrentText(currency)
+        self.amount_input = QLineEdit()
+        self.amount_input.setPlaceholderText("Monthly limit")
+        double_validator = QDoubleValidator()
+        double_validator.setNotation(QDoubleValidator.Notation.StandardNotation)
+        double_validator.setDecimals(2)
+        self.amount_input.setValidator(double_validator)
+
+        set_button = QPushButton("Set")
+        set_button.clicked.connect(lambda: self.budget_set.emit(
+            self.category(), self.currency_combo.currentText(), self.amount_input.text()))
+        remove_button = QPushButton("Remove")
+        remove_button.setProperty('variant', 'secondary')
+        remove_button.clicked.connect(lambda: self.budget_removed.emit(
+            self.category(), self.currency_combo.currentText()))
+
+        form = QHBoxLayout()
+        form.addWidget(self.category_input, 2)
+        form.addWidget(self.currency_combo)
+        form.addWidget(self.amount_input, 1)
+        form.addWidget(set_button)
+        form.addWidget(remove_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(title)
+        layout.addWidget(self.report_label, 1)
+        layout.addLayout(form)
+        self.setLayout(layout)
+
+    def category(self):
+        return self.category_input.text().strip() or None
+
+    def show_budgets(self, lines):
+        self.report_label.setText("\n".join(lines) or "No budgets yet.")
+
+class ProfilerPanel(QDialog):
+    # Live p50/p99 timings and the slowest statements, refreshed while it is open.
+    REFRESH_MS = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Profiler")
+        self.setMinimumSize(900, 560)
+
+        layout = QVBoxLayout()
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.text.setFont(QFont("JetBrains Mono", 9))
+        layout.addWidget(self.text)
+
+        buttons = QHBoxLayout()
+        reset_button = QPushButton("Reset")
+        reset_button.setProperty('variant', 'secondary')
+        reset_button.clicked.connect(self.reset)
+        save_button = QPushButton("Save Report")
+        save_button.setProperty('variant', 'secondary')
+        save_button.clicked.connect(self.save)
+        close_button = QPushButton("Close")
+        close_button.setProperty('variant', 'secondary')
+        close_button.clicked.connect(self.close)
+        buttons.addWidget(reset_button)
+        buttons.addWidget(save_button)
+        buttons.addStretch()
+        buttons.addWidget(close_button)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.REFRESH_MS)
+        self.refresh()
+
+    def refresh(self):
+        text = "\n".join(format_report(PROFILER.report())) or "Nothing measured yet."
+        if text == self.text.toPlainText():
+            return
+        # Keep the reader's place while the numbers move.
+        scroll = self.text.verticalScrollBar().value()
+        self.text.setPlainText(text)
+        self.text.verticalScrollBar().setValue(scroll)
+
+    def reset(self):
+        PROFILER.reset()
+        self.refresh()
+
+    def save(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Profiler Report", "profile.jsonl", "JSON Lines (*.jsonl)")
+        if path:
+            PROFILER.write(path)
@@ -0,0 +1,133 @@
+import csv
+from bisect import bisect_right
+from functools import lru_cache
+
+import storage
+from money import Money, exponent
+
+
+def load_rates(conn, path):
+    """ Load dated rates from a CSV with date, base, quote and rate columns; returns the row count """
+    # A row means 1 base = rate quote on that day, e.g. 2024-01-02,EUR,USD,1.0956
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        try:
+            date, base, quote, rate = (header.index(name) for name in ('date', 'base', 'quote', 'rate'))
+        except ValueError:
+            raise ValueError("Rate files need date, base, quote and rate columns")
+        rows = ((row[date].strip()[:10], row[base].strip().upper(), row[quote].strip().upper(), float(row[rate]))
+                for row in reader if row)
+        conn.execute('BEGIN')
+        try:
+            cursor = conn.executemany('''
+                INSERT OR REPLACE INTO exchange_rates (day, base, quote, rate)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+    return cursor.rowcount
+
+
+class RateTable:
+    """ As-of exchange rates: the latest rate on or before a day, direct, inverted or via a pivot """
+
+    def __init__(self, conn, cache_size=4096):
+        self.conn = conn
+        self.histories = {}
+        self.pivots = [row[0] for row in conn.execute('SELECT DISTINCT base FROM exchange_rates')]
+        # Memoized per (day, source, target); a day's rate never changes within one table.
+        self.rate = lru_cache(maxsize=cache_size)(self._rate)
+
+    def _history(self, source, target):
+        # Whole history for one stored pair, oldest first; fetched once per pair.
+        key = (source, target)
+        if key not in self.histories:
+            rows = self.conn.execute('''
+                SELECT day, rate FROM exchange_rates
+                WHERE base = ? AND quote = ?
+                ORDER BY day
+            ''', key).fetchall()
+            self.histories[key] = ([day for day, _ in rows], [rate for _, rate in rows])
+        return self.histories[key]
+
+    def _direct(self, day, source, target):
+        days, rates = self._history(source, target)
+        i = bisect_right(days, day)
+        if i:
+            return rates[i - 1]
+        days, rates = self._history(target, source)
+        i = bisect_right(days, day)
+        if i:
+            return 1 / rates[i - 1]
+        return None
+
+    def _rate(self, day, source, target):
+        if source == target:
+            return 1.0
+        rate = self._direct(day, source, target)
+        if rate is not None:
+            return rate
+        for pivot in self.pivots:
+            if pivot in (source, target):
+                continue
+            first = self._direct(day, source, pivot)
+            second = first and self._direct(day, pivot, target)
+            if second:
+                return first * second
+        return None
+
+    def convert(self, minor_by_day, source, target):
+        """ Sum {day: minor units in source} into target minor units in one pass """
+        # Rates are per major unit, so shift by the difference in decimal places.
+        shift = 10 ** (exponent(target) - exponent(source))
+        total = 0.0
+        for day, minor in minor_by_day.items():
+            rate = self.rate(day, source, target)
+            if rate is None:
+                return None
+            total += minor * rate * shift
+        return round(total)
+
+
+def period_total(conn, start, end, target, rates=None):
+    """ Grand total of [start, end) in target currency; returns (Money, currencies with no rate) """
+    rates = rates or RateTable(conn)
+    by_currency = {}
+    for day, currency, total in conn.execute('''
+        SELECT day, currency, SUM(total) FROM expense_rollups
+        WHERE day >= ? AND day < ?
+        GROUP BY currency, day
+    ''', (start[:10], end[:10])):
+        by_currency.setdefault(currency, {})[day] = total
+
+    grand_total, missing = 0, []
+    for currency, minor_by_day in by_currency.items():
+        converted = rates.convert(minor_by_day, currency, target)
+        if converted is None:
+            missing.append(currency)
+        else:
+            grand_total += converted
+    return Money(grand_total, target), sorted(missing)
+
+
+def grand_totals(conn, today, target):
+    """ Day, week, month and year grand totals in the target currency """
+    rates = RateTable(conn)
+    return [period_total(conn, start, end, target, rates)
+            for start, end in (storage.day_bounds(today), storage.week_bounds(today),
+                               storage.month_bounds(today), storage.year_bounds(today))]
+
+
+def daily_total(conn, today, target):
+    return period_total(conn, *storage.day_bounds(today), target)
+
+
+def format_grand_total(result):
+    total, missing = result
+    text = f"{total} {total.currency}"
+    if missing:
+        text += f" (no rate for {', '.join(missing)})"
+    return text
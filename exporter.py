@@ -0,0 +1,123 @@
+import csv
+import json
+import os
+
+from money import major_sql
+
+BATCH_SIZE = 10000
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+EXPENSE_COLUMNS = ('id', 'date', 'description', 'amount', 'category', 'currency')
+SUMMARY_COLUMNS = ('day', 'currency', 'category', 'total', 'count')
+
+
+def _filters(date_column, start, end, currency):
+    # Bounds are half-open [start, end); with a currency the (currency, date) index answers it.
+    clauses, params = [], []
+    if currency:
+        clauses.append('currency = ?')
+        params.append(currency)
+    if start:
+        clauses.append(f'{date_column} >= ?')
+        params.append(start)
+    if end:
+        clauses.append(f'{date_column} < ?')
+        params.append(end)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def iter_batches(conn, what='expenses', start=None, end=None, currency=None, batch_size=BATCH_SIZE):
+    """ Yield lists of at most batch_size rows straight off the cursor """
+    if what == 'summary':
+        where, params = _filters('day', start and start[:10], end and end[:10], currency)
+        # Amounts are stored in minor units; exports carry major units (12.5, not 1250).
+        columns = ', '.join(major_sql('total') if name == 'total' else name for name in SUMMARY_COLUMNS)
+        sql = f"SELECT {columns} FROM expense_rollups{where} ORDER BY day, currency, category"
+    else:
+        where, params = _filters('date', start, end, currency)
+        columns = ', '.join(major_sql('amount') if name == 'amount' else name for name in EXPENSE_COLUMNS)
+        sql = f"SELECT {columns} FROM expenses{where} ORDER BY date, id"
+
+    cursor = conn.execute(sql, params)
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        yield batch
+
+
+def write_csv(path, columns, batches, progress=None):
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows(batch)
+            written += len(batch)
+            if progress is not None:
+                progress(written)
+    return written
+
+
+def write_jsonl(path, columns, batches, progress=None):
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for batch in batches:
+            f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n' for row in batch)
+            written += len(batch)
+            if progress is not None:
+                progress(written)
+    return written
+
+
+def write_parquet(path, columns, batches, progress=None):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    written = 0
+    writer = None
+    try:
+        for batch in batches:
+            # One row group per batch keeps memory bounded by BATCH_SIZE rows.
+            table = pa.Table.from_arrays([pa.array(column) for column in zip(*batch)], names=list(columns))
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            written += len(batch)
+            if progress is not None:
+                progress(written)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        pq.write_table(pa.table({name: [] for name in columns}), path)
+    return written
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'parquet': write_parquet,
+}
+
+
+def format_for(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'json':
+        return 'jsonl'
+    if extension not in WRITERS:
+        raise ValueError(f"Unknown export format: {extension or path}")
+    return extension
+
+
+def export(conn, path, fmt=None, what='expenses', start=None, end=None, currency=None, progress=None):
+    """ Stream expenses (or per-day summary rows) to CSV, JSON Lines or Parquet; returns the row count """
+    fmt = fmt or format_for(path)
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    columns = SUMMARY_COLUMNS if what == 'summary' else EXPENSE_COLUMNS
+    batches = iter_batches(conn, what, start, end, currency)
+    return WRITERS[fmt](path, columns, batches, progress)
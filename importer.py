@@ -0,0 +1,135 @@
+import csv
+import hashlib
+import re
+from datetime import datetime
+from itertools import islice
+
+import storage
+
+CHUNK_SIZE = 50000
+DEFAULT_CATEGORY = 'Imported'
+
+_OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def parse_date(value):
+    """ Normalize an ISO date or OFX timestamp to the stored date format """
+    value = value.strip()
+    if len(value) == 19 and value[10] == ' ':
+        # Already in the stored format; just make sure it is a real date.
+        datetime.fromisoformat(value)
+        return value
+    if value[:8].isdigit():
+        # OFX: YYYYMMDD[HHMMSS][.XXX][TZ]
+        digits = value[:14].ljust(14, '0')
+        return datetime.strptime(digits, "%Y%m%d%H%M%S").strftime(storage.DATE_FORMAT)
+    return datetime.fromisoformat(value).strftime(storage.DATE_FORMAT)
+
+
+def read_csv(path, default_currency='PHP'):
+    # Expects a header row with date, description, amount, category and (optionally) currency and id.
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        columns = [header.index(name) if name in header else None
+                   for name in ('date', 'description', 'amount', 'category', 'currency', 'id')]
+        date, description, amount, category, currency, row_id = columns
+        width = len(header)
+        for row in reader:
+            if len(row) < width:
+                row = row + [''] * (width - len(row))
+            yield (
+                row[date] if date is not None else '',
+                row[description].strip() if description is not None else '',
+                row[amount].strip() if amount is not None else '',
+                row[category].strip() if category is not None else '',
+                (row[currency].strip().upper() if currency is not None else '') or default_currency,
+                row[row_id] if row_id is not None else '',
+            )
+
+
+def read_ofx(path, default_currency='PHP'):
+    # Line-oriented scan of <STMTTRN> blocks; works for both SGML (OFX 1.x) and XML (OFX 2.x).
+    currency = default_currency
+    transaction = None
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            upper = line.upper()
+            if '<STMTTRN>' in upper:
+                transaction = {}
+            for tag, value in _OFX_FIELD.findall(line):
+                tag = tag.upper()
+                if tag == 'CURDEF':
+                    currency = value.strip().upper()
+                elif transaction is not None:
+                    transaction[tag] = value.strip()
+            if '</STMTTRN>' in upper and transaction is not None:
+                amount = transaction.get('TRNAMT', '')
+                # Only money going out is an expense; deposits and refunds are skipped.
+                if amount.startswith('-'):
+                    yield (
+                        transaction.get('DTPOSTED', ''),
+                        transaction.get('NAME') or transaction.get('MEMO', ''),
+                        amount[1:],
+                        DEFAULT_CATEGORY,
+                        transaction.get('CURRENCY') or currency,
+                        transaction.get('FITID', ''),
+                    )
+                transaction = None
+
+
+def prepare(records, stats):
+    """ Validate (date, description, amount, category, currency, id) records like
+    add_expense does and yield insert-ready tuples """
+    # Identical lines in one file are distinct purchases, so the fingerprint
+    # includes how many times the line has been seen so far.
+    seen = {}
+    for raw_date, description, amount, category, currency, record_id in records:
+        try:
+            amount = storage.validate_expense(description, amount, category, currency)
+            date = parse_date(raw_date)
+        except ValueError:
+            stats['invalid'] += 1
+            continue
+
+        if record_id:
+            fingerprint = hashlib.sha1(f"id|{currency}|{record_id}".encode('utf-8')).hexdigest()
+        else:
+            line = hashlib.sha1(f"{date}|{description}|{amount}|{currency}".encode('utf-8')).digest()
+            seen[line] = seen.get(line, 0) + 1
+            fingerprint = hashlib.sha1(line + str(seen[line]).encode('ascii')).hexdigest()
+
+        yield (date, description, amount, category, currency, fingerprint)
+
+
+def count_records(path):
+    """ About how many records the file holds, from a quick byte scan: lines after the
+    header of a CSV, <STMTTRN> blocks of an OFX file """
+    ofx = path.lower().endswith(('.ofx', '.qfx'))
+    count = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            count += block.upper().count(b'<STMTTRN>') if ofx else block.count(b'\n')
+    return count if ofx else max(count - 1, 0)
+
+
+def import_file(conn, path, progress=None, default_currency='PHP', chunk_size=CHUNK_SIZE):
+    """ Stream a CSV or OFX file into expenses in one transaction; returns
+    imported/duplicates/invalid counts. progress(stats) is called after every chunk """
+    reader = read_ofx if path.lower().endswith(('.ofx', '.qfx')) else read_csv
+    stats = {'imported': 0, 'duplicates': 0, 'invalid': 0}
+    rows = prepare(reader(path, default_currency), stats)
+
+    # Sized up front so storage can decide once, for the whole file, how to load it.
+    with storage.bulk_loader(conn, count_records(path)) as load:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            inserted = load(chunk)
+            stats['imported'] += inserted
+            stats['duplicates'] += len(chunk) - inserted
+            if progress is not None:
+                progress(dict(stats))
+
+    return stats
@@ -1,419 +1,536 @@
+import time
+STARTED_AT = time.perf_counter()
+
 import sys
 import os
+import json
 from datetime import datetime, timedelta
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QLabel, QLineEdit, 
-                            QTableWidget, QTableWidgetItem, QMessageBox,
-                            QDialog, QFrame, QComboBox, QAbstractItemView, QHeaderView, QGridLayout)
-from PyQt6.QtCore import Qt, QPropertyAnimation, QEasingCurve, QPoint, QUrl, QVariant
-from PyQt6.QtGui import QFont, QIcon, QColor, QPalette, QDesktopServices, QPixmap, QDoubleValidator
-import sqlite3
-
-def resource_path(relative_path):
-    """ Get absolute path to resource, works for dev and for PyInstaller """
-    try:
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-
-    return os.path.join(base_path, relative_path)
-
-COLORS = {
-    'base': '#1e1e2e',
-    'mantle': '#181825',
-    'crust': '#11111b',
-    'text': '#cdd6f4',
-    'subtext0': '#a6adc8',
-    'subtext1': '#bac2de',
-    'surface0': '#313244',
-    'surface1': '#45475a',
-    'surface2': '#585b70',
-    'overlay0': '#6c7086',
-    'overlay1': '#7f849c',
-    'overlay2': '#9399b2',
-    'blue': '#89b4fa',
-    'lavender': '#b4befe',
-    'sapphire': '#74c7ec',
-    'sky': '#89dceb',
-    'teal': '#94e2d5',
-    'green': '#a6e3a1',
-    'yellow': '#f9e2af',
-    'peach': '#fab387',
-    'maroon': '#eba0ac',
-    'red': '#f38ba8',
-    'mauve': '#cba6f7',
-    'pink': '#f5c2e7',
-    'flamingo': '#f2cdcd',
-    'rosewater': '#f5e0dc'
-}
-
-CURRENCIES = {
-    'USD': '$',
-    'EUR': '€',
-    'GBP': '£',
-    'JPY': '¥',
-    'PHP': '₱',
-    'AUD': 'A$',
-    'CAD': 'C$',
-    'CHF': 'Fr',
-    'CNY': '¥',
-    'INR': '₹'
-}
-
-class AboutDialog(QDialog):
-    # Fun fact: This dialog is taller on Tuesdays.
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("About BillBuddy")
-        self.setFixedSize(400, 400)
-        self.setStyleSheet(f"""
-            QDialog {{
-                background-color: {COLORS['base']};
-                border-radius: 15px;
-            }}
-            QLabel {{
-                color: {COLORS['text']};
-                font-family: 'JetBrains Mono';
-                padding: 5px;
-            }}
-            QPushButton {{
-                background-color: {COLORS['surface0']};
-                border: none;
-                border-radius: 5px;
-                padding: 8px 15px;
-                color: {COLORS['text']};
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['surface1']};
-            }}
-        """)
-
-        layout = QVBoxLayout()
-        layout.setContentsMargins(30, 30, 30, 30)
-        layout.setSpacing(15)
-
-        github_icon_path = resource_path(os.path.join('icon', 'github-mark-white.png'))
-        if os.path.exists(github_icon_path):
-            pixmap = QPixmap(github_icon_path)
-            scaled_pixmap = pixmap.scaled(100, 100, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            icon_label = QLabel()
-            icon_label.setPixmap(scaled_pixmap)
-            icon_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            layout.addWidget(icon_label)
-
-        app_icon_path = resource_path(os.path.join('icon', 'icon.ico'))
-        if os.path.exists(app_icon_path):
-             self.setWindowIcon(QIcon(app_icon_path))
-
-        title = QLabel("BillBuddy")
-        title.setStyleSheet(f"font-size: 32px; color: {COLORS['lavender']}; font-weight: bold;")
-        title.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        author = QLabel("Created by Luther")
-        author.setStyleSheet(f"font-size: 18px; color: {COLORS['text']};")
-        author.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        repo_url = "https://github.com/LutherNikolaevich/BillBuddy/"
-        repo = QPushButton("GitHub Repository")
-        repo.setStyleSheet(f"""
-            QPushButton {{
-                font-size: 16px;
-                color: {COLORS['blue']};
-                text-align: center;
-                border: none;
-                background: transparent;
-                padding: 0;
-            }}
-            QPushButton:hover {{
-                color: {COLORS['lavender']};
-                text-decoration: underline;
-            }}
-        """)
-        repo.clicked.connect(lambda: QDesktopServices.openUrl(QUrl(repo_url)))
-
-        repo_label = QLabel("@https://github.com/LutherNikolaevich/BillBuddy/")
-        repo_label.setStyleSheet(f"font-size: 14px; color: {COLORS['subtext1']};")
-        repo_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        repo_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse | Qt.TextInteractionFlag.LinksAccessibleByMouse)
-
-        layout.addWidget(title)
-        layout.addWidget(author)
-        layout.addSpacing(15)
-        layout.addWidget(repo)
-        layout.addWidget(repo_label)
-        layout.addStretch()
-
-        self.setLayout(layout)
-
-class EditExpenseDialog(QDialog):
-    # Warning: May contain traces of caffeine and regret.
-    def __init__(self, expense_data, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Edit Expense")
-        self.setStyleSheet(f"""
-            QDialog {{
-                background-color: {COLORS['base']};
-                border-radius: 15px;
-                color: {COLORS['text']};
-            }}
-            QLabel {{
-                color: {COLORS['text']};
-                font-family: 'JetBrains Mono';
-            }}
-            QLineEdit {{
-                background-color: {COLORS['surface0']};
-                border: none;
-                border-radius: 5px;
-                padding: 5px;
-                color: {COLORS['text']};
-            }}
-            QComboBox {{
-                background-color: {COLORS['surface0']};
-                border: none;
-                border-radius: 5px;
-                padding: 5px;
-                color: {COLORS['text']};
-            }}
-            QComboBox::drop-down {{
-                border: none;
-            }}
-             QComboBox QAbstractItemView {{
-                background-color: {COLORS['surface0']};
-                color: {COLORS['text']};
-                selection-background-color: {COLORS['surface1']};
-            }}
-            QPushButton {{
-                background-color: {COLORS['green']};
-                border: none;
-                border-radius: 5px;
-                padding: 5px 10px;
-                color: {COLORS['mantle']};
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['teal']};
-            }}
-             QPushButton[text="Cancel"] {{
-                background-color: {COLORS['red']};
-                color: {COLORS['text']};
-            }}
-             QPushButton[text="Cancel"]:hover {{
-                background-color: {COLORS['maroon']};
-            }}
-        """)
-        self.setFixedSize(450, 350)
-
-        self.expense_id = expense_data[0]
-        self.description = expense_data[2]
-        self.amount = expense_data[3]
-        self.category = expense_data[4]
-        self.currency = expense_data[5]
-
-        form_layout = QGridLayout()
-        form_layout.setHorizontalSpacing(15)
-        form_layout.setVerticalSpacing(15)
-
-        form_layout.setColumnStretch(0, 0)
-        form_layout.setColumnStretch(1, 1)
-
-        self.date_edit = QLineEdit()
-        self.date_edit.setPlaceholderText("Date")
-        self.date_edit.setText(expense_data[1])
-
-        self.amount_input = QLineEdit()
-        self.amount_input.setPlaceholderText("Amount")
-        self.amount_input.setText(str(self.amount))
-
-        double_validator = QDoubleValidator()
-        double_validator.setNotation(QDoubleValidator.Notation.StandardNotation)
-        double_validator.setDecimals(2)
-        self.amount_input.setValidator(double_validator)
-
-        self.currency_combo = QComboBox()
-        self.currency_combo.addItems(CURRENCIES.keys())
-        self.currency_combo.setCurrentText(self.currency)
-
-        self.category_input = QLineEdit()
-        self.category_input.setPlaceholderText("Category")
-        self.category_input.setText(self.category)
-
-        form_layout.addWidget(QLabel("Date:"), 0, 0)
-        form_layout.addWidget(self.date_edit, 0, 1)
-
-        form_layout.addWidget(QLabel("Amount:"), 1, 0)
-        form_layout.addWidget(self.amount_input, 1, 1)
-
-        form_layout.addWidget(QLabel("Currency:"), 2, 0)
-        form_layout.addWidget(self.currency_combo, 2, 1)
+                            QTableView, QStyledItemDelegate, QStyle, QMessageBox,
+                            QDialog, QComboBox, QAbstractItemView, QHeaderView,
+                            QFileDialog, QDateEdit, QCompleter)
+from PyQt6.QtCore import (Qt, QDate, QAbstractTableModel, QModelIndex, QEvent, QObject, QThread,
+                          QThreadPool, QRunnable, QTimer, QStringListModel, pyqtSignal, pyqtSlot)
+from PyQt6.QtGui import (QFont, QIcon, QColor, QDoubleValidator, QPainter,
+                         QKeySequence, QShortcut)
+import threading
+import storage
+import autocomplete
+import budgets
+import maintenance
+import recurring
+from money import Money
+from profiler import PROFILER, timed
+import theme
+from theme import COLORS, THEMES, apply_theme, resource_path
+IMPORTED_AT = time.perf_counter()
+
+CURRENCIES = storage.CURRENCIES
+
+
+class StartupTimer:
+    # Where did the first second go? Set BILLBUDDY_STARTUP_REPORT=1 for stderr, or to a file to append JSON lines.
+    STAGES = ('import', 'db open', 'first paint', 'first rows')
+
+    def __init__(self, started_at=STARTED_AT):
+        self.started_at = started_at
+        self.marks = {}
+        self.target = os.environ.get('BILLBUDDY_STARTUP_REPORT')
+
+    def mark(self, stage, at=None):
+        if stage in self.marks:
+            return
+        self.marks[stage] = ((at or time.perf_counter()) - self.started_at) * 1000
+        if all(name in self.marks for name in self.STAGES):
+            self.report()
 
-        form_layout.addWidget(QLabel("Category:"), 3, 0)
-        form_layout.addWidget(self.category_input, 3, 1)
+    def report(self):
+        if not self.target:
+            return
+        if self.target == '1':
+            print("Startup: " + ", ".join(f"{name} {self.marks[name]:.1f} ms" for name in self.STAGES), file=sys.stderr)
+            return
+        with open(self.target, 'a', encoding='utf-8') as f:
+            record = {'timestamp': datetime.now().isoformat(timespec='seconds')}
+            record.update({name.replace(' ', '_') + '_ms': round(self.marks[name], 2) for name in self.STAGES})
+            f.write(json.dumps(record) + '\n')
+
+class DatabaseWorker(QObject):
+    # Lives on its own thread, with its own connection, far away from the paint loop.
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    opened = pyqtSignal(float)
+
+    def __init__(self, path, pragmas=None):
+        super().__init__()
+        self.path = path
+        self.pragmas = pragmas
+        self.conn = None
+        # Set once the writer has opened and migrated the file, so readers can follow.
+        self.ready = threading.Event()
+
+    @pyqtSlot()
+    def open(self):
+        try:
+            self.conn = storage.connect(self.path, self.pragmas)
+            self.opened.emit(time.perf_counter())
+        except Exception as e:
+            self.failed.emit(0, str(e))
+        finally:
+            self.ready.set()
+
+    @pyqtSlot(int, object, object)
+    def run(self, ticket, fn, args):
+        try:
+            if self.conn is None:
+                self.conn = storage.connect(self.path, self.pragmas)
+            with PROFILER.span(f"{fn.__module__}.{fn.__qualname__}"):
+                result = fn(self.conn, *args)
+        except Exception as e:
+            if self.conn is not None and self.conn.in_transaction:
+                self.conn.rollback()
+            self.failed.emit(ticket, str(e))
+            return
+        self.finished.emit(ticket, result)
+
+    @pyqtSlot()
+    def shutdown(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        QThread.currentThread().quit()
+
+class ReadTask(QRunnable):
+    # A read borrowed from the pool; runs alongside the writer thanks to WAL.
+    def __init__(self, service, ticket, fn, args):
+        super().__init__()
+        self.service = service
+        self.ticket = ticket
+        self.fn = fn
+        self.args = args
 
-        form_layout.addWidget(QLabel("Description:"), 4, 0)
-        self.description_edit = QLineEdit()
-        self.description_edit.setPlaceholderText("Description")
-        self.description_edit.setText(self.description)
-        form_layout.addWidget(self.description_edit, 4, 1)
+    def run(self):
+        self.service.worker.ready.wait()
+        try:
+            with self.service.read_pool.connection() as conn, \
+                    PROFILER.span(f"{self.fn.__module__}.{self.fn.__qualname__}"):
+                result = self.fn(conn, *self.args)
+        except Exception as e:
+            self.service.worker.failed.emit(self.ticket, str(e))
+            return
+        self.service.worker.finished.emit(self.ticket, result)
 
-        button_layout = QHBoxLayout()
-        button_layout.setSpacing(15)
-        self.save_button = QPushButton("Save")
-        self.cancel_button = QPushButton("Cancel")
-        button_layout.addWidget(self.save_button)
-        button_layout.addWidget(self.cancel_button)
-        button_layout.setAlignment(Qt.AlignmentFlag.AlignRight)
+class DatabaseService(QObject):
+    """ Runs storage functions off the GUI thread and calls back on the GUI thread """
+    _requested = pyqtSignal(int, object, object)
+    _open_requested = pyqtSignal()
+    _shutdown_requested = pyqtSignal()
+    failed = pyqtSignal(str)
+    opened = pyqtSignal(float)
 
-        main_layout = QVBoxLayout()
-        main_layout.addLayout(form_layout)
-        main_layout.addStretch(1)
-        main_layout.addLayout(button_layout)
-        main_layout.setContentsMargins(20, 20, 20, 20)
+    def __init__(self, path=storage.DATABASE_PATH, pragmas=None, readers=4, parent=None):
+        super().__init__(parent)
+        self.callbacks = {}
+        self.next_ticket = 0
+
+        self.thread = QThread()
+        self.worker = DatabaseWorker(path, pragmas)
+        self.worker.moveToThread(self.thread)
+        self._requested.connect(self.worker.run)
+        self._open_requested.connect(self.worker.open)
+        self._shutdown_requested.connect(self.worker.shutdown)
+        self.worker.finished.connect(self._on_finished)
+        self.worker.failed.connect(self._on_failed)
+        self.worker.opened.connect(self.opened)
+        self.thread.start()
+        self._open_requested.emit()
+
+        self.read_pool = storage.ReadPool(path, readers, pragmas)
+        self.read_threads = QThreadPool(self)
+        self.read_threads.setMaxThreadCount(readers)
+
+    def _ticket(self, on_result, on_error):
+        self.next_ticket += 1
+        self.callbacks[self.next_ticket] = (on_result, on_error)
+        return self.next_ticket
+
+    def submit(self, fn, *args, on_result=None, on_error=None):
+        # fn(conn, *args) runs on the writer thread; on_result(result) runs back here.
+        ticket = self._ticket(on_result, on_error)
+        self._requested.emit(ticket, fn, args)
+        return ticket
+
+    def submit_read(self, fn, *args, on_result=None, on_error=None):
+        # Same contract as submit(), but fn gets a pooled read-only connection.
+        ticket = self._ticket(on_result, on_error)
+        self.read_threads.start(ReadTask(self, ticket, fn, args))
+        return ticket
+
+    def _on_finished(self, ticket, result):
+        on_result, _ = self.callbacks.pop(ticket, (None, None))
+        if on_result is not None:
+            on_result(result)
+
+    def _on_failed(self, ticket, message):
+        _, on_error = self.callbacks.pop(ticket, (None, None))
+        if on_error is not None:
+            on_error(message)
+        else:
+            self.failed.emit(message)
+
+    def close(self):
+        self.read_threads.waitForDone()
+        self.read_pool.close()
+        self._shutdown_requested.emit()
+        self.thread.wait()
+
+class ImportProgress(QObject):
+    # Carries progress reports from the writer thread back to the window.
+    advanced = pyqtSignal(object)
+
+class ExpenseTableModel(QAbstractTableModel):
+    # Only the rows you can see, and a few you might scroll to.
+    HEADERS = ["ID", "Date", "Description", "Amount", "Currency", "Category", "Edit", "Delete"]
+    page_loaded = pyqtSignal()
+    EDIT_COLUMN = 6
+    DELETE_COLUMN = 7
+    PAGE_SIZE = 200
+    # View column -> storage.SORT_KEYS column; Edit and Delete don't sort.
+    SORT_COLUMNS = {0: 'id', 1: 'date', 2: 'description', 3: 'amount', 4: 'currency', 5: 'category'}
+
+    def __init__(self, database, parent=None):
+        super().__init__(parent)
+        self.database = database
+        self.search = ''
+        self.filters = {}
+        self.sort_order = storage.DEFAULT_SORT
+        self.rows = []
+        self.exhausted = False
+        self.loading = False
+        # Bumped on reload/clear so pages requested before then are dropped.
+        self.generation = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        expense = self.rows[index.row()]
+        column = index.column()
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == self.EDIT_COLUMN:
+                return "Edit"
+            if column == self.DELETE_COLUMN:
+                return "Delete"
+            db_currency = expense[5] if len(expense) > 5 else 'PHP'
+            if column == 3:
+                return str(Money(expense[3], db_currency))
+            if column == 4:
+                return str(db_currency)
+            if column == 5:
+                return str(expense[4])
+            return str(expense[column])
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        if role == Qt.ItemDataRole.UserRole:
+            return expense[0]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        # Keyset paging: continue strictly after the sort key of the last row we hold.
+        if self.loading or self.exhausted:
+            return
+        self.loading = True
+        generation = self.generation
+        after = self.rows[-1] if self.rows else None
+        self.database.submit_read(storage.fetch_page, after, self.PAGE_SIZE, self.search, self.filters,
+                                  self.sort_order, on_result=lambda page: self.append_page(generation, page),
+                                  on_error=lambda message: self.page_failed(generation, message))
+
+    @timed
+    def append_page(self, generation, page):
+        if generation != self.generation:
+            return
+        self.loading = False
+        if len(page) < self.PAGE_SIZE:
+            self.exhausted = True
+        if page:
+            start = len(self.rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+            self.rows.extend(page)
+            self.endInsertRows()
+        self.page_loaded.emit()
+
+    def page_failed(self, generation, message):
+        if generation == self.generation:
+            self.loading = False
+            self.exhausted = True
+        self.database.failed.emit(message)
+
+    def reload(self):
+        self.beginResetModel()
+        self.generation += 1
+        self.rows = []
+        self.exhausted = False
+        self.loading = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        if column not in self.SORT_COLUMNS:
+            return
+        sort_order = (self.SORT_COLUMNS[column], order == Qt.SortOrder.DescendingOrder)
+        if sort_order != self.sort_order:
+            self.sort_order = sort_order
+            self.reload()
+
+    def set_query(self, search, filters):
+        search = search.strip()
+        if (search, filters) != (self.search, self.filters):
+            self.search = search
+            self.filters = filters
+            self.reload()
+
+    def clear(self):
+        self.beginResetModel()
+        self.generation += 1
+        self.rows = []
+        self.exhausted = True
+        self.loading = False
+        self.endResetModel()
+
+    def sort_key(self, expense):
+        return tuple(expense[storage.COLUMN_INDEX[name]] for name in storage.SORT_KEYS[self.sort_order[0]])
+
+    def position_of(self, expense):
+        # Binary search for the row's slot in the current order, so a one-row change costs O(log n).
+        key = self.sort_key(expense)
+        descending = self.sort_order[1]
+        lo, hi = 0, len(self.rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row_key = self.sort_key(self.rows[mid])
+            if row_key > key if descending else row_key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, expense):
+        position = self.position_of(expense)
+        if position < len(self.rows) and self.rows[position][0] == expense[0]:
+            return position
+        return -1
+
+    def restart_pending_page(self):
+        # A page read in parallel with this write may predate it; ask again from the same spot.
+        if self.loading:
+            self.generation += 1
+            self.loading = False
+            self.fetchMore()
+
+    @timed
+    def insert_expense(self, expense):
+        if self.search or self.filters:
+            # Let the database decide whether the row matches, with the same SQL the pages use.
+            query = (self.search, self.filters)
+            self.database.submit_read(storage.matches, expense[0], *query,
+                                      on_result=lambda match: self.insert_match(expense, query, match))
+            return
+        self.place_expense(expense)
 
-        self.setLayout(main_layout)
+    def insert_match(self, expense, query, match):
+        if match and query == (self.search, self.filters) and self.find(expense) < 0:
+            self.place_expense(expense)
 
-        self.save_button.clicked.connect(self.accept)
-        self.cancel_button.clicked.connect(self.reject)
+    def place_expense(self, expense):
+        self.restart_pending_page()
+        position = self.position_of(expense)
+        if position == len(self.rows) and not self.exhausted:
+            # Sorts past the loaded window; keyset paging will pick it up later.
+            return
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.insert(position, expense)
+        self.endInsertRows()
+
+    @timed
+    def remove_expense(self, expense):
+        self.restart_pending_page()
+        position = self.find(expense)
+        if position < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), position, position)
+        del self.rows[position]
+        self.endRemoveRows()
+
+    @timed
+    def update_expense(self, old_expense, new_expense):
+        position = self.find(old_expense)
+        same_key = self.sort_key(old_expense) == self.sort_key(new_expense)
+        if position >= 0 and same_key and not (self.search or self.filters):
+            self.rows[position] = new_expense
+            self.dataChanged.emit(self.index(position, 0), self.index(position, len(self.HEADERS) - 1))
+            return
+        self.remove_expense(old_expense)
+        self.insert_expense(new_expense)
 
-    def get_edited_data(self):
-        try:
-            amount = float(self.amount_input.text())
-        except ValueError:
-            return None
+class ActionButtonDelegate(QStyledItemDelegate):
+    # One painter to draw them all, instead of a QPushButton per row.
+    edit_requested = pyqtSignal(int)
+    delete_requested = pyqtSignal(int)
 
-        return {
-            'description': self.description_edit.text(),
-            'amount': amount,
-            'category': self.category_input.text(),
-            'currency': self.currency_combo.currentText()
-        }
+    def paint(self, painter, option, index):
+        if index.column() not in (ExpenseTableModel.EDIT_COLUMN, ExpenseTableModel.DELETE_COLUMN):
+            super().paint(painter, option, index)
+            return
 
-class SummaryDialog(QDialog):
-    # Calculating your financial fate...
-    def __init__(self, weekly_summary, monthly_summary, yearly_summary, parent=None):
-        super().__init__(parent)
-        self.setWindowTitle("Expense Summary")
-        self.setFixedSize(300, 200)
-        self.setStyleSheet(f"""
-            QDialog {{
-                background-color: {COLORS['base']};
-                border-radius: 15px;
-            }}
-            QLabel {{
-                color: {COLORS['text']};
-                font-family: 'JetBrains Mono';
-                font-size: 14px;
-            }}
-        """)
-
-        layout = QVBoxLayout()
-
-        weekly_label = QLabel(f"Weekly Expenses: {weekly_summary}")
-        monthly_label = QLabel(f"Monthly Expenses: {monthly_summary}")
-        yearly_label = QLabel(f"Yearly Expenses: {yearly_summary}")
-
-        layout.addWidget(weekly_label)
-        layout.addWidget(monthly_label)
-        layout.addWidget(yearly_label)
-        layout.addStretch()
-
-        self.setLayout(layout)
+        hovered = bool(option.state & QStyle.StateFlag.State_MouseOver)
+        rect = option.rect.adjusted(4, 4, -4, -4)
+
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(COLORS['surface1'] if hovered else COLORS['surface0']))
+        painter.drawRoundedRect(rect, 5, 5)
+        painter.setPen(QColor(COLORS['text']))
+        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, index.data())
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if (index.column() in (ExpenseTableModel.EDIT_COLUMN, ExpenseTableModel.DELETE_COLUMN)
+                and event.type() == QEvent.Type.MouseButtonRelease
+                and event.button() == Qt.MouseButton.LeftButton):
+            expense_id = index.data(Qt.ItemDataRole.UserRole)
+            if index.column() == ExpenseTableModel.EDIT_COLUMN:
+                self.edit_requested.emit(expense_id)
+            else:
+                self.delete_requested.emit(expense_id)
+            return True
+        return super().editorEvent(event, model, option, index)
 
 class ExpenseTracker(QMainWindow):
     # The main event! Handles all the bill-buddiness.
+    FILTER_DELAY_MS = 250
+    COMPACT_DELAY_MS = 2000
+    BACKUP_CHECK_MS = 60 * 60 * 1000
+    # What undo and redo report for each kind of journal entry.
+    HISTORY_ACTIONS = {'insert': "adding an expense", 'update': "an edit", 'delete': "a deletion",
+                       'reset': "the reset"}
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("BillBuddy - Expense Tracker")
         self.setMinimumSize(800, 600)
+        self.startup = StartupTimer()
+        self.startup.mark('import', IMPORTED_AT)
+        self.summary_cache = storage.SummaryCache()
+        # This month's spending per budget; None until the first load comes back.
+        self.budget_monitor = None
+        self.budget_dialog = None
+        # What the description and category inputs suggest; filled in once the first page is up.
+        self.description_suggestions = autocomplete.PrefixIndex()
+        self.category_suggestions = autocomplete.PrefixIndex()
         self.setup_database()
         self.init_ui()
-        self.load_expenses()
-        self.update_daily_total()
+        self.profiler_panel = None
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self, activated=self.toggle_profiler)
+        # Text fields keep their own Ctrl+Z; anywhere else it undoes the last change to the data.
+        QShortcut(QKeySequence.StandardKey.Undo, self, activated=self.undo)
+        QShortcut(QKeySequence.StandardKey.Redo, self, activated=self.redo)
+        # Tombstones and reset rows are cleared out a batch at a time once things go quiet.
+        self.compaction_timer = QTimer(self)
+        self.compaction_timer.setSingleShot(True)
+        self.compaction_timer.timeout.connect(self.compact)
+        # A snapshot is taken at startup and then daily; checking hourly catches long sessions.
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.backup_if_due)
+        # Wakes up when the next recurring expense comes due.
+        self.recurring_timer = QTimer(self)
+        self.recurring_timer.setSingleShot(True)
+        self.recurring_timer.timeout.connect(self.catch_up_recurring)
+        # Show the empty shell first; rows and totals arrive once the event loop is running.
+        self.statusBar().showMessage("Loading expenses...")
+        QTimer.singleShot(0, self.load_first_page)
         
     def setup_database(self):
-        self.conn = sqlite3.connect('expenses.db')
-        self.cursor = self.conn.cursor()
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT,
-                description TEXT,
-                amount REAL,
-                category TEXT,
-                currency TEXT
-            )
-        ''')
-        self.conn.commit()
+        self.database = DatabaseService(parent=self)
+        self.database.failed.connect(self.show_database_error)
+        self.database.opened.connect(lambda at: self.startup.mark('db open', at))
+
+    def load_first_page(self):
+        self.expenses_model.page_loaded.connect(self.first_page_loaded)
+        self.load_expenses()
+        self.update_daily_total()
+        self.refresh_categories()
+        self.reload_budgets()
+        self.schedule_day_change()
+
+    def schedule_day_change(self):
+        # Today's total (and this week's, on Mondays) starts over at midnight.
+        now = datetime.now()
+        midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        QTimer.singleShot(int((midnight - now).total_seconds() * 1000) + 1000, self.day_changed)
+
+    def day_changed(self):
+        self.update_daily_total()
+        if self.budget_monitor and self.budget_monitor.month != datetime.now().strftime('%Y-%m'):
+            self.reload_budgets()
+        self.schedule_day_change()
+
+    def cached_read(self, fn, *args, on_result, on_error=None):
+        # fn(conn, today, *args) results come from the summary cache until a write or midnight.
+        today = datetime.now()
+        key = self.summary_cache.key(today, f"{fn.__module__}.{fn.__qualname__}", *args)
+        hit, value = self.summary_cache.get(key)
+        if hit:
+            on_result(value)
+            return
+        generation = self.summary_cache.generation
+
+        def store(value):
+            self.summary_cache.put(key, generation, value)
+            on_result(value)
+
+        self.database.submit_read(fn, today, *args, on_result=store, on_error=on_error)
+
+    @timed
+    def expenses_changed(self):
+        self.summary_cache.bump()
+        self.update_daily_total()
+        self.refresh_categories()
+
+    def first_page_loaded(self):
+        self.expenses_model.page_loaded.disconnect(self.first_page_loaded)
+        self.statusBar().clearMessage()
+        self.startup.mark('first rows')
+        self.schedule_compaction()
+        self.backup_if_due()
+        self.backup_timer.start(self.BACKUP_CHECK_MS)
+        self.catch_up_recurring()
+        self.load_descriptions()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        self.startup.mark('first paint')
         
+    @timed
     def init_ui(self):
-        self.setStyleSheet(f"""
-            QMainWindow {{
-                background-color: {COLORS['base']};
-            }}
-            QWidget {{
-                font-family: 'JetBrains Mono';
-                color: {COLORS['text']};
-            }}
-            QPushButton {{
-                background-color: {COLORS['green']};
-                border: none;
-                border-radius: 5px;
-                padding: 8px 15px;
-                color: {COLORS['mantle']};
-            }}
-            QPushButton:hover {{
-                background-color: {COLORS['teal']};
-            }}
-            QLineEdit {{
-                background-color: {COLORS['surface0']};
-                border: none;
-                border-radius: 5px;
-                padding: 8px;
-                color: {COLORS['text']};
-            }}
-            QComboBox {{
-                background-color: {COLORS['surface0']};
-                border: none;
-                border-radius: 5px;
-                padding: 8px;
-                color: {COLORS['text']};
-            }}
-            QComboBox::drop-down {{
-                border: none;
-            }}
-            QComboBox::down-arrow {{
-                image: none;
-                border: none;
-            }}
-            QComboBox QAbstractItemView {{
-                background-color: {COLORS['surface0']};
-                color: {COLORS['text']};
-                selection-background-color: {COLORS['surface1']};
-            }}
-            QTableWidget {{
-                background-color: {COLORS['surface0']};
-                border: none;
-                border-radius: 5px;
-                gridline-color: {COLORS['surface1']};
-                alternate-background-color: {COLORS['surface0']};
-            }}
-            QTableWidget::item {{
-                padding: 5px;
-                color: {COLORS['text']};
-            }}
-             QTableWidget::item:selected {{
-                background-color: {COLORS['overlay0']};
-                color: {COLORS['text']};
-            }}
-            QHeaderView::section {{
-                background-color: {COLORS['surface1']};
-                color: {COLORS['text']};
-                padding: 5px;
-                border: none;
-            }}
-             QHeaderView::section:vertical {{
-                background-color: {COLORS['surface1']};
-                color: {COLORS['text']};
-            }}
-        """)
+        # Dialogs and message boxes share this one application-wide sheet from theme.py.
+        apply_theme(QApplication.instance())
 
         icon_path = resource_path(os.path.join('icon', 'icon.ico'))
         if os.path.exists(icon_path):
@@ -425,10 +542,22 @@ class ExpenseTracker(QMainWindow):
         
         header = QHBoxLayout()
         title = QLabel("BillBuddy")
-        title.setStyleSheet(f"font-size: 32px; color: {COLORS['lavender']}; font-weight: bold;")
+        title.setProperty('variant', 'title')
         
         summary_btn = QPushButton("Summary")
         summary_btn.clicked.connect(self.show_summary)
+
+        dashboard_btn = QPushButton("Dashboard")
+        dashboard_btn.clicked.connect(self.show_dashboard)
+
+        budgets_btn = QPushButton("Budgets")
+        budgets_btn.clicked.connect(self.show_budgets)
+        
+        import_btn = QPushButton("Import")
+        import_btn.clicked.connect(self.import_expenses)
+        
+        export_btn = QPushButton("Export")
+        export_btn.clicked.connect(self.export_expenses)
         
         reset_btn = QPushButton("Reset Data")
         reset_btn.clicked.connect(self.reset_expenses)
@@ -439,15 +568,38 @@ class ExpenseTracker(QMainWindow):
         header.addWidget(title)
         header.addStretch()
         header.addWidget(summary_btn)
+        header.addWidget(dashboard_btn)
+        header.addWidget(budgets_btn)
+        header.addWidget(import_btn)
+        header.addWidget(export_btn)
         header.addWidget(reset_btn)
         header.addWidget(about_btn)
         layout.addLayout(header)
         
         # Add a label for daily total
         self.daily_total_label = QLabel("Today's Total: Calculating...")
-        self.daily_total_label.setStyleSheet(f"font-size: 24px; color: {COLORS['yellow']}; font-weight: bold;")
+        self.daily_total_label.setProperty('variant', 'total')
         self.daily_total_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(self.daily_total_label)
+
+        base_layout = QHBoxLayout()
+        base_layout.addStretch()
+        base_layout.addWidget(QLabel("Total in:"))
+        self.base_currency_combo = QComboBox()
+        self.base_currency_combo.addItem("Each currency", None)
+        for code in CURRENCIES:
+            self.base_currency_combo.addItem(code, code)
+        self.base_currency_combo.currentIndexChanged.connect(lambda _: self.update_daily_total())
+        base_layout.addWidget(self.base_currency_combo)
+        base_layout.addSpacing(20)
+        base_layout.addWidget(QLabel("Theme:"))
+        self.theme_combo = QComboBox()
+        self.theme_combo.addItems(THEMES)
+        self.theme_combo.setCurrentText(theme.current_theme)
+        self.theme_combo.currentTextChanged.connect(self.switch_theme)
+        base_layout.addWidget(self.theme_combo)
+        base_layout.addStretch()
+        layout.addLayout(base_layout)
         
         form_layout = QHBoxLayout()
         self.description_input = QLineEdit()
@@ -462,10 +614,17 @@ class ExpenseTracker(QMainWindow):
 
         self.category_input = QLineEdit()
         self.category_input.setPlaceholderText("Category")
+        self.add_completer(self.description_input, lambda: self.description_suggestions)
+        self.add_completer(self.category_input, lambda: self.category_suggestions)
 
         self.currency_combo = QComboBox()
         self.currency_combo.addItems(CURRENCIES.keys())
         self.currency_combo.setCurrentText('PHP')
+
+        self.repeat_combo = QComboBox()
+        self.repeat_combo.setToolTip("Repeat")
+        for label, schedule in (("Once", None), ("Daily", 'daily'), ("Weekly", 'weekly'), ("Monthly", 'monthly')):
+            self.repeat_combo.addItem(label, schedule)
         
         add_btn = QPushButton("Add Expense")
         add_btn.clicked.connect(self.add_expense)
@@ -474,20 +633,185 @@ class ExpenseTracker(QMainWindow):
         form_layout.addWidget(self.amount_input)
         form_layout.addWidget(self.currency_combo)
         form_layout.addWidget(self.category_input)
+        form_layout.addWidget(self.repeat_combo)
         form_layout.addWidget(add_btn)
         layout.addLayout(form_layout)
+
+        filter_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search descriptions and categories")
+        self.search_input.setClearButtonEnabled(True)
+
+        # The earliest date stands for "no bound" and shows as "Any".
+        self.from_date = QDateEdit()
+        self.to_date = QDateEdit()
+        for date_edit in (self.from_date, self.to_date):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+            date_edit.setMinimumDate(QDate(2000, 1, 1))
+            date_edit.setSpecialValueText("Any")
+            date_edit.setDate(date_edit.minimumDate())
+        self.from_date.setToolTip("From")
+        self.to_date.setToolTip("To")
+
+        self.filter_currency_combo = QComboBox()
+        self.filter_currency_combo.addItem("All currencies", None)
+        for code in CURRENCIES:
+            self.filter_currency_combo.addItem(code, code)
+
+        self.filter_category_combo = QComboBox()
+        self.filter_category_combo.addItem("All categories", None)
+
+        self.min_amount_input = QLineEdit()
+        self.min_amount_input.setPlaceholderText("Min")
+        self.max_amount_input = QLineEdit()
+        self.max_amount_input.setPlaceholderText("Max")
+        for amount_input in (self.min_amount_input, self.max_amount_input):
+            amount_input.setValidator(double_validator)
+            amount_input.setMaximumWidth(90)
+
+        clear_filters_btn = QPushButton("Clear")
+        clear_filters_btn.clicked.connect(self.clear_filters)
+
+        filter_layout.addWidget(self.search_input, 2)
+        filter_layout.addWidget(self.from_date)
+        filter_layout.addWidget(self.to_date)
+        filter_layout.addWidget(self.filter_currency_combo)
+        filter_layout.addWidget(self.filter_category_combo)
+        filter_layout.addWidget(self.min_amount_input)
+        filter_layout.addWidget(self.max_amount_input)
+        filter_layout.addWidget(clear_filters_btn)
+        layout.addLayout(filter_layout)
+
+        # Wait for a pause in typing instead of querying on every keystroke.
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.apply_filters)
+        self.search_input.textChanged.connect(self.filter_timer.start)
+        self.min_amount_input.textChanged.connect(self.filter_timer.start)
+        self.max_amount_input.textChanged.connect(self.filter_timer.start)
+        self.from_date.dateChanged.connect(self.filter_timer.start)
+        self.to_date.dateChanged.connect(self.filter_timer.start)
+        self.filter_currency_combo.currentIndexChanged.connect(self.filter_timer.start)
+        self.filter_category_combo.currentIndexChanged.connect(self.filter_timer.start)
         
-        self.expenses_table = QTableWidget()
-        self.expenses_table.setColumnCount(8)
-        self.expenses_table.setHorizontalHeaderLabels(["ID", "Date", "Description", "Amount", "Currency", "Category", "Edit", "Delete"])
+        self.expenses_model = ExpenseTableModel(self.database, self)
+        self.expenses_delegate = ActionButtonDelegate(self)
+        self.expenses_delegate.edit_requested.connect(self.edit_expense)
+        self.expenses_delegate.delete_requested.connect(self.delete_expense)
+
+        self.expenses_table = QTableView()
+        self.expenses_table.setModel(self.expenses_model)
+        self.expenses_table.setItemDelegate(self.expenses_delegate)
+        self.expenses_table.setMouseTracking(True)
+        self.expenses_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.expenses_table.horizontalHeader().setStretchLastSection(True)
         self.expenses_table.verticalHeader().setVisible(False)
+        # Uniform row heights let the view skip measuring rows it never paints.
+        self.expenses_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
 
-        self.expenses_table.setColumnWidth(6, 100)
-        self.expenses_table.setColumnWidth(7, 100)
+        self.expenses_table.setColumnWidth(ExpenseTableModel.EDIT_COLUMN, 100)
+        self.expenses_table.setColumnWidth(ExpenseTableModel.DELETE_COLUMN, 100)
+
+        # Header clicks re-run the query in another indexed order instead of sorting rows here.
+        header = self.expenses_table.horizontalHeader()
+        header.setSortIndicator(1, Qt.SortOrder.DescendingOrder)
+        header.sortIndicatorChanged.connect(self.keep_sort_indicator)
+        self.expenses_table.setSortingEnabled(True)
 
         layout.addWidget(self.expenses_table)
         
+    @timed
+    def switch_theme(self, name):
+        apply_theme(QApplication.instance(), name)
+
+    def current_filters(self):
+        filters = {}
+        if self.from_date.date() != self.from_date.minimumDate():
+            filters['start'] = storage.day_bounds(self.from_date.date().toPyDate())[0]
+        if self.to_date.date() != self.to_date.minimumDate():
+            filters['end'] = storage.day_bounds(self.to_date.date().toPyDate())[1]
+        if self.filter_currency_combo.currentData():
+            filters['currency'] = self.filter_currency_combo.currentData()
+        if self.filter_category_combo.currentData():
+            filters['category'] = self.filter_category_combo.currentData()
+        for key, amount_input in (('min_amount', self.min_amount_input), ('max_amount', self.max_amount_input)):
+            if amount_input.hasAcceptableInput():
+                filters[key] = amount_input.text()
+        return filters
+
+    @timed
+    def apply_filters(self):
+        self.expenses_model.set_query(self.search_input.text(), self.current_filters())
+
+    def clear_filters(self):
+        for widget in (self.search_input, self.min_amount_input, self.max_amount_input,
+                       self.from_date, self.to_date, self.filter_currency_combo, self.filter_category_combo):
+            widget.blockSignals(True)
+        self.search_input.clear()
+        self.min_amount_input.clear()
+        self.max_amount_input.clear()
+        self.from_date.setDate(self.from_date.minimumDate())
+        self.to_date.setDate(self.to_date.minimumDate())
+        self.filter_currency_combo.setCurrentIndex(0)
+        self.filter_category_combo.setCurrentIndex(0)
+        for widget in (self.search_input, self.min_amount_input, self.max_amount_input,
+                       self.from_date, self.to_date, self.filter_currency_combo, self.filter_category_combo):
+            widget.blockSignals(False)
+        self.apply_filters()
+
+    def keep_sort_indicator(self, column, order):
+        # Edit and Delete can't be sorted on; put the arrow back where the rows really are.
+        if column in ExpenseTableModel.SORT_COLUMNS:
+            return
+        name, descending = self.expenses_model.sort_order
+        section = next(section for section, key in ExpenseTableModel.SORT_COLUMNS.items() if key == name)
+        header = self.expenses_table.horizontalHeader()
+        header.blockSignals(True)
+        header.setSortIndicator(section, Qt.SortOrder.DescendingOrder if descending else Qt.SortOrder.AscendingOrder)
+        header.blockSignals(False)
+
+    def add_completer(self, line_edit, suggestions):
+        # The index does the matching, so the popup shows its list as it is.
+        completer = QCompleter(QStringListModel(line_edit), line_edit)
+        completer.setWidget(line_edit)
+        completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        completer.activated[str].connect(line_edit.setText)
+        line_edit.textEdited.connect(lambda text: self.suggest(completer, suggestions(), text))
+
+    @timed
+    def suggest(self, completer, suggestions, text):
+        found = suggestions.complete(text)
+        if not found or found == [text]:
+            completer.popup().hide()
+            return
+        completer.model().setStringList(found)
+        completer.complete()
+
+    def load_descriptions(self):
+        self.database.submit_read(autocomplete.load_descriptions,
+                                  on_result=lambda index: setattr(self, 'description_suggestions', index))
+
+    def refresh_categories(self):
+        self.database.submit_read(storage.category_counts, on_result=self.show_categories)
+
+    @timed
+    def show_categories(self, counts):
+        self.category_suggestions = autocomplete.PrefixIndex(counts)
+        current = self.filter_category_combo.currentData()
+        self.filter_category_combo.blockSignals(True)
+        self.filter_category_combo.clear()
+        self.filter_category_combo.addItem("All categories", None)
+        for category in sorted(category for category, _ in counts):
+            self.filter_category_combo.addItem(category, category)
+        index = self.filter_category_combo.findData(current)
+        self.filter_category_combo.setCurrentIndex(max(index, 0))
+        self.filter_category_combo.blockSignals(False)
+        if current is not None and index < 0:
+            # The category we were filtering on is gone (deleted or reset).
+            self.apply_filters()
+
     def add_expense(self):
         # Adding expense like a boss.
         description = self.description_input.text()
@@ -495,386 +819,417 @@ class ExpenseTracker(QMainWindow):
         category = self.category_input.text()
         currency = self.currency_combo.currentText()
 
-        if not all([description, amount, category]):
+        try:
+            amount = storage.validate_expense(description, amount, category, currency)
+        except ValueError as e:
             msg_box = QMessageBox()
             msg_box.setWindowTitle("Input Error")
-            msg_box.setText("Please fill in all fields")
+            msg_box.setText(str(e))
             msg_box.setIcon(QMessageBox.Icon.Warning)
-            msg_box.setStyleSheet(f"""
-                QMessageBox {{
-                    background-color: {COLORS['base']};
-                    color: {COLORS['text']};
-                    font-family: 'JetBrains Mono';
-                }}
-                QLabel {{
-                     color: {COLORS['text']};
-                }}
-                QPushButton {{
-                    background-color: {COLORS['surface0']};
-                    border: none;
-                    border-radius: 5px;
-                    padding: 5px 10px;
-                    color: {COLORS['text']};
-                }}
-                QPushButton:hover {{
-                    background-color: {COLORS['surface1']};
-                }}
-            """)
             msg_box.exec()
             return
 
-        try:
-            amount = float(amount)
-        except ValueError:
-            msg_box = QMessageBox()
-            msg_box.setWindowTitle("Input Error")
-            msg_box.setText("Invalid amount")
-            msg_box.setIcon(QMessageBox.Icon.Warning)
-            msg_box.setStyleSheet(f"""
-                QMessageBox {{
-                    background-color: {COLORS['base']};
-                    color: {COLORS['text']};
-                    font-family: 'JetBrains Mono';
-                }}
-                QLabel {{
-                     color: {COLORS['text']};
-                }}
-                QPushButton {{
-                    background-color: {COLORS['surface0']};
-                    border: none;
-                    border-radius: 5px;
-                    padding: 5px 10px;
-                    color: {COLORS['text']};
-                }}
-                QPushButton:hover {{
-                    background-color: {COLORS['surface1']};
-                }}
-            """)
-            msg_box.exec()
+        schedule = self.repeat_combo.currentData()
+        if schedule:
+            # The rule comes due at once, so catching up adds today's occurrence too.
+            self.database.submit(recurring.add_rule, description, amount, category, currency, schedule)
+            self.catch_up_recurring()
+            self.clear_inputs()
             return
 
         date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        self.cursor.execute('''
-            INSERT INTO expenses (date, description, amount, category, currency)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (date, description, amount, category, currency))
-        self.conn.commit()
-
-        self.load_expenses()
+        self.database.submit(storage.add_expense, description, amount, category, currency, date,
+                             on_result=self.expense_added)
         self.clear_inputs()
-        self.update_daily_total()
 
+    def expense_added(self, expense_data):
+        self.expenses_model.insert_expense(expense_data)
+        self.description_suggestions.add(expense_data[storage.COLUMN_INDEX['description']])
+        self.expenses_changed()
+        self.check_budgets(new=expense_data)
+
+    @timed
     def load_expenses(self):
         # Shhh, the database is sleeping.
-        self.cursor.execute('SELECT * FROM expenses ORDER BY date DESC')
-        expenses = self.cursor.fetchall()
-
-        self.expenses_table.setRowCount(len(expenses))
-        for i, expense in enumerate(expenses):
-            db_id = expense[0]
-            db_date = expense[1]
-            db_description = expense[2]
-            db_amount = expense[3]
-            db_category = expense[4]
-            db_currency = expense[5] if len(expense) > 5 else 'PHP'
-
-            item_id = QTableWidgetItem(str(db_id))
-            item_date = QTableWidgetItem(str(db_date))
-            item_description = QTableWidgetItem(str(db_description))
-            
-            symbol = CURRENCIES.get(db_currency, '')
-            item_amount = QTableWidgetItem(f"{symbol}{db_amount:,.2f}")
-
-            item_currency = QTableWidgetItem(str(db_currency))
-            item_category = QTableWidgetItem(str(db_category))
-
-            item_id.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            item_date.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            item_description.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            item_amount.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            item_currency.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            item_category.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-
-            self.expenses_table.setItem(i, 0, item_id)
-            self.expenses_table.setItem(i, 1, item_date)
-            self.expenses_table.setItem(i, 2, item_description)
-            self.expenses_table.setItem(i, 3, item_amount)
-            self.expenses_table.setItem(i, 4, item_currency)
-            self.expenses_table.setItem(i, 5, item_category)
-
-            edit_button = QPushButton("Edit")
-            delete_button = QPushButton("Delete")
-
-            button_style = f"""
-                QPushButton {{
-                    background-color: {COLORS['surface0']};
-                    border: none;
-                    border-radius: 5px;
-                    padding: 4px 8px;
-                    color: {COLORS['text']};
-                }}
-                QPushButton:hover {{
-                    background-color: {COLORS['surface1']};
-                }}
-            """
-            edit_button.setStyleSheet(button_style)
-            delete_button.setStyleSheet(button_style)
-
-            edit_button.clicked.connect(lambda checked, id=db_id: self.edit_expense(id))
-            delete_button.clicked.connect(lambda checked, id=db_id: self.delete_expense(id))
-
-            self.expenses_table.setCellWidget(i, 6, edit_button)
-            self.expenses_table.setCellWidget(i, 7, delete_button)
+        self.expenses_model.reload()
 
     def clear_inputs(self):
         # Tidying up after adding an expense.
         self.description_input.clear()
         self.amount_input.clear()
         self.category_input.clear()
+        self.repeat_combo.setCurrentIndex(0)
 
     def edit_expense(self, expense_id):
         # Time to rewrite history (of your spending).
-        self.cursor.execute('SELECT * FROM expenses WHERE id = ?', (expense_id,))
-        expense_data = self.cursor.fetchone()
+        self.database.submit_read(storage.get_expense, expense_id, on_result=self.open_edit_dialog)
 
+    def open_edit_dialog(self, expense_data):
         if expense_data:
+            from dialogs import EditExpenseDialog
             dialog = EditExpenseDialog(expense_data, self)
             if dialog.exec() == QDialog.DialogCode.Accepted:
                 edited_data = dialog.get_edited_data()
                 if edited_data:
-                    self.cursor.execute('''
-                        UPDATE expenses
-                        SET description = ?, amount = ?, category = ?, currency = ?
-                        WHERE id = ?
-                    ''', (edited_data['description'], edited_data['amount'], 
-                         edited_data['category'], edited_data['currency'], expense_id))
-                    self.conn.commit()
-                    self.load_expenses()
-                    self.update_daily_total()
-                    
-                    info_box = QMessageBox()
-                    info_box.setWindowTitle('Edit Complete')
-                    info_box.setText("Expense entry has been updated.")
-                    info_box.setIcon(QMessageBox.Icon.Information)
-                    info_box.setStyleSheet(f"""
-                        QMessageBox {{
-                            background-color: {COLORS['base']};
-                            color: {COLORS['text']};
-                            font-family: 'JetBrains Mono';
-                        }}
-                        QLabel {{
-                             color: {COLORS['text']};
-                        }}
-                        QPushButton {{
-                            background-color: {COLORS['surface0']};
-                            border: none;
-                            border-radius: 5px;
-                            padding: 5px 10px;
-                            color: {COLORS['text']};
-                        }}
-                        QPushButton:hover {{
-                            background-color: {COLORS['surface1']};
-                        }}
-                    """)
-                    info_box.exec()
+                    self.database.submit(storage.update_expense, expense_data[0], edited_data['description'],
+                                         edited_data['amount'], edited_data['category'], edited_data['currency'],
+                                         on_result=self.expense_updated)
                 else:
                     msg_box = QMessageBox()
                     msg_box.setWindowTitle("Input Error")
                     msg_box.setText("Invalid amount entered.")
                     msg_box.setIcon(QMessageBox.Icon.Warning)
-                    msg_box.setStyleSheet(f"""
-                        QMessageBox {{
-                            background-color: {COLORS['base']};
-                            color: {COLORS['text']};
-                            font-family: 'JetBrains Mono';
-                        }}
-                        QLabel {{
-                             color: {COLORS['text']};
-                        }}
-                        QPushButton {{
-                            background-color: {COLORS['surface0']};
-                            border: none;
-                            border-radius: 5px;
-                            padding: 5px 10px;
-                            color: {COLORS['text']};
-                        }}
-                        QPushButton:hover {{
-                            background-color: {COLORS['surface1']};
-                        }}
-                    """)
                     msg_box.exec()
 
+    def expense_updated(self, result):
+        old_expense, new_expense = result
+        if new_expense is None:
+            # Deleted or reset from elsewhere before the edit ran: show what is there now.
+            self.load_expenses()
+            self.expenses_changed()
+            self.statusBar().showMessage("That expense no longer exists.", 5000)
+            return
+        self.expenses_model.update_expense(old_expense, new_expense)
+        self.description_suggestions.add(new_expense[storage.COLUMN_INDEX['description']])
+        self.expenses_changed()
+        self.check_budgets(old_expense, new_expense)
+
+        info_box = QMessageBox()
+        info_box.setWindowTitle('Edit Complete')
+        info_box.setText("Expense entry has been updated.")
+        info_box.setIcon(QMessageBox.Icon.Information)
+        info_box.exec()
+
     def delete_expense(self, expense_id):
         # Making those expenses disappear like magic!
         msg_box = QMessageBox()
         msg_box.setWindowTitle('Confirm Deletion')
-        msg_box.setText("Are you sure you want to delete this expense entry? This action cannot be undone.")
+        msg_box.setText("Are you sure you want to delete this expense entry? You can undo this with Ctrl+Z.")
         msg_box.setIcon(QMessageBox.Icon.Warning)
         msg_box.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         msg_box.setDefaultButton(QMessageBox.StandardButton.No)
 
-        msg_box.setStyleSheet(f"""
-            QMessageBox {{
-                background-color: {COLORS['base']};
-                color: {COLORS['text']};
-                font-family: 'JetBrains Mono';
-            }}
-            QLabel {{
-                 color: {COLORS['text']};
-            }}
-            QPushButton {{
-                background-color: {COLORS['surface0']};
-                border: none;
-                border-radius: 5px;
-                padding: 5px 10px;
-                color: {COLORS['text']};
-            }}
-            QPushButton:hover {{
-                    background-color: {COLORS['surface1']};
-                }}
-            """)
-
         reply = msg_box.exec()
 
         if reply == QMessageBox.StandardButton.Yes:
-            self.cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
-            self.conn.commit()
+            self.database.submit(storage.delete_expense, expense_id, on_result=self.expense_deleted)
+
+    def expense_deleted(self, expense_data):
+        if expense_data is None:
+            # Already gone (deleted twice, or undone from elsewhere): show what is there now.
             self.load_expenses()
-            self.update_daily_total()
-            info_box = QMessageBox()
-            info_box.setWindowTitle('Deletion Complete')
-            info_box.setText("Expense entry has been deleted.")
-            info_box.setIcon(QMessageBox.Icon.Information)
-            info_box.setStyleSheet(f"""
-                QMessageBox {{
-                    background-color: {COLORS['base']};
-                    color: {COLORS['text']};
-                    font-family: 'JetBrains Mono';
-                }}
-                QLabel {{
-                     color: {COLORS['text']};
-                }}
-                QPushButton {{
-                    background-color: {COLORS['surface0']};
-                    border: none;
-                    border-radius: 5px;
-                    padding: 5px 10px;
-                    color: {COLORS['text']};
-                }}
-                QPushButton:hover {{
-                    background-color: {COLORS['surface1']};
-                }}
-            """)
-            info_box.exec()
+            self.expenses_changed()
+            return
+        self.expenses_model.remove_expense(expense_data)
+        self.expenses_changed()
+        self.check_budgets(old=expense_data)
+        self.schedule_compaction()
+        info_box = QMessageBox()
+        info_box.setWindowTitle('Deletion Complete')
+        info_box.setText("Expense entry has been deleted.")
+        info_box.setIcon(QMessageBox.Icon.Information)
+        info_box.exec()
+
+    def import_expenses(self):
+        # Years of bank statements, one big gulp.
+        import importer
+        path, _ = QFileDialog.getOpenFileName(self, "Import Expenses", "", "Bank exports (*.csv *.ofx *.qfx)")
+        if not path:
+            return
+
+        self.import_progress = ImportProgress(self)
+        self.import_progress.advanced.connect(self.show_import_progress)
+        self.statusBar().showMessage(f"Importing {os.path.basename(path)}...")
+        self.database.submit(importer.import_file, path, self.import_progress.advanced.emit,
+                             self.currency_combo.currentText(), on_result=self.expenses_imported,
+                             on_error=self.import_failed)
+
+    def show_import_progress(self, stats):
+        self.statusBar().showMessage(f"Importing... {stats['imported']:,} added, {stats['duplicates']:,} duplicates skipped")
+
+    def expenses_imported(self, stats):
+        self.statusBar().showMessage(
+            f"Imported {stats['imported']:,} expenses "
+            f"({stats['duplicates']:,} duplicates and {stats['invalid']:,} invalid rows skipped)", 10000)
+        self.load_expenses()
+        self.expenses_changed()
+        self.reload_budgets()
+        self.load_descriptions()
+
+    def import_failed(self, message):
+        # The import is one transaction, so none of it was kept and there is nothing to reload.
+        self.statusBar().clearMessage()
+        self.show_database_error(message)
+
+    def export_expenses(self):
+        # Taking your data with you, a batch at a time.
+        import exporter
+        path, _ = QFileDialog.getSaveFileName(self, "Export Expenses", "expenses.csv",
+                                              "CSV (*.csv);;JSON Lines (*.jsonl);;Parquet (*.parquet)")
+        if not path:
+            return
+
+        self.statusBar().showMessage(f"Exporting to {os.path.basename(path)}...")
+        self.database.submit_read(exporter.export, path,
+                                  on_result=lambda count: self.statusBar().showMessage(
+                                      f"Exported {count:,} expenses to {os.path.basename(path)}", 10000))
 
     def reset_expenses(self):
         # Initiating financial doomsday... just kidding!
         msg_box = QMessageBox()
         msg_box.setWindowTitle('Confirm Reset')
-        msg_box.setText("Are you sure you want to delete all expense data? This action cannot be undone.")
+        msg_box.setText("Are you sure you want to delete all expense data? You can undo this with Ctrl+Z.")
         msg_box.setIcon(QMessageBox.Icon.Warning)
         msg_box.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
         msg_box.setDefaultButton(QMessageBox.StandardButton.No)
 
-        msg_box.setStyleSheet(f"""
-            QMessageBox {{
-                background-color: {COLORS['base']};
-                color: {COLORS['text']};
-                font-family: 'JetBrains Mono';
-            }}
-            QLabel {{
-                 color: {COLORS['text']};
-            }}
-            QPushButton {{
-                background-color: {COLORS['surface0']};
-                border: none;
-                border-radius: 5px;
-                padding: 5px 10px;
-                color: {COLORS['text']};
-            }}
-            QPushButton:hover {{
-                    background-color: {COLORS['surface1']};
-                }}
-            """)
-
         reply = msg_box.exec()
 
         if reply == QMessageBox.StandardButton.Yes:
-            self.cursor.execute('DELETE FROM expenses')
-            self.conn.commit()
-            self.load_expenses()
-            self.update_daily_total()
-            info_box = QMessageBox()
-            info_box.setWindowTitle('Reset Complete')
-            info_box.setText("All expense data has been deleted.")
-            info_box.setIcon(QMessageBox.Icon.Information)
-            info_box.setStyleSheet(f"""
-                QMessageBox {{
-                    background-color: {COLORS['base']};
-                    color: {COLORS['text']};
-                    font-family: 'JetBrains Mono';
-                }}
-                QLabel {{
-                     color: {COLORS['text']};
-                }}
-                QPushButton {{
-                    background-color: {COLORS['surface0']};
-                    border: none;
-                    border-radius: 5px;
-                    padding: 5px 10px;
-                    color: {COLORS['text']};
-                }}
-                QPushButton:hover {{
-                    background-color: {COLORS['surface1']};
-                }}
-            """)
-            info_box.exec()
-
-    def show_summary(self):
-        # Unveiling the truth about your spending habits.
-        today = datetime.now()
-        year = today.year
-        month = today.month
+            self.database.submit(storage.reset_expenses, on_result=self.expenses_reset)
+
+    def expenses_reset(self, _):
+        self.expenses_model.clear()
+        self.expenses_changed()
+        self.reload_budgets()
+        self.schedule_compaction()
+        info_box = QMessageBox()
+        info_box.setWindowTitle('Reset Complete')
+        info_box.setText("All expense data has been deleted.")
+        info_box.setIcon(QMessageBox.Icon.Information)
+        info_box.exec()
+
+    def undo(self):
+        self.database.submit(storage.undo,
+                             on_result=lambda action: self.history_replayed(action, "Undid", "Nothing to undo."))
+
+    def redo(self):
+        self.database.submit(storage.redo,
+                             on_result=lambda action: self.history_replayed(action, "Redid", "Nothing to redo."))
+
+    def history_replayed(self, action, verb, nothing):
+        if action is None:
+            self.statusBar().showMessage(nothing, 5000)
+            return
+        # One row or the whole table may have come back, so start the view over.
+        self.load_expenses()
+        self.expenses_changed()
+        self.reload_budgets()
+        self.statusBar().showMessage(f"{verb} {self.HISTORY_ACTIONS[action]}.", 5000)
+        self.schedule_compaction()
 
-        start_of_week = today - timedelta(days=today.weekday())
-        start_of_week_str = start_of_week.strftime("%Y-%m-%d 00:00:00")
-        today_str = today.strftime("%Y-%m-%d 23:59:59")
+    def schedule_compaction(self):
+        self.compaction_timer.start(self.COMPACT_DELAY_MS)
 
-        self.cursor.execute("SELECT SUM(amount), currency FROM expenses WHERE date BETWEEN ? AND ? GROUP BY currency", (start_of_week_str, today_str))
-        weekly_results = self.cursor.fetchall()
-        weekly_summary_str = ", ".join([f"{CURRENCIES.get(curr, '')}{total:,.2f} {curr}" for total, curr in weekly_results]) or "N/A"
+    def compact(self):
+        # One short batch per writer turn, so edits queued meanwhile go first.
+        self.database.submit(maintenance.idle_step, on_result=lambda count: count and self.compaction_timer.start(0))
 
-        self.cursor.execute("SELECT SUM(amount), currency FROM expenses WHERE strftime('%Y-%m', date) = ? GROUP BY currency", (f'{year:04d}-{month:02d}',))
-        monthly_results = self.cursor.fetchall()
-        monthly_summary_str = ", ".join([f"{CURRENCIES.get(curr, '')}{total:,.2f} {curr}" for total, curr in monthly_results]) or "N/A"
+    def catch_up_recurring(self):
+        self.database.submit(recurring.catch_up, on_result=self.recurring_caught_up)
 
-        self.cursor.execute("SELECT SUM(amount), currency FROM expenses WHERE strftime('%Y', date) = ? GROUP BY currency", (str(year),))
-        yearly_results = self.cursor.fetchall()
-        yearly_summary_str = ", ".join([f"{CURRENCIES.get(curr, '')}{total:,.2f} {curr}" for total, curr in yearly_results]) or "N/A"
+    def recurring_caught_up(self, result):
+        added, due = result
+        if added:
+            # However long the app was closed, the missed ones arrive as one write and one reload.
+            self.load_expenses()
+            self.expenses_changed()
+            self.reload_budgets()
+            self.statusBar().showMessage(f"Added {added:,} recurring expense{'s' if added != 1 else ''}.", 5000)
+        if due is not None:
+            # A QTimer can't wait much past three weeks; looking again daily is plenty.
+            wait = min(max((due - datetime.now()).total_seconds(), 0), 24 * 60 * 60)
+            self.recurring_timer.start(int(wait * 1000) + 1000)
+
+    def backup_if_due(self):
+        # On a reader: the copy holds only a read transaction, so writes carry on meanwhile.
+        self.database.submit_read(maintenance.snapshot_if_due, on_result=self.backup_taken,
+                                  on_error=self.backup_failed)
+
+    def backup_taken(self, path):
+        if path:
+            self.statusBar().showMessage(f"Backed up to {os.path.basename(path)}.", 5000)
+
+    def backup_failed(self, error):
+        self.statusBar().showMessage(f"Backup failed: {error}", 10000)
+
+    @timed
+    def show_summary(self):
+        # Unveiling the truth about your spending habits.
+        self.cached_read(storage.summary_totals, on_result=self.open_summary_dialog)
 
-        dialog = SummaryDialog(weekly_summary_str, monthly_summary_str, yearly_summary_str, self)
+    def open_summary_dialog(self, results):
+        base_currency = self.base_currency_combo.currentData()
+        if base_currency is None:
+            self.show_summary_dialog(results)
+            return
+        import exchange
+        self.cached_read(exchange.grand_totals, base_currency,
+                         on_result=lambda converted: self.show_summary_dialog(results, converted))
+
+    def show_summary_dialog(self, results, converted=None):
+        weekly_results, monthly_results, yearly_results = results
+        weekly_summary_str = storage.format_totals(weekly_results)
+        monthly_summary_str = storage.format_totals(monthly_results)
+        yearly_summary_str = storage.format_totals(yearly_results)
+
+        if converted is not None:
+            import exchange
+            _, weekly, monthly, yearly = converted
+            converted = (self.base_currency_combo.currentData(), exchange.format_grand_total(weekly),
+                         exchange.format_grand_total(monthly), exchange.format_grand_total(yearly))
+
+        from dialogs import SummaryDialog
+        dialog = SummaryDialog(weekly_summary_str, monthly_summary_str, yearly_summary_str, self, converted,
+                               trends=True)
+        # Trends fill in while the dialog is open; results for a closed dialog are dropped.
+        self.summary_dialog = dialog
+        dialog.currency_changed.connect(lambda currency: self.load_trends(dialog, currency))
+        self.load_trends(dialog, self.base_currency_combo.currentData())
+        dialog.exec()
+        self.summary_dialog = None
+        dialog.deleteLater()
+
+    def load_trends(self, dialog, currency):
+        import analytics
+        self.cached_read(
+            analytics.report, currency,
+            on_result=lambda report: self.summary_dialog is dialog and dialog.show_report(
+                report, analytics.format_report(report)),
+            on_error=lambda message: self.summary_dialog is dialog and dialog.report_failed(message))
+
+    def reload_budgets(self):
+        # On the writer, not a reader: the totals then include exactly the writes queued
+        # before this, and deltas from the ones after arrive once it is in place.
+        self.database.submit(budgets.load, datetime.now(), on_result=self.budgets_loaded)
+
+    def budgets_loaded(self, monitor):
+        self.budget_monitor = monitor
+        self.refresh_budget_dialog()
+
+    def check_budgets(self, old=None, new=None):
+        # Only the budgets this one row counts towards move; nothing is read back.
+        if self.budget_monitor is None:
+            return
+        alerts = self.budget_monitor.apply(old, new)
+        self.refresh_budget_dialog()
+        over = [budgets.describe(*alert[:4]) for alert in alerts if alert[4] == budgets.OVER]
+        if over:
+            msg_box = QMessageBox()
+            msg_box.setWindowTitle("Over Budget")
+            msg_box.setText("\n".join(over))
+            msg_box.setIcon(QMessageBox.Icon.Warning)
+            msg_box.exec()
+        elif alerts:
+            # Past the warning line only: worth a note, not an interruption.
+            self.statusBar().showMessage(
+                "Nearing budget: " + "; ".join(budgets.describe(*alert[:4]) for alert in alerts), 10000)
+
+    def refresh_budget_dialog(self):
+        if self.budget_dialog is not None and self.budget_monitor is not None:
+            self.budget_dialog.show_budgets(budgets.format_report(self.budget_monitor.report()))
+
+    def show_budgets(self):
+        from dialogs import BudgetDialog
+        dialog = BudgetDialog(self.base_currency_combo.currentData() or self.currency_combo.currentText(), self)
+        self.budget_dialog = dialog
+        dialog.budget_set.connect(self.set_budget)
+        dialog.budget_removed.connect(self.remove_budget)
+        self.refresh_budget_dialog()
         dialog.exec()
+        self.budget_dialog = None
+        dialog.deleteLater()
+
+    def set_budget(self, category, currency, amount):
+        try:
+            amount = Money.parse(amount, currency).minor
+            if amount <= 0:
+                raise ValueError("Please enter a monthly limit above zero")
+        except ValueError as e:
+            msg_box = QMessageBox()
+            msg_box.setWindowTitle("Input Error")
+            msg_box.setText(str(e))
+            msg_box.setIcon(QMessageBox.Icon.Warning)
+            msg_box.exec()
+            return
+        self.database.submit(budgets.set_budget, category, currency, amount)
+        self.reload_budgets()
+
+    def remove_budget(self, category, currency):
+        self.database.submit(budgets.remove_budget, category, currency)
+        self.reload_budgets()
 
     def show_about(self):
         # Prepare for an epic tale of BillBuddy!
+        from dialogs import AboutDialog
         dialog = AboutDialog(self)
         dialog.exec()
 
+    def show_dashboard(self):
+        from dialogs import DashboardDialog
+        dialog = DashboardDialog(self.base_currency_combo.currentData() or self.currency_combo.currentText(), self)
+        self.dashboard_dialog = dialog
+        dialog.data_requested.connect(lambda *request: self.load_dashboard(dialog, *request))
+        dialog.request()
+        dialog.exec()
+        self.dashboard_dialog = None
+        dialog.deleteLater()
+
+    def load_dashboard(self, dialog, currency, granularity, period):
+        # Both charts read the per-day rollups, so ten years is a few thousand points at most.
+        today = datetime.now()
+        self.cached_read(storage.spending_series, currency, granularity,
+                         on_result=lambda rows: self.dashboard_dialog is dialog and dialog.show_series(
+                             rows, currency, granularity, today))
+        self.cached_read(storage.category_totals, currency, period,
+                         on_result=lambda totals: self.dashboard_dialog is dialog and dialog.show_categories(
+                             totals, currency, period))
+
+    def toggle_profiler(self):
+        # Ctrl+Shift+P: start measuring and show the numbers, or hide them again.
+        if self.profiler_panel is not None:
+            self.profiler_panel.close()
+            return
+        from dialogs import ProfilerPanel
+        PROFILER.enable()
+        self.profiler_panel = ProfilerPanel(self)
+        self.profiler_panel.finished.connect(self.profiler_closed)
+        self.profiler_panel.show()
+
+    def profiler_closed(self):
+        self.profiler_panel.deleteLater()
+        self.profiler_panel = None
+        # Started from BILLBUDDY_PROFILE, it keeps recording for the report at exit.
+        PROFILER.enable(bool(PROFILER.target))
+
+    @timed
     def update_daily_total(self):
-        today = datetime.now().strftime("%Y-%m-%d")
-        self.cursor.execute('SELECT SUM(amount), currency FROM expenses WHERE date LIKE ? GROUP BY currency', (f'{today}%',))
-        daily_results = self.cursor.fetchall()
-
-        if daily_results:
-            summary_parts = []
-            for total, currency in daily_results:
-                symbol = CURRENCIES.get(currency, '')
-                summary_parts.append(f'{symbol}{total:,.2f} {currency}')
-            summary_str = ", ".join(summary_parts)
-            self.daily_total_label.setText(f"Today's Total: {summary_str}")
-        else:
-            self.daily_total_label.setText("Today's Total: 0.00")
+        self.cached_read(storage.daily_totals, on_result=self.show_daily_total)
+
+    @timed
+    def show_daily_total(self, daily_results):
+        summary_str = storage.format_totals(daily_results, '0.00')
+        self.daily_total_label.setText(f"Today's Total: {summary_str}")
+
+        base_currency = self.base_currency_combo.currentData()
+        if base_currency is not None and daily_results:
+            import exchange
+            self.cached_read(exchange.daily_total, base_currency,
+                             on_result=lambda converted: self.daily_total_label.setText(
+                                 f"Today's Total: {summary_str} ≈ {exchange.format_grand_total(converted)}"))
+
+    def show_database_error(self, message):
+        msg_box = QMessageBox()
+        msg_box.setWindowTitle("Database Error")
+        msg_box.setText(f"Something went wrong talking to the database:\n{message}")
+        msg_box.setIcon(QMessageBox.Icon.Critical)
+        msg_box.exec()
+
+    def closeEvent(self, event):
+        # Let the worker finish its last commit before we go.
+        self.database.close()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
     # Let the expense tracking begin!
@@ -0,0 +1,130 @@
+"""Keeping expenses.db safe and small.
+
+snapshot() copies the database into backups/ beside it with SQLite's online
+backup API, BACKUP_PAGES pages per step, and keeps the newest BACKUP_KEEP
+copies. The whole copy runs inside one read transaction: under WAL writers
+never wait for it, and their commits can't make it start over, so every
+snapshot is the database as of one moment.
+
+tidy() is the file's share of idle-time upkeep: it hands free pages back with
+PRAGMA incremental_vacuum a few at a time, then lets PRAGMA optimize refresh
+the planner's statistics.
+"""
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import storage
+
+BACKUP_DIRECTORY = 'backups'
+BACKUP_KEEP = 7                      # newest snapshots kept, older ones deleted
+BACKUP_INTERVAL = timedelta(days=1)  # the newest snapshot may get this old before the next
+BACKUP_PAGES = 1024                  # pages copied per backup step
+VACUUM_PAGES = 2048                  # free pages handed back per tidy() step
+ANALYSIS_LIMIT = 1000                # rows per index PRAGMA optimize may sample
+SNAPSHOT_FORMAT = '%Y%m%d-%H%M%S'
+
+# PRAGMA auto_vacuum values.
+INCREMENTAL = 2
+
+
+def database_path(conn):
+    return conn.execute('PRAGMA database_list').fetchone()[2]
+
+
+def backup_directory(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), BACKUP_DIRECTORY)
+
+
+def snapshots(path, directory=None):
+    """ (taken, file) pairs for the database at path, newest first """
+    directory = directory or backup_directory(path)
+    stem = os.path.splitext(os.path.basename(path))[0] + '-'
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in names:
+        if not (name.startswith(stem) and name.endswith('.db')):
+            continue
+        try:
+            taken = datetime.strptime(name[len(stem):-len('.db')], SNAPSHOT_FORMAT)
+        except ValueError:
+            continue
+        found.append((taken, os.path.join(directory, name)))
+    return sorted(found, reverse=True)
+
+
+def snapshot(conn, directory=None, keep=BACKUP_KEEP, progress=None, now=None):
+    """ Copy the database into directory (default: backups/ beside it), then delete all
+    but the newest keep copies; returns the new file's path. progress(copied, total)
+    is called with page counts after every step """
+    path = database_path(conn)
+    directory = directory or backup_directory(path)
+    os.makedirs(directory, exist_ok=True)
+    taken = (now or datetime.now()).strftime(SNAPSHOT_FORMAT)
+    target_path = os.path.join(directory, f"{os.path.splitext(os.path.basename(path))[0]}-{taken}.db")
+    # Written under another name first, so a half-made copy is never mistaken for a snapshot.
+    partial_path = target_path + '.partial'
+    target = sqlite3.connect(partial_path)
+    try:
+        conn.execute('BEGIN')
+        try:
+            # BEGIN is deferred: reading starts the transaction the backup steps then share.
+            conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            conn.backup(target, pages=BACKUP_PAGES, sleep=0, progress=progress and (
+                lambda status, remaining, total: progress(total - remaining, total)))
+        finally:
+            conn.rollback()
+        # The copy carries the WAL flag over; a snapshot should be one self-contained file.
+        target.execute('PRAGMA journal_mode = DELETE')
+    except Exception:
+        target.close()
+        os.remove(partial_path)
+        raise
+    target.close()
+    os.replace(partial_path, target_path)
+    for _, old in snapshots(path, directory)[keep:]:
+        os.remove(old)
+    return target_path
+
+
+def snapshot_if_due(conn, directory=None, interval=BACKUP_INTERVAL, now=None):
+    """ snapshot() when the newest one is older than interval; the new path, or None """
+    now = now or datetime.now()
+    latest = snapshots(database_path(conn), directory)
+    if latest and now - latest[0][0] < interval:
+        return None
+    return snapshot(conn, directory, now=now)
+
+
+def tidy(conn, pages=VACUUM_PAGES):
+    """ One short step of upkeep on a writable connection; returns the free pages still
+    to hand back, so callers repeat it, between other writes, until that is 0 """
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != INCREMENTAL:
+        # Files made before auto_vacuum was set need one full VACUUM to switch over;
+        # only worth it, and only done, once a quarter of the file is free.
+        if free * 4 >= conn.execute('PRAGMA page_count').fetchone()[0] > 0:
+            conn.execute(f"PRAGMA auto_vacuum = {storage.PRAGMAS['auto_vacuum']}")
+            conn.execute('VACUUM')
+        free = 0
+    elif free:
+        # Each step of the statement frees one page, and execute() stops after the first
+        # of a statement without result columns; executescript() runs it to the end.
+        conn.executescript(f'PRAGMA incremental_vacuum({pages})')
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if free:
+            return free
+    conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+    conn.execute('PRAGMA optimize')
+    # Lets the file shrink now rather than at the next automatic checkpoint; never waits.
+    conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+    return free
+
+
+def idle_step(conn):
+    """ What the window runs while nobody is typing: a compact() batch while there are
+    hidden rows to clear out, then tidy() steps; 0 once there is nothing left to do """
+    return storage.compact(conn) or tidy(conn)
@@ -0,0 +1,84 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+CURRENCIES = {
+    'USD': '$',
+    'EUR': '€',
+    'GBP': '£',
+    'JPY': '¥',
+    'PHP': '₱',
+    'AUD': 'A$',
+    'CAD': 'C$',
+    'CHF': 'Fr',
+    'CNY': '¥',
+    'INR': '₹'
+}
+
+# Digits after the decimal point; anything not listed uses cents.
+EXPONENTS = {
+    'JPY': 0,
+}
+DEFAULT_EXPONENT = 2
+
+
+def exponent(currency):
+    return EXPONENTS.get(currency, DEFAULT_EXPONENT)
+
+
+def scale_sql(currency_column='currency'):
+    """ SQL expression for how many minor units make one major unit of a row's currency """
+    cases = " ".join(f"WHEN '{code}' THEN {10 ** digits}" for code, digits in EXPONENTS.items())
+    return f"CASE {currency_column} {cases} ELSE {10 ** DEFAULT_EXPONENT} END"
+
+
+def major_sql(column='amount', currency_column='currency'):
+    """ SQL expression turning a minor-unit column back into major units, for export """
+    return f"({column} * 1.0 / {scale_sql(currency_column)})"
+
+
+class Money:
+    """ An exact amount, held as an integer count of the currency's minor units """
+    __slots__ = ('minor', 'currency')
+
+    def __init__(self, minor, currency):
+        self.minor = int(minor)
+        self.currency = currency
+
+    @classmethod
+    def parse(cls, value, currency):
+        """ Parse user input like '12.5' or 12.5; rounds half up to the currency's precision """
+        try:
+            amount = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError("Invalid amount")
+        if not amount.is_finite():
+            raise ValueError("Invalid amount")
+        minor = amount.scaleb(exponent(currency)).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        return cls(minor, currency)
+
+    def to_decimal(self):
+        return Decimal(self.minor).scaleb(-exponent(self.currency))
+
+    def __add__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        if other.currency != self.currency:
+            raise ValueError(f"Cannot add {other.currency} to {self.currency}")
+        return Money(self.minor + other.minor, self.currency)
+
+    def __sub__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self + Money(-other.minor, other.currency)
+
+    def __eq__(self, other):
+        return isinstance(other, Money) and (self.minor, self.currency) == (other.minor, other.currency)
+
+    def __hash__(self):
+        return hash((self.minor, self.currency))
+
+    def __repr__(self):
+        return f"Money({self.minor}, {self.currency!r})"
+
+    def __str__(self):
+        # Same look as before: symbol, thousands separators, the currency's own decimals.
+        return f"{CURRENCIES.get(self.currency, '')}{self.to_decimal():,.{exponent(self.currency)}f}"
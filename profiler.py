@@ -0,0 +1,311 @@
+"""Where did the time go? Timing spans and per-query SQLite statistics.
+
+Off unless asked for. BILLBUDDY_PROFILE=1 starts with it on; set it to a file
+path instead to also append a JSON report there when the process exits. In the
+window, Ctrl+Shift+P toggles it along with a live panel.
+
+Every connection storage opens is a ProfiledConnection. While the profiler is
+on, its cursors time each statement from execute to the last fetched row, a
+trace callback captures the statement with its bound values, and a progress
+handler counts virtual machine steps. The slowest statements keep their
+EXPLAIN QUERY PLAN.
+"""
+import atexit
+import functools
+import inspect
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+SAMPLES = 2000          # latest timings kept per span and per statement
+SLOWEST = 10            # slowest single statements kept, with their plans
+PROGRESS_STEPS = 1000   # virtual machine instructions between progress callbacks
+
+
+def percentile(values, fraction):
+    """ Nearest-rank percentile of a non-empty sequence """
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+
+def _stats(samples):
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 0.5), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'max_ms': round(max(samples), 3),
+        'total_ms': round(sum(samples), 3),
+    }
+
+
+class Profiler:
+    """ Thread-safe store of span and query timings; every method is cheap while disabled """
+
+    def __init__(self, target=None):
+        self.target = target
+        self.enabled = bool(target)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def enable(self, on=True):
+        self.enabled = on
+
+    def reset(self):
+        with self.lock:
+            self.spans = {}
+            self.queries = {}
+            self.slowest = []
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_span(name, (time.perf_counter() - started) * 1000)
+
+    def record_span(self, name, ms):
+        with self.lock:
+            self.spans.setdefault(name, deque(maxlen=SAMPLES)).append(ms)
+
+    def record_query(self, sql, ms, rows, steps, statement=None, plan=None):
+        key = ' '.join(sql.split())
+        with self.lock:
+            entry = self.queries.get(key)
+            if entry is None:
+                entry = self.queries[key] = {'samples': deque(maxlen=SAMPLES), 'rows': 0, 'steps': 0}
+            entry['samples'].append(ms)
+            entry['rows'] += rows
+            entry['steps'] += steps
+            if plan is not None:
+                # One entry per statement shape: its slowest run.
+                self.slowest = [query for query in self.slowest if query['key'] != key or query['ms'] > ms]
+                if all(query['key'] != key for query in self.slowest):
+                    self.slowest.append({'key': key, 'ms': round(ms, 3), 'rows': rows,
+                                         'sql': ' '.join((statement or sql).split()), 'plan': plan})
+                self.slowest.sort(key=lambda query: query['ms'], reverse=True)
+                del self.slowest[SLOWEST:]
+
+    def is_slow(self, ms):
+        # Worth an EXPLAIN: the list isn't full yet, or this beats the quickest statement on it.
+        with self.lock:
+            return len(self.slowest) < SLOWEST or ms > self.slowest[-1]['ms']
+
+    def report(self):
+        """ Spans and statements with p50/p99, busiest first, plus the slowest statements """
+        with self.lock:
+            spans = [dict(name=name, **_stats(samples)) for name, samples in self.spans.items() if samples]
+            queries = [dict(sql=sql, rows=entry['rows'], steps=entry['steps'], **_stats(entry['samples']))
+                       for sql, entry in self.queries.items() if entry['samples']]
+            slowest = [{name: value for name, value in query.items() if name != 'key'} for query in self.slowest]
+        spans.sort(key=lambda span: span['total_ms'], reverse=True)
+        queries.sort(key=lambda query: query['total_ms'], reverse=True)
+        return {'spans': spans, 'queries': queries, 'slowest': slowest}
+
+    def write(self, path=None):
+        """ Append the report as one JSON line to path (default: the BILLBUDDY_PROFILE file) """
+        path = path or self.target
+        if not path or path == '1':
+            return
+        record = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'pid': os.getpid()}
+        record.update(self.report())
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+def format_report(report, limit=15, width=100):
+    """ Text lines for the panel: spans, statements and the slowest statements' plans """
+    def clip(text):
+        return text if len(text) <= width else text[:width - 1] + '…'
+
+    lines = [f"{'Span':<48} {'n':>6} {'p50 ms':>9} {'p99 ms':>9} {'total ms':>10}"]
+    for span in report['spans'][:limit]:
+        lines.append(f"{span['name'][:48]:<48} {span['count']:>6} {span['p50_ms']:>9.2f} "
+                     f"{span['p99_ms']:>9.2f} {span['total_ms']:>10.1f}")
+    lines += ['', f"{'n':>6} {'p50 ms':>9} {'p99 ms':>9} {'total ms':>10} {'rows':>9}  Statement"]
+    for query in report['queries'][:limit]:
+        lines.append(f"{query['count']:>6} {query['p50_ms']:>9.2f} {query['p99_ms']:>9.2f} "
+                     f"{query['total_ms']:>10.1f} {query['rows']:>9}  {clip(query['sql'])}")
+    if report['slowest']:
+        lines += ['', "Slowest statements"]
+    for query in report['slowest']:
+        lines.append(f"{query['ms']:>9.2f} ms  {query['rows']} rows  {clip(query['sql'])}")
+        lines += [f"{'':>13}{detail}" for detail in query['plan']]
+    return lines
+
+
+PROFILER = Profiler(os.environ.get('BILLBUDDY_PROFILE'))
+atexit.register(PROFILER.write)
+
+
+def timed(function):
+    """ Method decorator: a span named after the method. Like PyQt itself, it drops
+    signal arguments the method doesn't take (clicked's checked flag, say) """
+    parameters = inspect.signature(function).parameters.values()
+    if any(parameter.kind == parameter.VAR_POSITIONAL for parameter in parameters):
+        takes = None
+    else:
+        takes = sum(parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+                    for parameter in parameters)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if takes is not None:
+            args = args[:takes]
+        if not PROFILER.enabled:
+            return function(*args, **kwargs)
+        with PROFILER.span(function.__qualname__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    # A statement's time runs from execute() until its last row is fetched.
+
+    def execute(self, sql, parameters=()):
+        self.connection.expect(sql)
+        self.sql, self.parameters, self.rows, self.done = sql, parameters, 0, False
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self.elapsed = time.perf_counter() - started
+        if self.description is None:
+            self.finish(max(self.rowcount, 0))
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self.connection.expect(sql)
+        self.sql, self.parameters, self.rows, self.done = sql, None, 0, False
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self.elapsed = time.perf_counter() - started
+        self.finish(max(self.rowcount, 0))
+        return self
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self.elapsed += time.perf_counter() - started
+
+    def __next__(self):
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self.finish(0)
+            raise
+        self.rows += 1
+        return row
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        self.finish(1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        self.rows += len(rows)
+        if len(rows) < size:
+            self.finish(0)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self.finish(len(rows))
+        return rows
+
+    def __del__(self):
+        # Never fetched to the end, e.g. a PRAGMA whose answer nobody reads.
+        if not getattr(self, 'done', True):
+            self.finish(0, explain=False)
+
+    def finish(self, rows, explain=True):
+        if self.done:
+            return
+        self.done = True
+        rows += self.rows
+        conn = self.connection
+        ms = self.elapsed * 1000
+        steps, statement, plan = conn.steps * PROGRESS_STEPS, conn.statement, None
+        if explain and self.parameters is not None and PROFILER.is_slow(ms):
+            plan = conn.plan(self.sql, self.parameters)
+        PROFILER.record_query(self.sql, ms, rows, steps, statement, plan)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """ Plain sqlite3 while the profiler is off; while it is on, statements go through ProfiledCursor """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hooked = False
+        self.expected = ''
+        self.statement = None
+        self.steps = 0
+
+    def _hook(self):
+        # Callbacks follow the profiler's switch; this runs on whichever thread holds the connection.
+        if PROFILER.enabled and not self.hooked:
+            self.set_trace_callback(self._on_trace)
+            self.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+        elif not PROFILER.enabled and self.hooked:
+            self.set_trace_callback(None)
+            self.set_progress_handler(None, PROGRESS_STEPS)
+        self.hooked = PROFILER.enabled
+        return self.hooked
+
+    def expect(self, sql):
+        # The trace also sees implicit BEGINs, trigger bodies and FTS5's own statements;
+        # only text that starts like sql (up to its first parameter) is the statement itself.
+        self.expected = sql.split('?', 1)[0]
+        self.statement = None
+        self.steps = 0
+
+    def _on_trace(self, statement):
+        if self.statement is None and statement.startswith(self.expected):
+            self.statement = statement
+
+    def _on_progress(self):
+        self.steps += 1
+        return 0
+
+    def execute(self, sql, parameters=()):
+        if not self._hook():
+            return super().execute(sql, parameters)
+        return self.cursor(ProfiledCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not self._hook():
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor(ProfiledCursor).executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not self._hook():
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            PROFILER.record_query('COMMIT', (time.perf_counter() - started) * 1000, 0, 0)
+
+    def plan(self, sql, parameters):
+        """ EXPLAIN QUERY PLAN detail lines, indented by depth; empty if it can't be explained """
+        try:
+            rows = sqlite3.Connection.execute(self, 'EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+        except sqlite3.Error:
+            return []
+        depth = {0: 0}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, 0) + 1
+            lines.append('  ' * (depth[node] - 1) + detail)
+        return lines
@@ -0,0 +1,173 @@
+"""Expenses that come back on a schedule: rent, subscriptions, the gym.
+
+A rule in recurring_rules says what to add and when. The schedule is 'daily',
+'weekly' or 'monthly', counted from the rule's start (a monthly rule started on
+the 31st lands on the last day of shorter months), or a cron expression:
+minute hour day-of-month month day-of-week, e.g. '0 9 1 * *' for 9:00 on the 1st.
+
+catch_up() writes every occurrence that has come due since the last run, for all
+rules, in one transaction through storage's bulk insert path. Each occurrence's
+fingerprint is 'recurring:<rule id>:<date>', so running it twice, or from the
+window and a cron job at once, never adds the same one again.
+"""
+import calendar
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import storage
+
+INTERVALS = ('daily', 'weekly', 'monthly')
+CATCH_UP_LIMIT = 10000  # occurrences per rule per run; the rest come on the next one
+
+_CRON_FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day of month', 1, 31), ('month', 1, 12),
+                ('day of week', 0, 7))
+_CRON_SEARCH_DAYS = 366 * 8  # long enough to reach the next 29 February
+
+
+def _cron_field(text, name, low, high):
+    values = set()
+    for part in text.split(','):
+        body, slash, step = part.partition('/')
+        try:
+            if body == '*':
+                first, last = low, high
+            elif '-' in body:
+                first, last = (int(value) for value in body.split('-', 1))
+            else:
+                # '5/15' means every 15 starting at 5.
+                first = int(body)
+                last = high if slash else first
+            step = int(step) if slash else 1
+        except ValueError:
+            raise ValueError(f"Bad {name} in schedule: {part!r}")
+        if not low <= first <= last <= high or step < 1:
+            raise ValueError(f"Bad {name} in schedule: {part!r}")
+        values.update(range(first, last + 1, step))
+    return values
+
+
+@lru_cache(maxsize=64)
+def _cron(schedule):
+    fields = schedule.split()
+    if len(fields) != len(_CRON_FIELDS):
+        raise ValueError(f"Unknown schedule: {schedule!r} (use daily, weekly, monthly or a cron expression)")
+    minutes, hours, days, months, weekdays = (
+        _cron_field(text, *field) for text, field in zip(fields, _CRON_FIELDS))
+    # Cron counts Sunday as both 0 and 7; Python's weekday() is 0 for Monday.
+    weekdays = {(day - 1) % 7 for day in weekdays}
+    # As in cron, a day matching either field will do when both are restricted.
+    either = not fields[2].startswith('*') and not fields[4].startswith('*')
+    times = sorted((hour, minute) for hour in hours for minute in minutes)
+    return times, days, months, weekdays, either
+
+
+def _cron_next(schedule, after):
+    times, days, months, weekdays, either = _cron(schedule)
+    moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    day = moment.date()
+    for _ in range(_CRON_SEARCH_DAYS):
+        if day.month in months:
+            by_date, by_weekday = day.day in days, day.weekday() in weekdays
+            if (by_date or by_weekday) if either else (by_date and by_weekday):
+                earliest = (moment.hour, moment.minute) if day == moment.date() else (0, 0)
+                for hour, minute in times:
+                    if (hour, minute) >= earliest:
+                        return datetime(day.year, day.month, day.day, hour, minute)
+        day += timedelta(days=1)
+    raise ValueError(f"Schedule never comes due: {schedule!r}")
+
+
+def _add_months(start, months):
+    month = start.month - 1 + months
+    year, month = start.year + month // 12, month % 12 + 1
+    return start.replace(year=year, month=month, day=min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def next_occurrence(schedule, start, due):
+    """ The occurrence after due for a rule that started at start """
+    if schedule == 'daily':
+        return due + timedelta(days=1)
+    if schedule == 'weekly':
+        return due + timedelta(weeks=1)
+    if schedule == 'monthly':
+        # From the start every time, so a 31st that became a 28th goes back to the 31st.
+        return _add_months(start, (due.year - start.year) * 12 + due.month - start.month + 1)
+    return _cron_next(schedule, due)
+
+
+def first_occurrence(schedule, start):
+    if schedule in INTERVALS:
+        return start
+    return _cron_next(schedule, start - timedelta(minutes=1))
+
+
+def add_rule(conn, description, amount, category, currency, schedule, start=None):
+    """ Store a rule (amount in minor units) whose first occurrence is at or after start
+    (default: now); returns its id. catch_up() writes the occurrences """
+    schedule = ' '.join(schedule.split()).lower()
+    start = (start or datetime.now()).replace(microsecond=0)
+    # Checks the schedule, so a bad one leaves no new category behind.
+    due = first_occurrence(schedule, start)
+    category = storage.add_category(conn, category)
+    cursor = conn.execute('''
+        INSERT INTO recurring_rules (description, amount, category, currency, schedule, start, next_due)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (description, amount, category, currency, schedule, start.strftime(storage.DATE_FORMAT),
+          due.strftime(storage.DATE_FORMAT)))
+    conn.commit()
+    return cursor.lastrowid
+
+
+def remove_rule(conn, rule_id):
+    """ Stop a rule; the expenses it already added stay. False if there was no such rule """
+    removed = conn.execute('DELETE FROM recurring_rules WHERE id = ?', (rule_id,)).rowcount
+    conn.commit()
+    return bool(removed)
+
+
+def rules(conn):
+    return conn.execute('''
+        SELECT id, description, amount, category, currency, schedule, next_due
+        FROM recurring_rules ORDER BY next_due, id
+    ''').fetchall()
+
+
+def next_due(conn):
+    """ When the earliest rule next comes due, or None without rules """
+    due = conn.execute('SELECT MIN(next_due) FROM recurring_rules').fetchone()[0]
+    return datetime.strptime(due, storage.DATE_FORMAT) if due else None
+
+
+def catch_up(conn, now=None, limit=CATCH_UP_LIMIT):
+    """ Add every occurrence due by now, for every rule, in one transaction; returns
+    (expenses added, when the next one is due or None) """
+    now = now or datetime.now()
+    cutoff = now.strftime(storage.DATE_FORMAT)
+    # Usually nothing is due: find that out without taking the write lock.
+    if conn.execute('SELECT 1 FROM recurring_rules WHERE next_due <= ? LIMIT 1', (cutoff,)).fetchone() is None:
+        return 0, next_due(conn)
+    # IMMEDIATE: the rules read below must still be current when the rows are written,
+    # even with a cron job catching up at the same moment.
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rows, advanced = [], []
+        for rule_id, description, amount, category, currency, schedule, start, due in conn.execute('''
+            SELECT id, description, amount, category, currency, schedule, start, next_due
+            FROM recurring_rules WHERE next_due <= ?
+        ''', (cutoff,)).fetchall():
+            start = datetime.strptime(start, storage.DATE_FORMAT)
+            due = datetime.strptime(due, storage.DATE_FORMAT)
+            for _ in range(limit):
+                if due > now:
+                    break
+                date = due.strftime(storage.DATE_FORMAT)
+                rows.append((date, description, amount, category, currency, f'recurring:{rule_id}:{date}'))
+                due = next_occurrence(schedule, start, due)
+            advanced.append((due.strftime(storage.DATE_FORMAT), rule_id))
+        added = storage.insert_batch(conn, rows)
+        conn.executemany('UPDATE recurring_rules SET next_due = ? WHERE id = ?', advanced)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return added, next_due(conn)
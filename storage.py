@@ -0,0 +1,1445 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from operator import itemgetter
+from urllib.parse import quote
+
+from money import CURRENCIES, Money, scale_sql
+from profiler import ProfiledConnection
+
+DATABASE_PATH = 'expenses.db'
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+# Defaults for every connection; pass overrides as pragmas={...} to connect()/ReadPool.
+# WAL lets readers keep going while a write commits, and NORMAL sync only fsyncs at checkpoints.
+# Incremental auto_vacuum lets maintenance.tidy() hand free pages back a few at a time; it
+# applies to new files at once and to older ones after their next VACUUM.
+PRAGMAS = {
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def _create_expenses(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            description TEXT,
+            amount REAL,
+            category TEXT,
+            currency TEXT
+        )
+    ''')
+    # Very old databases were created before currencies existed.
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(expenses)')]
+    if 'currency' not in columns:
+        conn.execute("ALTER TABLE expenses ADD COLUMN currency TEXT DEFAULT 'PHP'")
+
+
+def _index_expenses(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_currency_date ON expenses (currency, date)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category)')
+
+
+_ROLLUP_KEY = "substr({row}.date, 1, 10), IFNULL({row}.currency, ''), IFNULL({row}.category, '')"
+
+_ROLLUP_ADD = '''
+    INSERT INTO expense_rollups (day, currency, category, total, count)
+    VALUES ({key}, NEW.amount, 1)
+    ON CONFLICT (day, currency, category) DO UPDATE SET total = total + excluded.total, count = count + 1;
+'''.format(key=_ROLLUP_KEY.format(row='NEW'))
+
+_ROLLUP_SUBTRACT = '''
+    UPDATE expense_rollups SET total = total - OLD.amount, count = count - 1
+    WHERE (day, currency, category) = ({key});
+    DELETE FROM expense_rollups WHERE (day, currency, category) = ({key}) AND count <= 0;
+'''.format(key=_ROLLUP_KEY.format(row='OLD'))
+
+_ROLLUP_AGGREGATE = '''
+    SELECT {key}, SUM(amount), COUNT(*) FROM expenses
+    GROUP BY 1, 2, 3
+'''.format(key=_ROLLUP_KEY.format(row='expenses'))
+
+_ROLLUP_BACKFILL = 'INSERT INTO expense_rollups (day, currency, category, total, count)' + _ROLLUP_AGGREGATE
+
+# Folds every expense with id > ? into the rollups in one pass; used after bulk loads.
+_ROLLUP_MERGE_NEW = '''
+    INSERT INTO expense_rollups (day, currency, category, total, count)
+    SELECT {key}, SUM(amount), COUNT(*) FROM expenses
+    WHERE id > ?
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, currency, category) DO UPDATE
+    SET total = total + excluded.total, count = count + excluded.count
+'''.format(key=_ROLLUP_KEY.format(row='expenses'))
+
+_ROLLUP_INSERT_TRIGGER = f'CREATE TRIGGER expenses_rollup_insert AFTER INSERT ON expenses BEGIN {_ROLLUP_ADD} END'
+
+
+def _create_rollup_table(conn, total_type):
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS expense_rollups (
+            day TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total {total_type} NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, currency, category)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _create_rollup_triggers(conn):
+    conn.execute(_ROLLUP_INSERT_TRIGGER)
+    conn.execute(f'CREATE TRIGGER expenses_rollup_delete AFTER DELETE ON expenses BEGIN {_ROLLUP_SUBTRACT} END')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_rollup_update AFTER UPDATE OF date, amount, category, currency ON expenses
+        BEGIN {_ROLLUP_SUBTRACT} {_ROLLUP_ADD} END
+    ''')
+
+
+def _create_rollups(conn):
+    # Per-(day, currency, category) sums kept in step with expenses by triggers,
+    # so any write path (GUI, imports, plain sqlite3) keeps them correct.
+    _create_rollup_table(conn, 'REAL')
+    _create_rollup_triggers(conn)
+    conn.execute(_ROLLUP_BACKFILL)
+
+
+def _index_fingerprints(conn):
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_fingerprint
+        ON expenses (fingerprint) WHERE fingerprint IS NOT NULL
+    ''')
+
+
+def _add_fingerprints(conn):
+    # Imported rows carry a content hash so re-importing the same export is a no-op.
+    conn.execute('ALTER TABLE expenses ADD COLUMN fingerprint TEXT')
+    _index_fingerprints(conn)
+
+
+def _store_minor_units(conn):
+    # REAL amounts drift when summed, so rebuild the table with exact integer minor
+    # units (cents, whole yen). SQLite can't change a column's type in place.
+    conn.execute('''
+        CREATE TABLE expenses_minor (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            description TEXT,
+            amount INTEGER,
+            category TEXT,
+            currency TEXT,
+            fingerprint TEXT
+        )
+    ''')
+    conn.execute(f'''
+        INSERT INTO expenses_minor (id, date, description, amount, category, currency, fingerprint)
+        SELECT id, date, description, CAST(ROUND(amount * {scale_sql()}) AS INTEGER), category, currency, fingerprint
+        FROM expenses
+    ''')
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'").fetchone()
+    conn.execute('DROP TABLE expenses')
+    conn.execute('ALTER TABLE expenses_minor RENAME TO expenses')
+    if sequence:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'", sequence)
+    _index_expenses(conn)
+    _index_fingerprints(conn)
+
+    conn.execute('DROP TABLE expense_rollups')
+    _create_rollup_table(conn, 'INTEGER')
+    _create_rollup_triggers(conn)
+    conn.execute(_ROLLUP_BACKFILL)
+
+
+def _create_exchange_rates(conn):
+    # 1 base = rate quote, as of day. Loaded from files; see exchange.load_rates.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS exchange_rates (
+            day TEXT NOT NULL,
+            base TEXT NOT NULL,
+            quote TEXT NOT NULL,
+            rate REAL NOT NULL,
+            PRIMARY KEY (base, quote, day)
+        ) WITHOUT ROWID
+    ''')
+
+
+_SEARCH_INSERT_TRIGGER = '''
+    CREATE TRIGGER expenses_search_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_search (rowid, description, category) VALUES (NEW.id, NEW.description, NEW.category);
+    END
+'''
+
+# Copies every expense with id > ? into the search index; used after bulk loads.
+_SEARCH_MERGE_NEW = '''
+    INSERT INTO expenses_search (rowid, description, category)
+    SELECT id, description, category FROM expenses WHERE id > ?
+'''
+
+
+def _create_search_index(conn):
+    # External-content FTS5 index: it stores only the tokens and reads text back from
+    # expenses. 'delete' rows must carry the old values, hence the triggers below.
+    conn.execute('''
+        CREATE VIRTUAL TABLE expenses_search USING fts5(
+            description, category,
+            content='expenses', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    conn.execute(_SEARCH_INSERT_TRIGGER)
+    conn.execute('''
+        CREATE TRIGGER expenses_search_delete AFTER DELETE ON expenses BEGIN
+            INSERT INTO expenses_search (expenses_search, rowid, description, category)
+            VALUES ('delete', OLD.id, OLD.description, OLD.category);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER expenses_search_update AFTER UPDATE OF description, category ON expenses BEGIN
+            INSERT INTO expenses_search (expenses_search, rowid, description, category)
+            VALUES ('delete', OLD.id, OLD.description, OLD.category);
+            INSERT INTO expenses_search (rowid, description, category) VALUES (NEW.id, NEW.description, NEW.category);
+        END
+    ''')
+    conn.execute("INSERT INTO expenses_search (expenses_search) VALUES ('rebuild')")
+
+
+def _index_sort_keys(conn):
+    # Together with date and (currency, date), one index per SORT_KEYS order. (category, date)
+    # also serves a category filter shown newest first; (currency, amount) an amount range.
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_amount ON expenses (amount)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_description ON expenses (description)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_currency_amount ON expenses (currency, amount)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses (category, date)')
+    conn.execute('DROP INDEX IF EXISTS idx_expenses_category')
+
+
+def _create_change_log(conn):
+    # New expenses are found by id alone; this records the ids edited or deleted in place,
+    # so copies kept outside the database (analytics.Snapshot) can catch up cheaply.
+    # A NULL expense_id means everything changed.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS expense_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            expense_id INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER expenses_change_update AFTER UPDATE OF date, amount, category, currency ON expenses
+        BEGIN INSERT INTO expense_changes (expense_id) VALUES (OLD.id); END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER expenses_change_delete AFTER DELETE ON expenses
+        BEGIN INSERT INTO expense_changes (expense_id) VALUES (OLD.id); END
+    ''')
+
+
+_EXPENSE_COLUMNS = 'date, description, amount, category, currency, fingerprint'
+
+# Rows at or below the floor belong to generations cleared by a reset.
+_FLOOR = '(SELECT floor FROM expense_state)'
+
+# An edit of a live row; tombstoning and restoring have triggers of their own.
+_WHEN_LIVE = 'WHEN OLD.deleted IS NULL AND NEW.deleted IS NULL'
+
+_SEARCH_DELETE_OLD = '''
+    INSERT INTO expenses_search (expenses_search, rowid, description, category)
+    VALUES ('delete', OLD.id, OLD.description, OLD.category);
+'''
+
+_SEARCH_INSERT_NEW = 'INSERT INTO expenses_search (rowid, description, category) VALUES (NEW.id, NEW.description, NEW.category);'
+
+
+def _add_journal(conn):
+    # Deleting sets a tombstone and a reset raises a floor past every id, so both can be
+    # undone from expense_journal. Rows now live in expense_rows and expenses is a view of
+    # the live ones, which every query (and the search index's content) keeps reading.
+    for trigger in ('rollup_delete', 'rollup_update', 'search_delete', 'search_update',
+                    'change_update', 'change_delete'):
+        conn.execute(f'DROP TRIGGER expenses_{trigger}')
+    conn.execute('ALTER TABLE expenses RENAME TO expense_rows')
+    # The journal seq of the delete, or NULL while the row is live.
+    conn.execute('ALTER TABLE expense_rows ADD COLUMN deleted INTEGER')
+    conn.execute('CREATE INDEX idx_expense_rows_deleted ON expense_rows (deleted) WHERE deleted IS NOT NULL')
+    # A deleted row's fingerprint no longer blocks importing it again.
+    conn.execute('DROP INDEX idx_expenses_fingerprint')
+    conn.execute('''
+        CREATE UNIQUE INDEX idx_expenses_fingerprint
+        ON expense_rows (fingerprint) WHERE fingerprint IS NOT NULL AND deleted IS NULL
+    ''')
+
+    conn.execute('CREATE TABLE expense_state (floor INTEGER NOT NULL)')
+    conn.execute('INSERT INTO expense_state (floor) VALUES (0)')
+    # action is insert, update, delete or reset, each with before/after images as JSON,
+    # or undo/redo of the entry in target.
+    conn.execute('''
+        CREATE TABLE expense_journal (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            at TEXT NOT NULL,
+            action TEXT NOT NULL,
+            expense_id INTEGER,
+            target INTEGER,
+            before TEXT,
+            after TEXT
+        )
+    ''')
+    # Rows a reset cleared, moved out of expense_rows by compact() until the reset leaves the journal.
+    conn.execute('''
+        CREATE TABLE expense_archive (
+            reset_seq INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            date TEXT,
+            description TEXT,
+            amount INTEGER,
+            category TEXT,
+            currency TEXT,
+            fingerprint TEXT,
+            PRIMARY KEY (reset_seq, id)
+        ) WITHOUT ROWID
+    ''')
+    # The unary + keeps the floor from turning every query into an id range scan.
+    conn.execute(f'''
+        CREATE VIEW expenses AS
+        SELECT id, {_EXPENSE_COLUMNS} FROM expense_rows
+        WHERE deleted IS NULL AND +id > {_FLOOR}
+    ''')
+    # Plain sqlite3 writes to expenses still work; they just aren't journaled.
+    conn.execute(f'''
+        CREATE TRIGGER expenses_view_insert INSTEAD OF INSERT ON expenses BEGIN
+            INSERT INTO expense_rows (id, {_EXPENSE_COLUMNS})
+            VALUES (NEW.id, NEW.date, NEW.description, NEW.amount, NEW.category, NEW.currency, NEW.fingerprint);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER expenses_view_update INSTEAD OF UPDATE ON expenses BEGIN
+            UPDATE expense_rows
+            SET date = NEW.date, description = NEW.description, amount = NEW.amount, category = NEW.category,
+                currency = NEW.currency, fingerprint = NEW.fingerprint
+            WHERE id = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER expenses_view_delete INSTEAD OF DELETE ON expenses BEGIN
+            DELETE FROM expense_rows WHERE id = OLD.id;
+        END
+    ''')
+
+    # Physically deleting a tombstone or a cleared row changes no totals.
+    counted = f'WHEN OLD.deleted IS NULL AND OLD.id > {_FLOOR}'
+    conn.execute(f'CREATE TRIGGER expenses_rollup_delete AFTER DELETE ON expense_rows {counted} BEGIN {_ROLLUP_SUBTRACT} END')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_rollup_update AFTER UPDATE OF date, amount, category, currency ON expense_rows
+        {_WHEN_LIVE} BEGIN {_ROLLUP_SUBTRACT} {_ROLLUP_ADD} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_search_delete AFTER DELETE ON expense_rows WHEN OLD.deleted IS NULL
+        BEGIN {_SEARCH_DELETE_OLD} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_search_update AFTER UPDATE OF description, category ON expense_rows
+        {_WHEN_LIVE} BEGIN {_SEARCH_DELETE_OLD} {_SEARCH_INSERT_NEW} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_change_update AFTER UPDATE OF date, amount, category, currency ON expense_rows
+        {_WHEN_LIVE} BEGIN INSERT INTO expense_changes (expense_id) VALUES (OLD.id); END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_change_delete AFTER DELETE ON expense_rows {counted}
+        BEGIN INSERT INTO expense_changes (expense_id) VALUES (OLD.id); END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_tombstone AFTER UPDATE OF deleted ON expense_rows
+        WHEN OLD.deleted IS NULL AND NEW.deleted IS NOT NULL BEGIN
+            {_ROLLUP_SUBTRACT} {_SEARCH_DELETE_OLD}
+            INSERT INTO expense_changes (expense_id) VALUES (OLD.id);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_restore AFTER UPDATE OF deleted ON expense_rows
+        WHEN OLD.deleted IS NOT NULL AND NEW.deleted IS NULL BEGIN
+            {_ROLLUP_ADD} {_SEARCH_INSERT_NEW}
+            INSERT INTO expense_changes (expense_id) VALUES (NEW.id);
+        END
+    ''')
+
+
+def _create_recurring_rules(conn):
+    # Subscriptions, rent and the like; recurring.catch_up() turns due occurrences into
+    # expenses. next_due is the first occurrence not yet written out.
+    conn.execute('''
+        CREATE TABLE recurring_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            description TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            currency TEXT NOT NULL,
+            schedule TEXT NOT NULL,
+            start TEXT NOT NULL,
+            next_due TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_recurring_rules_next_due ON recurring_rules (next_due)')
+
+
+def _create_budgets(conn):
+    # Monthly limits; see budgets.py. A NULL category limits everything in the currency.
+    conn.execute('''
+        CREATE TABLE budgets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT,
+            currency TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            warn_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE UNIQUE INDEX idx_budgets_key ON budgets (currency, IFNULL(category, ''))")
+
+
+def category_key(name):
+    """ What every spelling of one category shares: 'Food', 'food ' and ' FOOD' all give 'food' """
+    return ' '.join((name or '').split()).casefold()
+
+
+# Since the categories migration rows hold a category_id; these are the columns as stored.
+_ROW_COLUMNS = 'date, description, amount, category_id, currency, fingerprint'
+
+# A stored row's category name, for the trigger bodies written against category.
+_CATEGORY_NAME = '(SELECT name FROM categories WHERE id = {row}.category_id)'
+
+# The id for a name written straight into the expenses view, added if it is new. SQL's
+# lower() only folds ASCII, so a name already stored under a Python-folded key is
+# found by the name itself; storage.py's own writes go through _category_id().
+_VIEW_CATEGORY = "trim(IFNULL(NEW.category, ''))"
+_VIEW_CATEGORY_ID = f'''(
+    SELECT id FROM categories WHERE key = lower({_VIEW_CATEGORY}) OR name = {_VIEW_CATEGORY}
+    ORDER BY key = lower({_VIEW_CATEGORY}) DESC LIMIT 1
+)'''
+
+
+def _by_category_id(sql):
+    for row in ('NEW', 'OLD'):
+        sql = sql.replace(f'{row}.category', _CATEGORY_NAME.format(row=row))
+    return sql
+
+
+def _normalize_categories(conn):
+    # Rows carry an integer id into categories instead of repeating the name, and
+    # spellings that differ only in case or spacing become one category, named the way
+    # it was written most often. expenses joins the name back in, so readers don't change.
+    conn.execute('''
+        CREATE TABLE categories (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            key TEXT NOT NULL UNIQUE
+        )
+    ''')
+    spellings = {}
+    for spelling, count, first in conn.execute('''
+        SELECT IFNULL(category, ''), COUNT(*), MIN(id) FROM
+        (SELECT id, category FROM expense_rows UNION ALL SELECT id, category FROM expense_archive)
+        GROUP BY 1
+    '''):
+        spellings.setdefault(category_key(spelling), []).append((-count, first, spelling))
+    names = {key: ' '.join(min(found)[2].split()) for key, found in spellings.items()}
+    conn.executemany('INSERT INTO categories (name, key) VALUES (?, ?)',
+                     sorted((name, key) for key, name in names.items()))
+    conn.execute('CREATE TEMP TABLE category_spellings (spelling TEXT PRIMARY KEY, category_id INTEGER NOT NULL)')
+    conn.executemany('''
+        INSERT INTO temp.category_spellings (spelling, category_id)
+        VALUES (?, (SELECT id FROM categories WHERE key = ?))
+    ''', [(spelling, key) for key, found in spellings.items() for _, _, spelling in found])
+
+    for (trigger,) in conn.execute('''
+        SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN ('expense_rows', 'expenses')
+    ''').fetchall():
+        conn.execute(f'DROP TRIGGER {trigger}')
+    conn.execute('DROP VIEW expenses')
+    indexes = conn.execute('''
+        SELECT sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'expense_rows' AND sql IS NOT NULL AND name != 'idx_expenses_category_date'
+    ''').fetchall()
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expense_rows'").fetchone()
+
+    conn.execute('''
+        CREATE TABLE expense_rows_by_id (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            description TEXT,
+            amount INTEGER,
+            category_id INTEGER NOT NULL REFERENCES categories (id),
+            currency TEXT,
+            fingerprint TEXT,
+            deleted INTEGER
+        )
+    ''')
+    conn.execute(f'''
+        INSERT INTO expense_rows_by_id (id, {_ROW_COLUMNS}, deleted)
+        SELECT id, date, description, amount, spellings.category_id, currency, fingerprint, deleted
+        FROM expense_rows JOIN temp.category_spellings AS spellings ON spellings.spelling = IFNULL(category, '')
+    ''')
+    conn.execute('DROP TABLE expense_rows')
+    conn.execute('ALTER TABLE expense_rows_by_id RENAME TO expense_rows')
+    if sequence and not conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expense_rows'",
+                                     sequence).rowcount:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('expense_rows', ?)", sequence)
+    for (sql,) in indexes:
+        conn.execute(sql)
+    conn.execute('CREATE INDEX idx_expenses_category_date ON expense_rows (category_id, date)')
+
+    conn.execute('''
+        CREATE TABLE expense_archive_by_id (
+            reset_seq INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            date TEXT,
+            description TEXT,
+            amount INTEGER,
+            category_id INTEGER NOT NULL REFERENCES categories (id),
+            currency TEXT,
+            fingerprint TEXT,
+            PRIMARY KEY (reset_seq, id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'''
+        INSERT INTO expense_archive_by_id (reset_seq, id, {_ROW_COLUMNS})
+        SELECT reset_seq, id, date, description, amount, spellings.category_id, currency, fingerprint
+        FROM expense_archive JOIN temp.category_spellings AS spellings ON spellings.spelling = IFNULL(category, '')
+    ''')
+    conn.execute('DROP TABLE expense_archive')
+    conn.execute('ALTER TABLE expense_archive_by_id RENAME TO expense_archive')
+    conn.execute('DROP TABLE temp.category_spellings')
+
+    # An inner join, so the planner may walk categories by name and each one's rows by
+    # (category_id, date): sorting by category still pages without a sort.
+    conn.execute(f'''
+        CREATE VIEW expenses AS
+        SELECT expense_rows.id AS id, date, description, amount, categories.name AS category, currency, fingerprint
+        FROM expense_rows JOIN categories ON categories.id = expense_rows.category_id
+        WHERE deleted IS NULL AND +expense_rows.id > {_FLOOR}
+    ''')
+    add_category = f"INSERT OR IGNORE INTO categories (name, key) VALUES ({_VIEW_CATEGORY}, lower({_VIEW_CATEGORY}));"
+    conn.execute(f'''
+        CREATE TRIGGER expenses_view_insert INSTEAD OF INSERT ON expenses BEGIN
+            {add_category}
+            INSERT INTO expense_rows (id, {_ROW_COLUMNS})
+            VALUES (NEW.id, NEW.date, NEW.description, NEW.amount, {_VIEW_CATEGORY_ID}, NEW.currency, NEW.fingerprint);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_view_update INSTEAD OF UPDATE ON expenses BEGIN
+            {add_category}
+            UPDATE expense_rows
+            SET date = NEW.date, description = NEW.description, amount = NEW.amount,
+                category_id = {_VIEW_CATEGORY_ID}, currency = NEW.currency, fingerprint = NEW.fingerprint
+            WHERE id = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER expenses_view_delete INSTEAD OF DELETE ON expenses BEGIN
+            DELETE FROM expense_rows WHERE id = OLD.id;
+        END
+    ''')
+
+    # The journal migration's triggers, reading the name through category_id.
+    rollup_add, rollup_subtract = _by_category_id(_ROLLUP_ADD), _by_category_id(_ROLLUP_SUBTRACT)
+    search_insert, search_delete = _by_category_id(_SEARCH_INSERT_NEW), _by_category_id(_SEARCH_DELETE_OLD)
+    counted = f'WHEN OLD.deleted IS NULL AND OLD.id > {_FLOOR}'
+    conn.execute(f'CREATE TRIGGER expenses_rollup_insert AFTER INSERT ON expense_rows BEGIN {rollup_add} END')
+    conn.execute(f'CREATE TRIGGER expenses_search_insert AFTER INSERT ON expense_rows BEGIN {search_insert} END')
+    conn.execute(f'CREATE TRIGGER expenses_rollup_delete AFTER DELETE ON expense_rows {counted} BEGIN {rollup_subtract} END')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_rollup_update AFTER UPDATE OF date, amount, category_id, currency ON expense_rows
+        {_WHEN_LIVE} BEGIN {rollup_subtract} {rollup_add} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_search_delete AFTER DELETE ON expense_rows WHEN OLD.deleted IS NULL
+        BEGIN {search_delete} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_search_update AFTER UPDATE OF description, category_id ON expense_rows
+        {_WHEN_LIVE} BEGIN {search_delete} {search_insert} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_change_update AFTER UPDATE OF date, amount, category_id, currency ON expense_rows
+        {_WHEN_LIVE} BEGIN INSERT INTO expense_changes (expense_id) VALUES (OLD.id); END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_change_delete AFTER DELETE ON expense_rows {counted}
+        BEGIN INSERT INTO expense_changes (expense_id) VALUES (OLD.id); END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_tombstone AFTER UPDATE OF deleted ON expense_rows
+        WHEN OLD.deleted IS NULL AND NEW.deleted IS NOT NULL BEGIN
+            {rollup_subtract} {search_delete}
+            INSERT INTO expense_changes (expense_id) VALUES (OLD.id);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER expenses_restore AFTER UPDATE OF deleted ON expense_rows
+        WHEN OLD.deleted IS NOT NULL AND NEW.deleted IS NULL BEGIN
+            {rollup_add} {search_insert}
+            INSERT INTO expense_changes (expense_id) VALUES (NEW.id);
+        END
+    ''')
+
+    # Rollups and the columnar snapshot are keyed by name, so merged spellings are redone.
+    renamed = [(spelling, names[key]) for key, found in spellings.items() for _, _, spelling in found
+               if spelling != names[key]]
+    if renamed:
+        conn.execute('DELETE FROM expense_rollups')
+        conn.execute(_ROLLUP_BACKFILL)
+        _everything_changed(conn)
+    # unicode61 folds ASCII case itself and never sees spacing, so the search index only
+    # holds stale tokens when a merged spelling differed in a non-ASCII letter.
+    if any(not (spelling.isascii() and name.isascii()) for spelling, name in renamed):
+        conn.execute("INSERT INTO expenses_search (expenses_search) VALUES ('rebuild')")
+    for table in ('budgets', 'recurring_rules'):
+        for category, in conn.execute(f'SELECT DISTINCT category FROM {table} WHERE category IS NOT NULL').fetchall():
+            name = names.get(category_key(category), ' '.join(category.split()))
+            conn.execute(f'UPDATE OR REPLACE {table} SET category = ? WHERE category = ?', (name, category))
+
+
+# Append only: position N in this list upgrades a database from user_version N to N + 1.
+MIGRATIONS = [
+    _create_expenses,
+    _index_expenses,
+    _create_rollups,
+    _add_fingerprints,
+    _store_minor_units,
+    _create_exchange_rates,
+    _create_search_index,
+    _index_sort_keys,
+    _create_change_log,
+    _add_journal,
+    _create_recurring_rules,
+    _create_budgets,
+    _normalize_categories,
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """ Bring the schema up to date, one transaction per migration """
+    version = schema_version(conn)
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute('BEGIN')
+        try:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def apply_pragmas(conn, pragmas=None, readonly=False):
+    settings = dict(PRAGMAS, **(pragmas or {}))
+    for name, value in settings.items():
+        # These are stored in the file itself, and read-only handles may not change them.
+        if readonly and name in ('auto_vacuum', 'journal_mode'):
+            continue
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+def connect(path=DATABASE_PATH, pragmas=None):
+    conn = sqlite3.connect(path, factory=ProfiledConnection)
+    apply_pragmas(conn, pragmas)
+    migrate(conn)
+    return conn
+
+
+def connect_readonly(path=DATABASE_PATH, pragmas=None):
+    absolute = os.path.abspath(path).replace(os.sep, '/')
+    uri = f"file:{quote(absolute if absolute.startswith('/') else '/' + absolute)}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=ProfiledConnection)
+    apply_pragmas(conn, pragmas, readonly=True)
+    return conn
+
+
+class ReadPool:
+    """ A few read-only connections, handed out one thread at a time """
+
+    def __init__(self, path=DATABASE_PATH, size=4, pragmas=None):
+        self.path = path
+        self.pragmas = pragmas
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.opened < self.size:
+                self.opened += 1
+                grow = True
+            else:
+                grow = False
+        if grow:
+            try:
+                return connect_readonly(self.path, self.pragmas)
+            except Exception:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        return self.idle.get()
+
+    def release(self, conn):
+        self.idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self.lock:
+            self.opened = 0
+
+
+class SummaryCache:
+    """ Summary results reused until the next write or the next day """
+
+    def __init__(self):
+        # bump() after every committed write; results computed before it are never stored.
+        self.generation = 0
+        self.day = None
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def key(self, today, name, *args):
+        # Every period (day, week, month, year) is derived from the date, so keying on it
+        # retires each entry at midnight, and with it the week at the Monday boundary.
+        return (today.strftime('%Y-%m-%d'), name) + args
+
+    def get(self, key):
+        """ (True, value) for a current entry, else (False, None) """
+        with self.lock:
+            if key[0] != self.day:
+                # A new day: nothing cached for earlier days can be asked for again.
+                self.day = key[0]
+                self.entries.clear()
+            if key in self.entries:
+                return True, self.entries[key]
+        return False, None
+
+    def put(self, key, generation, value):
+        with self.lock:
+            if generation == self.generation and key[0] == self.day:
+                self.entries[key] = value
+
+    def bump(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+# Period bounds are half-open [start, end) strings in the stored date format and
+# always fall on midnight, so they can also be cut down to rollup day keys.
+def day_bounds(day):
+    start = datetime(day.year, day.month, day.day)
+    return start.strftime(DATE_FORMAT), (start + timedelta(days=1)).strftime(DATE_FORMAT)
+
+
+def week_bounds(day):
+    start = datetime(day.year, day.month, day.day) - timedelta(days=day.weekday())
+    return start.strftime(DATE_FORMAT), day_bounds(day)[1]
+
+
+def month_bounds(day):
+    start = datetime(day.year, day.month, 1)
+    end = datetime(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT)
+
+
+def year_bounds(day):
+    return datetime(day.year, 1, 1).strftime(DATE_FORMAT), datetime(day.year + 1, 1, 1).strftime(DATE_FORMAT)
+
+
+def period_totals(conn, start, end):
+    return conn.execute('''
+        SELECT SUM(total), currency FROM expense_rollups
+        WHERE day >= ? AND day < ?
+        GROUP BY currency
+    ''', (start[:10], end[:10])).fetchall()
+
+
+def summary_totals(conn, today):
+    return (period_totals(conn, *week_bounds(today)),
+            period_totals(conn, *month_bounds(today)),
+            period_totals(conn, *year_bounds(today)))
+
+
+def daily_totals(conn, today):
+    return period_totals(conn, *day_bounds(today))
+
+
+def spending_series(conn, today, currency, granularity='day'):
+    """ (day or month, total) pairs in minor units for one currency, oldest first,
+    up to and including today; read from the rollups, never from expenses """
+    period = 'day' if granularity == 'day' else 'substr(day, 1, 7)'
+    return conn.execute(f'''
+        SELECT {period}, SUM(total) FROM expense_rollups
+        WHERE currency = ? AND day < ?
+        GROUP BY 1
+        ORDER BY 1
+    ''', (currency, day_bounds(today)[1][:10])).fetchall()
+
+
+def category_totals(conn, today, currency, period='month'):
+    """ (category, total) pairs for one currency over this month, this year or 'all' time """
+    bounds = {'month': month_bounds, 'year': year_bounds}.get(period)
+    start, end = bounds(today) if bounds else ('', day_bounds(today)[1])
+    return conn.execute('''
+        SELECT category, SUM(total) FROM expense_rollups
+        WHERE currency = ? AND day >= ? AND day < ?
+        GROUP BY category
+        ORDER BY 2 DESC
+    ''', (currency, start[:10], end[:10])).fetchall()
+
+
+def format_totals(results, empty="N/A"):
+    return ", ".join(f"{Money(total, currency)} {currency}" for total, currency in results) or empty
+
+
+# Runs of letters and digits, the same words the unicode61 tokenizer indexes.
+_SEARCH_WORD = re.compile(r'[^\W_]+')
+
+
+def search_query(text):
+    """ Turn what someone typed into an FTS5 query: every word must start a word in
+    the description or category. Returns '' when there is nothing to search for """
+    # Each word is quoted, so FTS5 syntax (AND, NEAR, column:, *) in the input is just text.
+    return ' '.join(f'"{word}"*' for word in _SEARCH_WORD.findall(text or ''))
+
+
+# Past this many matches, walking the date index and testing membership beats
+# fetching every match and sorting it.
+SEARCH_SORT_LIMIT = 10000
+
+
+def _search_clause(conn, query):
+    matches = conn.execute(
+        'SELECT COUNT(*) FROM (SELECT 1 FROM expenses_search WHERE expenses_search MATCH ? LIMIT ?)',
+        (query, SEARCH_SORT_LIMIT)
+    ).fetchone()[0]
+    # The unary + keeps the planner from driving the query off the match list.
+    column = '+id' if matches >= SEARCH_SORT_LIMIT else 'id'
+    return f'{column} IN (SELECT rowid FROM expenses_search WHERE expenses_search MATCH ?)'
+
+
+# Sortable columns, each followed by the tie-breakers that make the order total.
+# Every key is covered by an index, so any order pages without a sort.
+SORT_KEYS = {
+    'id': ('id',),
+    'date': ('date', 'id'),
+    'description': ('description', 'id'),
+    'amount': ('amount', 'id'),
+    'category': ('category', 'date', 'id'),
+    'currency': ('currency', 'date', 'id'),
+}
+DEFAULT_SORT = ('date', True)
+
+# Where those columns sit in a SELECT * row.
+COLUMN_INDEX = {'id': 0, 'date': 1, 'description': 2, 'amount': 3, 'category': 4, 'currency': 5}
+
+
+def _where(conn, search=None, filters=None):
+    # filters may hold start/end (half-open, stored date format), currency, category and
+    # min_amount/max_amount in major units, e.g. {'currency': 'USD', 'min_amount': '10'}.
+    clauses, params = [], []
+    query = search_query(search)
+    if query:
+        clauses.append(_search_clause(conn, query))
+        params.append(query)
+
+    filters = filters or {}
+    if filters.get('start'):
+        clauses.append('date >= ?')
+        params.append(filters['start'])
+    if filters.get('end'):
+        clauses.append('date < ?')
+        params.append(filters['end'])
+    if filters.get('currency'):
+        clauses.append('currency = ?')
+        params.append(filters['currency'])
+    if filters.get('category'):
+        # Any spelling of the category will do.
+        clauses.append('category = (SELECT name FROM categories WHERE key = ?)')
+        params.append(category_key(filters['category']))
+    for key, operator in (('min_amount', '>='), ('max_amount', '<=')):
+        if filters.get(key) in (None, ''):
+            continue
+        if filters.get('currency'):
+            # One currency: compare minor units directly so the amount index applies.
+            clauses.append(f'amount {operator} ?')
+            params.append(Money.parse(filters[key], filters['currency']).minor)
+        else:
+            clauses.append(f'amount * 1.0 / {scale_sql()} {operator} ?')
+            try:
+                params.append(float(filters[key]))
+            except ValueError:
+                raise ValueError("Invalid amount")
+    return clauses, params
+
+
+def fetch_page(conn, after=None, limit=200, search=None, filters=None, sort=DEFAULT_SORT):
+    """ Next page of expenses matching the search and filters, in sort order
+    (column, descending), strictly after the given row """
+    column, descending = sort
+    keys = SORT_KEYS[column]
+    clauses, params = _where(conn, search, filters)
+    past = '<' if descending else '>'
+    if after is not None and column == 'category':
+        # Categories are walked by name and each one's rows by (category_id, date), but the
+        # join can't seek on both at once: finish this category, then go past it.
+        category, rest = after[COLUMN_INDEX['category']], keys[1:]
+        page = _page(conn, clauses + ['category = ?', _keyset(rest, past)],
+                     params + [category] + [after[COLUMN_INDEX[key]] for key in rest], keys, descending, limit)
+        if len(page) == limit:
+            return page
+        return page + _page(conn, clauses + [f'category {past} ?'], params + [category], keys, descending,
+                            limit - len(page))
+    if after is not None:
+        # Keyset paging: continue from the last row's sort key instead of using OFFSET.
+        clauses.append(_keyset(keys, past))
+        params.extend(after[COLUMN_INDEX[key]] for key in keys)
+    return _page(conn, clauses, params, keys, descending, limit)
+
+
+def _keyset(keys, past):
+    return f"({', '.join(keys)}) {past} ({', '.join('?' * len(keys))})"
+
+
+def _page(conn, clauses, params, keys, descending, limit):
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+    direction = ' DESC' if descending else ''
+    order = ', '.join(key + direction for key in keys)
+    return conn.execute(f'SELECT * FROM expenses{where} ORDER BY {order} LIMIT ?', params + [limit]).fetchall()
+
+
+def matches(conn, expense_id, search=None, filters=None):
+    """ Whether one expense would show up in fetch_page for this search and filters """
+    clauses, params = _where(conn, search, filters)
+    where = ''.join(' AND ' + clause for clause in clauses)
+    return conn.execute(f'SELECT 1 FROM expenses WHERE id = ?{where}', [expense_id] + params).fetchone() is not None
+
+
+def categories(conn):
+    return [row[0] for row in conn.execute('SELECT DISTINCT category FROM expense_rollups ORDER BY category')]
+
+
+def category_counts(conn):
+    """ (category, expenses) for every category in use, most used first """
+    return conn.execute('''
+        SELECT category, SUM(count) FROM expense_rollups
+        GROUP BY category ORDER BY 2 DESC, 1
+    ''').fetchall()
+
+
+def category_name(conn, name):
+    """ How name is stored: the existing category's spelling, or name with its spacing tidied """
+    row = conn.execute('SELECT name FROM categories WHERE key = ?', (category_key(name),)).fetchone()
+    return row[0] if row else ' '.join((name or '').split())
+
+
+def add_category(conn, name):
+    """ The name category is filed under, adding it if it is new, so budgets and recurring
+    expenses can point at a category before any expense does """
+    return conn.execute('SELECT name FROM categories WHERE id = ?', (_category_id(conn, name),)).fetchone()[0]
+
+
+def _category_id(conn, name):
+    key = category_key(name)
+    row = conn.execute('SELECT id FROM categories WHERE key = ?', (key,)).fetchone()
+    if row:
+        return row[0]
+    return conn.execute('INSERT INTO categories (name, key) VALUES (?, ?)',
+                        (' '.join((name or '').split()), key)).lastrowid
+
+
+def rename_category(conn, old, new):
+    """ Rename a category, or merge it into new when that already exists; returns how
+    many expenses moved. Budgets and recurring expenses follow along """
+    old_id = conn.execute('SELECT id FROM categories WHERE key = ?', (category_key(old),)).fetchone()
+    if old_id is None:
+        raise ValueError(f"No category named {old!r}")
+    new = ' '.join(new.split())
+    if not new:
+        raise ValueError("Please name the new category")
+    old_name = conn.execute('SELECT name FROM categories WHERE id = ?', old_id).fetchone()[0]
+    conn.execute('BEGIN')
+    try:
+        if category_key(new) == category_key(old_name):
+            # Only the spelling changes: rollups are keyed by it, search tokens don't see it.
+            conn.execute('UPDATE categories SET name = ? WHERE id = ?', (new, old_id[0]))
+            conn.execute('UPDATE expense_rollups SET category = ? WHERE category = ?', (new, old_name))
+            _everything_changed(conn)
+            moved = conn.execute('SELECT COUNT(*) FROM expense_rows WHERE category_id = ?', old_id).fetchone()[0]
+        else:
+            # Moving the rows lets the update triggers fix rollups, search and the change log.
+            new_id = _category_id(conn, new)
+            moved = conn.execute('UPDATE expense_rows SET category_id = ? WHERE category_id = ?',
+                                 (new_id, old_id[0])).rowcount
+            conn.execute('UPDATE expense_archive SET category_id = ? WHERE category_id = ?', (new_id, old_id[0]))
+            conn.execute('DELETE FROM categories WHERE id = ?', old_id)
+            new = conn.execute('SELECT name FROM categories WHERE id = ?', (new_id,)).fetchone()[0]
+        conn.execute('UPDATE OR REPLACE budgets SET category = ? WHERE category = ?', (new, old_name))
+        conn.execute('UPDATE recurring_rules SET category = ? WHERE category = ?', (new, old_name))
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return moved
+
+
+def validate_expense(description, amount, category, currency):
+    """ The checks every write path shares; returns the amount in minor units """
+    if not all([description, amount, category]):
+        raise ValueError("Please fill in all fields")
+    if currency not in CURRENCIES:
+        raise ValueError(f"Unknown currency: {currency}")
+    return Money.parse(amount, currency).minor
+
+
+def get_expense(conn, expense_id):
+    return conn.execute('SELECT * FROM expenses WHERE id = ?', (expense_id,)).fetchone()
+
+
+# Mutations commit and hand back the affected rows so callers can patch their views.
+# Each is journaled in the same transaction, so undo() can take it back.
+def add_expense(conn, description, amount, category, currency, date=None):
+    if date is None:
+        date = datetime.now().strftime(DATE_FORMAT)
+    cursor = conn.execute('''
+        INSERT INTO expense_rows (date, description, amount, category_id, currency)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (date, description, amount, _category_id(conn, category), currency))
+    expense = get_expense(conn, cursor.lastrowid)
+    _journal(conn, 'insert', expense[0], after=_image(expense))
+    conn.commit()
+    return expense
+
+
+def update_expense(conn, expense_id, description, amount, category, currency):
+    old_expense = get_expense(conn, expense_id)
+    if old_expense is None:
+        return None, None
+    conn.execute('''
+        UPDATE expense_rows
+        SET description = ?, amount = ?, category_id = ?, currency = ?
+        WHERE id = ?
+    ''', (description, amount, _category_id(conn, category), currency, expense_id))
+    new_expense = get_expense(conn, expense_id)
+    _journal(conn, 'update', expense_id, _image(old_expense), _image(new_expense))
+    conn.commit()
+    return old_expense, new_expense
+
+
+def delete_expense(conn, expense_id):
+    # A tombstone, not a DELETE: compact() removes the row for good later on.
+    expense = get_expense(conn, expense_id)
+    if expense is not None:
+        seq = _journal(conn, 'delete', expense_id, before=_image(expense))
+        conn.execute('UPDATE expense_rows SET deleted = ? WHERE id = ?', (seq, expense_id))
+        conn.commit()
+    return expense
+
+
+def bulk_insert(conn, rows):
+    """ Insert (date, description, amount, category, currency, fingerprint) rows in one
+    transaction, skipping fingerprints already present; returns how many were new.
+    Imports aren't journaled, so undo() passes over them """
+    rows = list(rows)
+    with bulk_loader(conn, len(rows)) as load:
+        return load(rows)
+
+
+def insert_batch(conn, rows):
+    """ bulk_insert() inside the caller's transaction, for writes that must commit with it """
+    rows = list(rows)
+    with _loader(conn, len(rows)) as load:
+        return load(rows)
+
+
+@contextmanager
+def bulk_loader(conn, expected):
+    """ One transaction for loading about expected rows a batch at a time: yields
+    load(rows), which inserts one batch like bulk_insert() and returns how many were new.
+    Nothing is visible until the last batch is in; on an error none of it is kept """
+    conn.execute('BEGIN')
+    try:
+        with _loader(conn, expected) as load:
+            yield load
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+@contextmanager
+def _loader(conn, expected):
+    # Rows hidden by a reset still hold their fingerprints; archive them first so
+    # importing the same file again after a reset brings its rows back.
+    _archive_all_cleared(conn)
+    last_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM expense_rows').fetchone()[0]
+    category_ids = {}
+
+    def stored(row):
+        date, description, amount, category, currency, fingerprint = row
+        if category not in category_ids:
+            category_ids[category] = _category_id(conn, category)
+        return date, description, amount, category_ids[category], currency, fingerprint
+
+    def load(rows):
+        # In date order, new keys land at or near the right edge of the date indexes.
+        cursor = conn.executemany(f'''
+            INSERT OR IGNORE INTO expense_rows ({_ROW_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', sorted(map(stored, rows), key=itemgetter(0)))
+        return cursor.rowcount
+
+    # Row-at-a-time trigger upkeep dominates a bulk load, so the rows are folded into the
+    # rollups with one GROUP BY and into the search index with one pass, after the last
+    # batch. A load bigger than the table (ids are never reused, so last_id bounds its
+    # size) also goes in faster without the secondary indexes: rebuilding them sorts once,
+    # where keeping them up costs a random B-tree insert per index per row.
+    with _without_insert_triggers(conn), _cache_size(conn, BULK_CACHE_KIB):
+        with _without_row_indexes(conn) if expected > last_id else nullcontext():
+            yield load
+        conn.execute(_ROLLUP_MERGE_NEW, (last_id,))
+        conn.execute(_SEARCH_MERGE_NEW, (last_id,))
+
+
+def reset_expenses(conn):
+    # Raising the floor past the last id hides every expense at once, however many there
+    # are. The rows stay until compact() archives them, and undo() lowers the floor again.
+    conn.execute('BEGIN')
+    try:
+        floor = _floor(conn)
+        last_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM expense_rows').fetchone()[0]
+        _journal(conn, 'reset', before=json.dumps({'floor': floor}), after=json.dumps({'floor': last_id}))
+        _raise_floor(conn, last_id)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+# Page cache a bulk insert uses while it runs, in place of the usual cache_size.
+BULK_CACHE_KIB = 256 * 1024
+
+# Journal entries kept for undo; compact() prunes older ones along with their archived rows.
+JOURNAL_LIMIT = 1000
+
+# Rows compact() handles per transaction, so writes queued behind it wait only briefly:
+# each row removed costs a visit to every index, tens of milliseconds per batch.
+COMPACT_BATCH = 500
+
+_IMAGE_COLUMNS = _EXPENSE_COLUMNS.split(', ')
+
+
+def _image(expense):
+    # An expense as journaled: everything but the id, which the entry records separately.
+    return json.dumps(dict(zip(_IMAGE_COLUMNS, expense[1:])))
+
+
+def _journal(conn, action, expense_id=None, before=None, after=None, target=None):
+    cursor = conn.execute('''
+        INSERT INTO expense_journal (at, action, expense_id, target, before, after)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (datetime.now().strftime(DATE_FORMAT), action, expense_id, target, before, after))
+    return cursor.lastrowid
+
+
+def _floor(conn):
+    return conn.execute('SELECT floor FROM expense_state').fetchone()[0]
+
+
+def _everything_changed(conn):
+    # One "everything changed" marker instead of a logged id per row.
+    conn.execute('DELETE FROM expense_changes')
+    conn.execute('INSERT INTO expense_changes (expense_id) VALUES (NULL)')
+
+
+def _raise_floor(conn, floor):
+    conn.execute('UPDATE expense_state SET floor = ?', (floor,))
+    # Rollups count only rows above the floor: none after a reset, or on a redo the rows
+    # imported since. Either way the cleared generation is never read.
+    conn.execute('DELETE FROM expense_rollups')
+    conn.execute(_ROLLUP_MERGE_NEW, (floor,))
+    _everything_changed(conn)
+
+
+def _restore_generation(conn, reset_seq, floor):
+    # Whatever compact() archived goes back first; fingerprints imported again since are
+    # kept. As in bulk_insert, the search index takes the rows in one pass instead of
+    # per-row triggers, and the rollups are rebuilt below anyway.
+    archived = conn.execute('SELECT COUNT(*) FROM expense_archive WHERE reset_seq = ?', (reset_seq,)).fetchone()[0]
+    present = conn.execute('SELECT COUNT(*) FROM expense_rows').fetchone()[0]
+    with _without_insert_triggers(conn):
+        with _without_row_indexes(conn) if archived > present else nullcontext():
+            conn.execute(f'''
+                INSERT OR IGNORE INTO expense_rows (id, {_ROW_COLUMNS})
+                SELECT id, {_ROW_COLUMNS} FROM expense_archive WHERE reset_seq = ?
+            ''', (reset_seq,))
+        conn.execute('''
+            INSERT INTO expenses_search (rowid, description, category)
+            SELECT archived.id, description, categories.name
+            FROM expense_archive AS archived JOIN categories ON categories.id = archived.category_id
+            WHERE reset_seq = ? AND EXISTS (SELECT 1 FROM expense_rows WHERE expense_rows.id = archived.id)
+        ''', (reset_seq,))
+    conn.execute('DELETE FROM expense_archive WHERE reset_seq = ?', (reset_seq,))
+    conn.execute('UPDATE expense_state SET floor = ?', (floor,))
+    conn.execute('DELETE FROM expense_rollups')
+    conn.execute(_ROLLUP_BACKFILL)
+    _everything_changed(conn)
+
+
+def _restore_expense(conn, expense_id, image, seq):
+    # Make one row look like image, or tombstone it when image is None.
+    if image is None:
+        conn.execute('UPDATE expense_rows SET deleted = ? WHERE id = ? AND deleted IS NULL', (seq, expense_id))
+        return
+    # Images name the category; it may have been merged away since, and comes back if so.
+    stored = dict(image, category_id=_category_id(conn, image['category']))
+    values = [stored[column] for column in _ROW_COLUMNS.split(', ')]
+    assignments = ', '.join(f'{column} = ?' for column in _ROW_COLUMNS.split(', '))
+    # OR IGNORE: if the same fingerprint was imported again meanwhile, that copy stays.
+    cursor = conn.execute(f'UPDATE OR IGNORE expense_rows SET {assignments}, deleted = NULL WHERE id = ?',
+                          values + [expense_id])
+    if cursor.rowcount == 0:
+        # Compacted away already: bring it back under its old id.
+        cursor = conn.execute(f'''
+            INSERT OR IGNORE INTO expense_rows (id, {_ROW_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [expense_id] + values)
+        if cursor.rowcount:
+            conn.execute('INSERT INTO expense_changes (expense_id) VALUES (?)', (expense_id,))
+
+
+def history(conn):
+    """ (applied, undone): journal seqs of the changes in effect and of those undone since
+    the last new change, each ending with the next one undo() or redo() would take """
+    applied, undone = [], []
+    for seq, action, target in conn.execute('SELECT seq, action, target FROM expense_journal ORDER BY seq'):
+        if action == 'undo':
+            if applied and applied[-1] == target:
+                undone.append(applied.pop())
+        elif action == 'redo':
+            if undone and undone[-1] == target:
+                applied.append(undone.pop())
+        else:
+            # A new change: whatever was undone before it can't be redone any more.
+            applied.append(seq)
+            undone.clear()
+    return applied, undone
+
+
+def _replay(conn, target, direction):
+    action, expense_id, before, after = conn.execute(
+        'SELECT action, expense_id, before, after FROM expense_journal WHERE seq = ?', (target,)
+    ).fetchone()
+    state = before if direction == 'undo' else after
+    state = json.loads(state) if state else None
+    conn.execute('BEGIN')
+    try:
+        seq = _journal(conn, direction, expense_id, target=target)
+        if action != 'reset':
+            _restore_expense(conn, expense_id, state, seq)
+        elif direction == 'undo':
+            _restore_generation(conn, target, state['floor'])
+        else:
+            _raise_floor(conn, state['floor'])
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return action
+
+
+def undo(conn):
+    """ Take back the latest change still in effect; returns its action ('insert', 'update',
+    'delete' or 'reset'), or None when there is nothing left to undo """
+    applied, _ = history(conn)
+    return _replay(conn, applied[-1], 'undo') if applied else None
+
+
+def redo(conn):
+    """ Reapply whatever undo() took back most recently; None if there is nothing to redo """
+    _, undone = history(conn)
+    return _replay(conn, undone[-1], 'redo') if undone else None
+
+
+def _archive_cleared(conn, limit=-1):
+    # Moves up to limit rows (-1: all) hidden by the resets still in effect into
+    # expense_archive. Those resets cover one contiguous id range; rows below it were
+    # cleared by resets already pruned from the journal and are simply dropped.
+    applied, _ = history(conn)
+    resets = [(seq, json.loads(before)['floor'], json.loads(after)['floor'])
+              for seq, before, after in conn.execute(
+                  "SELECT seq, before, after FROM expense_journal WHERE action = 'reset' ORDER BY seq")
+              if seq in set(applied)]
+    done = conn.execute('''
+        DELETE FROM expense_rows WHERE id IN
+        (SELECT id FROM expense_rows WHERE id <= ? AND deleted IS NULL LIMIT ?)
+    ''', (resets[0][1] if resets else _floor(conn), limit)).rowcount
+    for reset_seq, low, high in resets:
+        if done == limit:
+            break
+        # Whole id ranges, so the statements below are rowid range scans.
+        high = conn.execute('''
+            SELECT MAX(id) FROM
+            (SELECT id FROM expense_rows WHERE id > ? AND id <= ? AND deleted IS NULL LIMIT ?)
+        ''', (low, high, limit - done if limit >= 0 else -1)).fetchone()[0]
+        if high is None:
+            continue
+        conn.execute(f'''
+            INSERT INTO expense_archive (reset_seq, id, {_ROW_COLUMNS})
+            SELECT ?, id, {_ROW_COLUMNS} FROM expense_rows WHERE id > ? AND id <= ? AND deleted IS NULL
+        ''', (reset_seq, low, high))
+        done += conn.execute('DELETE FROM expense_rows WHERE id > ? AND id <= ? AND deleted IS NULL',
+                             (low, high)).rowcount
+    return done
+
+
+@contextmanager
+def _without_row_indexes(conn):
+    # Moving most of a big table in or out is far quicker without its secondary indexes:
+    # building one afterwards is a single sort. Unique ones stay to keep enforcing
+    # fingerprints. DDL is transactional, so no one sees them missing.
+    indexes = conn.execute('''
+        SELECT name, sql FROM sqlite_master
+        WHERE type = 'index' AND tbl_name = 'expense_rows' AND sql NOT LIKE 'CREATE UNIQUE%'
+    ''').fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX {name}')
+    yield
+    for _, sql in indexes:
+        conn.execute(sql)
+
+
+@contextmanager
+def _cache_size(conn, kib):
+    # A batch touches index pages all over the file; with room for them in the cache each
+    # is written once at commit rather than spilled and read back mid-batch.
+    size = conn.execute('PRAGMA cache_size').fetchone()[0]
+    conn.execute(f'PRAGMA cache_size = {-kib}')
+    try:
+        yield
+    finally:
+        conn.execute(f'PRAGMA cache_size = {size}')
+
+
+@contextmanager
+def _without_insert_triggers(conn):
+    # For paths that fold a whole batch into the rollups and the search index in one pass.
+    # DDL is transactional: no one sees the gap.
+    triggers = conn.execute('''
+        SELECT name, sql FROM sqlite_master
+        WHERE name IN ('expenses_rollup_insert', 'expenses_search_insert')
+    ''').fetchall()
+    for name, _ in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+    yield
+    for _, sql in triggers:
+        conn.execute(sql)
+
+
+def _archive_all_cleared(conn):
+    # All at once, inside the caller's transaction.
+    floor = _floor(conn)
+    cleared = conn.execute('SELECT COUNT(*) FROM expense_rows WHERE id <= ?', (floor,)).fetchone()[0]
+    if not cleared:
+        return
+    live = conn.execute('SELECT COUNT(*) FROM expense_rows WHERE id > ?', (floor,)).fetchone()[0]
+    if cleared <= live:
+        _archive_cleared(conn)
+        return
+    # Mostly cleared rows: rebuild the indexes and the search index around the few left
+    # instead of pruning them row by row.
+    trigger = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'expenses_search_delete'").fetchone()[0]
+    conn.execute('DROP TRIGGER expenses_search_delete')
+    with _without_row_indexes(conn):
+        _archive_cleared(conn)
+    conn.execute(trigger)
+    conn.execute("INSERT INTO expenses_search (expenses_search) VALUES ('rebuild')")
+
+
+def compact(conn, batch=COMPACT_BATCH):
+    """ One short transaction of clean-up: drop tombstones, archive rows a reset cleared
+    and prune the journal past JOURNAL_LIMIT. Returns how many rows it touched; callers
+    repeat it, between other writes, until that comes back 0 """
+    conn.execute('BEGIN')
+    try:
+        done = conn.execute('''
+            DELETE FROM expense_rows WHERE id IN
+            (SELECT id FROM expense_rows WHERE deleted IS NOT NULL LIMIT ?)
+        ''', (batch,)).rowcount
+        if done < batch:
+            done += _archive_cleared(conn, batch - done)
+        if done < batch:
+            horizon = conn.execute('SELECT IFNULL(MAX(seq), 0) FROM expense_journal').fetchone()[0] - JOURNAL_LIMIT
+            done += conn.execute('DELETE FROM expense_journal WHERE seq <= ?', (horizon,)).rowcount
+            done += conn.execute('''
+                DELETE FROM expense_archive WHERE (reset_seq, id) IN
+                (SELECT reset_seq, id FROM expense_archive WHERE reset_seq <= ? LIMIT ?)
+            ''', (horizon, batch - done)).rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return done
+
+
+def rebuild_rollups(conn):
+    conn.execute('BEGIN')
+    try:
+        conn.execute('DELETE FROM expense_rollups')
+        conn.execute(_ROLLUP_BACKFILL)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def verify_rollups(conn):
+    """ Return the (day, currency, category) keys whose rollup disagrees with expenses """
+    expected = {}
+    for day, currency, category, total, count in conn.execute(_ROLLUP_AGGREGATE):
+        expected[(day, currency, category)] = (total, count)
+    actual = {}
+    for day, currency, category, total, count in conn.execute('SELECT day, currency, category, total, count FROM expense_rollups'):
+        actual[(day, currency, category)] = (total, count)
+
+    mismatched = []
+    for key in expected.keys() | actual.keys():
+        want, got = expected.get(key), actual.get(key)
+        if want != got:
+            mismatched.append(key)
+    return sorted(mismatched)
+
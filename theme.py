@@ -0,0 +1,258 @@
+import os
+import sys
+from functools import lru_cache
+
+def resource_path(relative_path):
+    """ Get absolute path to resource, works for dev and for PyInstaller """
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+# Catppuccin Mocha and Latte, more or less.
+THEMES = {
+    'Mocha': {
+        'base': '#1e1e2e',
+        'mantle': '#181825',
+        'crust': '#11111b',
+        'text': '#cdd6f4',
+        'subtext0': '#a6adc8',
+        'subtext1': '#bac2de',
+        'surface0': '#313244',
+        'surface1': '#45475a',
+        'surface2': '#585b70',
+        'overlay0': '#6c7086',
+        'overlay1': '#7f849c',
+        'overlay2': '#9399b2',
+        'blue': '#89b4fa',
+        'lavender': '#b4befe',
+        'sapphire': '#74c7ec',
+        'sky': '#89dceb',
+        'teal': '#94e2d5',
+        'green': '#a6e3a1',
+        'yellow': '#f9e2af',
+        'peach': '#fab387',
+        'maroon': '#eba0ac',
+        'red': '#f38ba8',
+        'mauve': '#cba6f7',
+        'pink': '#f5c2e7',
+        'flamingo': '#f2cdcd',
+        'rosewater': '#f5e0dc'
+    },
+    'Latte': {
+        'base': '#eff1f5',
+        'mantle': '#e6e9ef',
+        'crust': '#dce0e8',
+        'text': '#4c4f69',
+        'subtext0': '#6c6f85',
+        'subtext1': '#5c5f77',
+        'surface0': '#ccd0da',
+        'surface1': '#bcc0cc',
+        'surface2': '#acb0be',
+        'overlay0': '#9ca0b0',
+        'overlay1': '#8c8fa1',
+        'overlay2': '#7c7f93',
+        'blue': '#1e66f5',
+        'lavender': '#7287fd',
+        'sapphire': '#209fb5',
+        'sky': '#04a5e5',
+        'teal': '#179299',
+        'green': '#40a02b',
+        'yellow': '#df8e1d',
+        'peach': '#fe640b',
+        'maroon': '#e64553',
+        'red': '#d20f39',
+        'mauve': '#8839ef',
+        'pink': '#ea76cb',
+        'flamingo': '#dd7878',
+        'rosewater': '#dc8a78'
+    },
+}
+DEFAULT_THEME = 'Mocha'
+
+# The live colors. Painted widgets (charts, the table's buttons) read them at paint
+# time, so apply_theme() swaps the contents in place rather than the dict.
+COLORS = dict(THEMES[DEFAULT_THEME])
+current_theme = DEFAULT_THEME
+
+# One sheet for the whole application. Widgets pick a look with a "variant" property
+# (widget.setProperty('variant', 'danger')) instead of carrying their own stylesheet.
+STYLESHEET = """
+    QMainWindow, QDialog, QMessageBox {{
+        background-color: {base};
+    }}
+    QWidget {{
+        font-family: 'JetBrains Mono';
+        color: {text};
+    }}
+    QPushButton {{
+        background-color: {green};
+        border: none;
+        border-radius: 5px;
+        padding: 8px 15px;
+        color: {mantle};
+    }}
+    QPushButton:hover {{
+        background-color: {teal};
+    }}
+    QDialog QPushButton {{
+        padding: 5px 10px;
+    }}
+    QMessageBox QPushButton, QPushButton[variant="secondary"] {{
+        background-color: {surface0};
+        color: {text};
+    }}
+    QMessageBox QPushButton:hover, QPushButton[variant="secondary"]:hover {{
+        background-color: {surface1};
+    }}
+    QPushButton[variant="danger"] {{
+        background-color: {red};
+        color: {mantle};
+    }}
+    QPushButton[variant="danger"]:hover {{
+        background-color: {maroon};
+    }}
+    QPushButton[variant="link"] {{
+        font-size: 16px;
+        color: {blue};
+        background: transparent;
+        padding: 0;
+    }}
+    QPushButton[variant="link"]:hover {{
+        color: {lavender};
+        text-decoration: underline;
+    }}
+    QLineEdit, QDateEdit, QComboBox {{
+        background-color: {surface0};
+        border: none;
+        border-radius: 5px;
+        padding: 8px;
+        color: {text};
+    }}
+    QDialog QLineEdit, QDialog QComboBox {{
+        padding: 5px;
+    }}
+    QComboBox::drop-down {{
+        border: none;
+    }}
+    QComboBox::down-arrow {{
+        image: none;
+        border: none;
+    }}
+    QComboBox QAbstractItemView {{
+        background-color: {surface0};
+        color: {text};
+        selection-background-color: {surface1};
+    }}
+    QPlainTextEdit {{
+        background-color: {mantle};
+        color: {text};
+        border: none;
+        border-radius: 5px;
+        padding: 5px;
+    }}
+    QTableView {{
+        background-color: {surface0};
+        border: none;
+        border-radius: 5px;
+        gridline-color: {surface1};
+        alternate-background-color: {surface0};
+    }}
+    QTableView::item {{
+        padding: 5px;
+        color: {text};
+    }}
+    QTableView::item:selected {{
+        background-color: {overlay0};
+        color: {text};
+    }}
+    QHeaderView::section {{
+        background-color: {surface1};
+        color: {text};
+        padding: 5px;
+        border: none;
+    }}
+    QLabel[variant="title"] {{
+        font-size: 32px;
+        color: {lavender};
+        font-weight: bold;
+    }}
+    QLabel[variant="heading"] {{
+        font-size: 16px;
+        color: {lavender};
+        font-weight: bold;
+    }}
+    QLabel[variant="total"] {{
+        font-size: 24px;
+        color: {yellow};
+        font-weight: bold;
+    }}
+    QLabel[variant="subtitle"] {{
+        font-size: 18px;
+    }}
+    QLabel[variant="caption"] {{
+        font-size: 14px;
+        color: {subtext1};
+    }}
+    QLabel[variant="hint"] {{
+        font-size: 11px;
+        color: {subtext0};
+    }}
+    QLabel[variant="report"] {{
+        font-size: 12px;
+    }}
+    AboutDialog QLabel {{
+        padding: 5px;
+    }}
+    SummaryDialog QLabel {{
+        font-size: 14px;
+    }}
+"""
+
+
+@lru_cache(maxsize=None)
+def stylesheet(name):
+    """ The application stylesheet for a theme, formatted once """
+    return STYLESHEET.format(**THEMES[name])
+
+
+def palette(name):
+    """ A QPalette to match, for the parts no stylesheet reaches (calendar popups, tooltips) """
+    from PyQt6.QtGui import QColor, QPalette
+
+    colors = THEMES[name]
+    roles = {
+        QPalette.ColorRole.Window: 'base',
+        QPalette.ColorRole.WindowText: 'text',
+        QPalette.ColorRole.Base: 'surface0',
+        QPalette.ColorRole.AlternateBase: 'mantle',
+        QPalette.ColorRole.Text: 'text',
+        QPalette.ColorRole.PlaceholderText: 'overlay1',
+        QPalette.ColorRole.Button: 'surface0',
+        QPalette.ColorRole.ButtonText: 'text',
+        QPalette.ColorRole.Highlight: 'overlay0',
+        QPalette.ColorRole.HighlightedText: 'text',
+        QPalette.ColorRole.ToolTipBase: 'mantle',
+        QPalette.ColorRole.ToolTipText: 'text',
+        QPalette.ColorRole.Link: 'blue',
+    }
+    result = QPalette()
+    for role, color in roles.items():
+        result.setColor(role, QColor(colors[color]))
+    return result
+
+
+def apply_theme(app, name=None):
+    """ Style the whole application; with a name, switch to that theme first """
+    global current_theme
+    if name is not None:
+        current_theme = name
+        COLORS.clear()
+        COLORS.update(THEMES[name])
+    app.setPalette(palette(current_theme))
+    # One parse of a cached string; Qt then re-matches it per widget. Painted widgets just need a repaint.
+    app.setStyleSheet(stylesheet(current_theme))
+    for widget in app.topLevelWidgets():
+        widget.update()